@@ -0,0 +1,127 @@
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.models.schemas import (
+    AnalyzeRequest, AnalyzeResponseWithExplanation, PanelAnalyzeRequest, PanelAnalyzeResponseWithExplanation,
+    ExplanationJob, ExplanationJobBatchRequest, ExplanationJobBatchResponse, JobPriority
+)
+from app.services.explanation_service import (
+    generate_drug_explanation, generate_panel_explanation, stream_drug_explanation
+)
+from app.services.explanation_jobs import explanation_jobs, QueueClosedError, QueueFullError
+
+# AI endpoints (RAG + local LLM). Only mounted when PHARMAGUARD_MODE=full,
+# so the rules-only deployment never imports the ML stack.
+router = APIRouter()
+
+@router.post("/analyze-with-explanation", response_model=AnalyzeResponseWithExplanation)
+async def analyze_risk_with_explanation(request: AnalyzeRequest):
+    """
+    Analyze risk AND provide an AI-generated clinical explanation.
+    Uses RAG (CPIC Guidelines) + LLM (GPT-4o-mini).
+    """
+    try:
+        response = await generate_drug_explanation(request)
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI Service Error: {str(e)}")
+
+@router.post("/analyze-with-explanation/panel", response_model=PanelAnalyzeResponseWithExplanation)
+async def analyze_panel_with_explanation(request: PanelAnalyzeRequest):
+    """
+    Panel variant of /analyze-with-explanation: every applicable drug for the
+    patient's genotypes, with explanations generated concurrently.
+    """
+    try:
+        return await generate_panel_explanation(request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI Service Error: {str(e)}")
+
+@router.post("/analyze-with-explanation/stream")
+async def analyze_risk_with_explanation_stream(request: AnalyzeRequest):
+    """
+    Server-Sent Events variant of /analyze-with-explanation.
+    The deterministic result is the first event (`result`); explanation
+    `token` and `field` events follow as the local LLM generates them,
+    then `explanation` (full object) and `done`.
+    """
+    async def event_stream():
+        async for event, data in stream_drug_explanation(request):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Explanation jobs: submit now, fetch the explanation later
+
+# Async handlers: submit() puts onto an asyncio queue, which must happen on the event loop
+async def _submit_jobs(requests: list[AnalyzeRequest], priority: str) -> list[ExplanationJob]:
+    try:
+        return await explanation_jobs.submit(requests, priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except QueueClosedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/explanation-jobs", response_model=ExplanationJob, status_code=202)
+async def submit_explanation_job(request: AnalyzeRequest, priority: JobPriority = "interactive"):
+    """
+    Returns the deterministic result and a job id immediately; the explanation
+    is generated in the background. 429 when the queue is full.
+    """
+    return (await _submit_jobs([request], priority))[0]
+
+@router.post("/explanation-jobs/batch", response_model=ExplanationJobBatchResponse, status_code=202)
+async def submit_explanation_jobs(request: ExplanationJobBatchRequest):
+    """
+    One job per request (batch priority by default). Accepted only if every job fits in the queue.
+    """
+    return ExplanationJobBatchResponse(jobs=await _submit_jobs(request.requests, request.priority))
+
+@router.get("/explanation-jobs/{job_id}", response_model=ExplanationJob)
+async def get_explanation_job(job_id: str, wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the job to finish")):
+    """
+    Job status and, once done, the explanation. With `wait`, long-polls until the job finishes.
+    """
+    job = await explanation_jobs.wait(job_id, wait) if wait else await explanation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+@router.get("/explanation-jobs/{job_id}/stream")
+async def stream_explanation_job(job_id: str):
+    """
+    Server-Sent Events for one job: `status` on every change, then
+    `explanation` (or `error`) and `done`.
+    """
+    job = await explanation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+
+    async def event_stream(job: Optional[ExplanationJob]):
+        yield f"event: status\ndata: {json.dumps({'status': job.status})}\n\n"
+        while job.status not in ("done", "failed"):
+            status = job.status
+            job = await explanation_jobs.wait(job_id, 15, unless_status=status)
+            if job is None:
+                return
+            if job.status == status:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps({'status': job.status})}\n\n"
+        if job.status == "done":
+            yield f"event: explanation\ndata: {job.explanation.model_dump_json()}\n\n"
+        else:
+            yield f"event: error\ndata: {json.dumps({'detail': job.error})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
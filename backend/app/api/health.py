@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import PlainTextResponse
+from app.models.schemas import HealthStatus, ComponentHealth
+from app.engine.rule_index import get_rule_index
+from app.metrics import METRICS_ENABLED, render_metrics
+
+router = APIRouter()
+
+@router.get("/health/live", response_model=HealthStatus)
+def liveness(request: Request):
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return HealthStatus(status="alive", mode=request.app.state.mode, components={})
+
+@router.get("/health/ready", response_model=HealthStatus)
+def readiness(request: Request, response: Response):
+    """
+    Readiness probe. Returns 503 until warm-up has finished.
+    In full mode the RAG engine must have finished loading; if it failed,
+    the service is ready but degraded (explanations run without context).
+    It is also degraded while the circuit of every LLM backend is open.
+    """
+    index = get_rule_index()
+    components = {
+        "rule_engine": ComponentHealth(state="ready", detail=f"version {index.version}")
+    }
+    status = "ready"
+
+    if request.app.state.mode == "full":
+        # Only imported in full mode; ml.rag_engine itself is lightweight
+        from ml.rag_engine import rag_engine, READY, FAILED
+        detail = rag_engine.error
+        if rag_engine.load_seconds is not None and detail is None:
+            detail = f"loaded in {rag_engine.load_seconds:.1f}s"
+        components["rag_engine"] = ComponentHealth(
+            state=rag_engine.state,
+            detail=detail,
+            metrics={"embedding_batcher": rag_engine.batcher.stats()} if rag_engine.batcher else None
+        )
+        if rag_engine.state == FAILED:
+            status = "degraded"
+        elif rag_engine.state != READY:
+            status = "warming"
+
+        # With every backend's circuit open, explanations fall back immediately
+        from ml.local_llm import local_llm
+        backends = local_llm.router.stats()
+        available = sum(backend["state"] != "open" for backend in backends)
+        components["llm"] = ComponentHealth(
+            state="ready" if available else "unavailable",
+            detail=f"{available}/{len(backends)} backends available",
+            metrics={"backends": backends}
+        )
+        if not available and status == "ready":
+            status = "degraded"
+
+    if status == "warming":
+        response.status_code = 503
+    return HealthStatus(status=status, mode=request.app.state.mode, components=components)
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics(request: Request):
+    """
+    Prometheus scrape endpoint: stage latency histograms and event counters,
+    plus cache counters read from the ML components in full mode.
+    """
+    if not METRICS_ENABLED:
+        return PlainTextResponse("Metrics are disabled (METRICS_ENABLED=0)\n", status_code=404)
+
+    extra = []
+    if request.app.state.mode == "full":
+        from ml.explanation_cache import explanation_cache
+        from ml.rag_engine import rag_engine
+        if explanation_cache is not None:
+            extra += [
+                ("pharmaguard_explanation_cache_hits_total", "counter", "Explanations served from the cache.", explanation_cache.hits),
+                ("pharmaguard_explanation_cache_misses_total", "counter", "Explanations generated on a cache miss.", explanation_cache.misses),
+                ("pharmaguard_explanation_cache_coalesced_total", "counter", "Requests that joined an in-flight generation.", explanation_cache.coalesced)
+            ]
+        embedding_cache = rag_engine._embed_query.cache_info()
+        extra += [
+            ("pharmaguard_query_embedding_cache_hits_total", "counter", "Query embeddings served from the LRU cache.", embedding_cache.hits),
+            ("pharmaguard_query_embedding_cache_misses_total", "counter", "Query embeddings computed by the model.", embedding_cache.misses)
+        ]
+        from app.services.explanation_jobs import explanation_jobs
+        jobs = explanation_jobs.stats()
+        extra += [
+            ("pharmaguard_explanation_jobs_queued", "gauge", "Explanation jobs waiting for a worker.", jobs["queued"]),
+            ("pharmaguard_explanation_jobs_rejected_total", "counter", "Explanation jobs rejected because the queue was full.", jobs["rejected"])
+        ]
+        if rag_engine.batcher is not None:
+            batcher = rag_engine.batcher.stats()
+            extra += [
+                ("pharmaguard_embedding_batches_total", "counter", "Batched embedding model calls.", batcher["batches"]),
+                ("pharmaguard_embedding_batched_queries_total", "counter", "Queries encoded by batched model calls.", batcher["queries"])
+            ]
+            extra += [
+                (f'pharmaguard_embedding_batch_size_batches_total{{size="{size}"}}', "counter", "Batched embedding model calls per batch size.", count)
+                for size, count in batcher["batch_size_histogram"].items()
+            ]
+        from ml.local_llm import local_llm
+        backends = local_llm.router.stats()
+        for kind, name, documentation, field in (
+            ("counter", "pharmaguard_llm_backend_requests_total", "Generations sent to each LLM backend.", "requests"),
+            ("counter", "pharmaguard_llm_backend_errors_total", "Failed generations per LLM backend.", "errors"),
+            ("gauge", "pharmaguard_llm_backend_outstanding", "Generations in flight per LLM backend.", "outstanding")
+        ):
+            extra += [(f'{name}{{backend="{b["name"]}"}}', kind, documentation, b[field]) for b in backends]
+        extra += [
+            (f'pharmaguard_llm_backend_circuit_open{{backend="{b["name"]}"}}', "gauge", "1 while the backend's circuit breaker is open.", int(b["state"] == "open"))
+            for b in backends
+        ]
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import AnalyzeRequest, AnalyzeResponse
-from app.engine.rule_engine import evaluate_drug_risk
-from app.services.explanation_service import generate_drug_explanation, AnalyzeResponseWithExplanation
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from app.models.schemas import (
+    AnalyzeRequest, AnalyzeResponse, BatchAnalyzeRequest, BatchAnalyzeResponse, VCFAnalyzeResponse,
+    RuleSetInfo, PanelAnalyzeRequest, PanelAnalyzeResponse
+)
+from app.engine.rule_engine import (
+    render_drug_risk, evaluate_drug_risk_batch, evaluate_drug_risk_columns, evaluate_panel
+)
+from app.engine.rule_index import get_rule_index, reload_rules
+from app.services.vcf_service import analyze_vcf_stream
 
 router = APIRouter()
 
@@ -12,24 +20,96 @@ async def analyze_genomic_risk(request: AnalyzeRequest):
     Deterministic rule engine only.
     """
     try:
-        response = evaluate_drug_risk(
+        # The rule's JSON is pre-rendered; only the request's values are
+        # serialized, and response_model validation is skipped (it still
+        # documents the response schema).
+        content = render_drug_risk(
             patient_id=request.patient_id,
             gene=request.gene,
             diplotype=request.diplotype,
             drug=request.drug
         )
-        return response
+        return Response(content=content, media_type="application/json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+@router.post("/analyze/batch", response_model=BatchAnalyzeResponse)
+def analyze_genomic_risk_batch(request: BatchAnalyzeRequest):
+    """
+    Analyze many patient x drug pairs in a single call (row or columnar payload).
+    Results are returned in input order; failures are reported per item.
+    """
+    if request.columns is not None:
+        cols = request.columns
+        results = evaluate_drug_risk_columns(cols.patient_id, cols.gene, cols.diplotype, cols.drug)
+    else:
+        results = evaluate_drug_risk_batch(request.requests)
+
+    failed = sum(1 for item in results if item.error is not None)
+    payload = BatchAnalyzeResponse.model_construct(
+        results=results,
+        succeeded=len(results) - failed,
+        failed=failed
+    )
+    # Items are already validated models; serialize directly instead of
+    # re-validating the whole batch through response_model.
+    return Response(content=payload.model_dump_json(), media_type="application/json")
+
+@router.post("/analyze/panel", response_model=PanelAnalyzeResponse)
+def analyze_genomic_panel(request: PanelAnalyzeRequest):
+    """
+    Evaluate a patient's full set of gene -> diplotype calls against every
+    drug that has rules for one of those genes, in a single call.
+    """
+    try:
+        return evaluate_panel(request.patient_id, request.genotypes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+@router.post(
+    "/analyze-vcf",
+    response_model=VCFAnalyzeResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "Raw VCF body (plain text or gzip/BGZF compressed)",
+            "content": {
+                "text/plain": {"schema": {"type": "string"}},
+                "application/gzip": {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def analyze_vcf(request: Request, drug: str, patient_id: Optional[str] = None, sample: Optional[str] = None):
+    """
+    Analyze pharmacogenomic risk directly from an uploaded VCF.
+    The body is parsed incrementally as it arrives; diplotypes are called
+    from the drug's pharmacogene records and fed to the rule engine.
+    """
+    try:
+        return await analyze_vcf_stream(request.stream(), drug=drug, patient_id=patient_id, sample=sample)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
-@router.post("/analyze-with-explanation", response_model=AnalyzeResponseWithExplanation)
-async def analyze_risk_with_explanation(request: AnalyzeRequest):
+@router.get("/rules", response_model=RuleSetInfo)
+def get_rules_info():
+    """
+    Version and source of the active compiled rule index.
+    """
+    index = get_rule_index()
+    return RuleSetInfo(version=index.version, source=index.source, entries=len(index))
+
+@router.post("/rules/reload", response_model=RuleSetInfo)
+def reload_rule_index():
     """
-    Analyze risk AND provide an AI-generated clinical explanation.
-    Uses RAG (CPIC Guidelines) + LLM (GPT-4o-mini).
+    Recompiles the configured rules (RULES_FILE, or the built-in tables) and
+    swaps them in atomically. In-flight requests finish on the previous index.
+    The file is never taken from the request.
     """
     try:
-        response = await generate_drug_explanation(request)
-        return response
+        index = reload_rules()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI Service Error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Rules reload failed: {str(e)}")
+    return RuleSetInfo(version=index.version, source=index.source, entries=len(index))
@@ -0,0 +1,305 @@
+"""
+Offline batch runner: evaluates every VCF under a directory against a set of
+drugs without going through the HTTP server.
+
+Files are parsed once each (all requested pharmacogenes in one pass) in a
+process pool. Work is submitted in chunks with a bounded number in flight,
+results are appended to JSONL or CSV as chunks complete, and finished files
+are recorded in a checkpoint so an interrupted run can be resumed.
+With --all-samples, every sample column of multi-sample VCFs is evaluated
+through the columnar genotype matrix (app/engine/genotype_matrix.py).
+Bgzipped VCFs are read through a block index (app/engine/vcf_index.py), so
+only the pharmacogene regions are decompressed.
+
+Usage (from backend/):
+    python -m app.cli.cohort VCF_DIR --out results.jsonl [--drugs Codeine,Warfarin]
+                             [--workers N] [--chunk-size 16] [--format jsonl|csv] [--all-samples]
+                             [--index auto|off]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, Optional
+
+VCF_SUFFIXES = (".vcf", ".vcf.gz", ".vcf.bgz")
+
+CSV_FIELDS = [
+    "file", "patient_id", "drug", "gene", "diplotype", "phenotype",
+    "risk_label", "severity", "confidence_score", "dose_adjustment", "monitoring",
+    "variants_analyzed", "error"
+]
+
+def iter_vcf_files(root: str) -> Iterator[str]:
+    """
+    VCF paths under `root`, depth-first in name order.
+    """
+    with os.scandir(root) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_vcf_files(entry.path)
+            elif entry.name.endswith(VCF_SUFFIXES):
+                yield entry.path
+
+def _init_worker() -> None:
+    # Workers use the same rule set as the server would
+    if os.getenv("RULES_FILE"):
+        from app.engine.rule_index import reload_rules
+        reload_rules()
+
+def evaluate_file(path: str, drugs: list[tuple[str, str]], use_index: bool = True) -> list[dict]:
+    """
+    Parses one VCF and evaluates each (drug, gene). Returns one row per drug;
+    failures become rows with an `error` instead of raising.
+    """
+    from app.engine.vcf_index import iter_vcf_chunks
+    from app.engine.vcf_parser import VCFStreamParser
+    from app.services.vcf_service import build_vcf_response
+
+    genes = {gene for _, gene in drugs}
+    try:
+        parser = VCFStreamParser(genes=genes)
+        for chunk in iter_vcf_chunks(path, genes, use_index=use_index):
+            parser.feed(chunk)
+        parsed = parser.close()
+    except Exception as e:
+        return [{"file": path, "drug": drug, "gene": gene, "error": f"Parse failed: {e}"} for drug, gene in drugs]
+
+    patient_id = parsed.sample_id or os.path.basename(path).split(".")[0]
+    rows = []
+    for drug, gene in drugs:
+        try:
+            response = build_vcf_response(parsed, drug, gene, patient_id)
+            rows.append({"file": path, **response.model_dump()})
+        except Exception as e:
+            rows.append({"file": path, "patient_id": patient_id, "drug": drug, "gene": gene, "error": str(e)})
+    return rows
+
+def evaluate_file_all_samples(path: str, drugs: list[tuple[str, str]], use_index: bool = True) -> list[dict]:
+    """
+    Evaluates every sample column of one VCF; one row per (sample, drug).
+    """
+    from app.engine.genotype_matrix import read_genotype_matrix, evaluate_genotype_matrix
+    from app.engine.vcf_index import iter_vcf_chunks
+
+    genes = {gene for _, gene in drugs}
+    try:
+        matrix = read_genotype_matrix(iter_vcf_chunks(path, genes, use_index=use_index), genes)
+        if not matrix.stats.header_found:
+            raise ValueError("Invalid VCF: missing #CHROM header line")
+    except Exception as e:
+        return [{"file": path, "drug": drug, "gene": gene, "error": f"Parse failed: {e}"} for drug, gene in drugs]
+    return [{"file": path, **result.model_dump()} for result in evaluate_genotype_matrix(matrix, drugs)]
+
+def evaluate_chunk(
+    paths: list[str], drugs: list[tuple[str, str]], all_samples: bool = False, use_index: bool = True
+) -> tuple[list[str], list[dict]]:
+    evaluate = evaluate_file_all_samples if all_samples else evaluate_file
+    rows = []
+    for path in paths:
+        rows.extend(evaluate(path, drugs, use_index))
+    return paths, rows
+
+def _csv_row(row: dict) -> dict:
+    if "error" in row:
+        return {field: row.get(field, "") for field in CSV_FIELDS}
+    profile = row["pharmacogenomic_profile"]
+    return {
+        "file": row["file"],
+        "patient_id": row["patient_id"],
+        "drug": row["drug"],
+        "gene": profile["primary_gene"],
+        "diplotype": profile["diplotype"],
+        "phenotype": profile["phenotype"],
+        "risk_label": row["risk_assessment"]["risk_label"],
+        "severity": row["risk_assessment"]["severity"],
+        "confidence_score": row["risk_assessment"]["confidence_score"],
+        "dose_adjustment": row["clinical_recommendation"]["dose_adjustment"],
+        "monitoring": row["clinical_recommendation"]["monitoring"],
+        "variants_analyzed": row.get("quality_metrics", {}).get("variants_analyzed", ""),
+        "error": ""
+    }
+
+class ResultWriter:
+    """
+    Appends result rows as JSONL or CSV; the CSV header is written once per file.
+    """
+    def __init__(self, path: str, fmt: str):
+        self.fmt = fmt
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+            if new_file:
+                self._csv.writeheader()
+
+    def write(self, rows: list[dict]) -> None:
+        for row in rows:
+            if self._csv is not None:
+                self._csv.writerow(_csv_row(row))
+            else:
+                self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+def checkpoint_key(path: str) -> str:
+    # The same file reached through another root spelling or a symlink is still done
+    return os.path.realpath(path)
+
+def load_checkpoint(path: str) -> set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+def _chunks(paths: Iterator[str], size: int) -> Iterator[list[str]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_cohort(
+    root: str,
+    drugs: list[tuple[str, str]],
+    out: str,
+    fmt: str = "jsonl",
+    workers: Optional[int] = None,
+    chunk_size: int = 16,
+    checkpoint: Optional[str] = None,
+    report_every: float = 5.0,
+    all_samples: bool = False,
+    use_index: bool = True
+) -> dict:
+    """
+    Runs the cohort and returns throughput statistics.
+    At most 2 x workers chunks are pending at any time, so memory does not grow with the cohort.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = checkpoint or out + ".done"
+    done = load_checkpoint(checkpoint)
+    skipped = 0
+
+    def pending_paths() -> Iterator[str]:
+        # Counts only the files of this root; the checkpoint may list others
+        nonlocal skipped
+        for path in iter_vcf_files(root):
+            if checkpoint_key(path) in done:
+                skipped += 1
+            else:
+                yield path
+
+    chunks = _chunks(pending_paths(), chunk_size)
+
+    writer = ResultWriter(out, fmt)
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8")
+    files = rows_written = errors = 0
+    started = last_report = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            in_flight = set()
+
+            def fill():
+                while len(in_flight) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        return
+                    in_flight.add(pool.submit(evaluate_chunk, chunk, drugs, all_samples, use_index))
+
+            fill()
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    in_flight.discard(future)
+                    paths, rows = future.result()
+                    # Results are flushed before their files are checkpointed; a crash
+                    # in between re-runs (and re-appends) at most that chunk
+                    writer.write(rows)
+                    checkpoint_file.write("".join(checkpoint_key(path) + "\n" for path in paths))
+                    checkpoint_file.flush()
+                    files += len(paths)
+                    rows_written += len(rows)
+                    errors += sum(1 for row in rows if "error" in row)
+                fill()
+
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    last_report = now
+                    print(f"{files} files, {rows_written} results, {errors} errors ({files / (now - started):.1f} files/s)", file=sys.stderr)
+    finally:
+        writer.close()
+        checkpoint_file.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        "files": files,
+        "skipped": skipped,
+        "results": rows_written,
+        "errors": errors,
+        "seconds": seconds,
+        "files_per_second": files / seconds if seconds else 0.0,
+        "workers": workers
+    }
+
+def resolve_drugs(names: Optional[str]) -> list[tuple[str, str]]:
+    """
+    (canonical drug, primary gene) for a comma-separated list, or for every drug with rules.
+    """
+    from app.engine.rule_index import get_rule_index
+
+    index = get_rule_index()
+    if not names:
+        names = ",".join(index.drug_names.values())
+    resolved = []
+    for name in names.split(","):
+        drug, genes = index.resolve_drug(name)
+        resolved.append((drug, genes[0]))
+    return resolved
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a directory of VCFs against the rule engine.")
+    parser.add_argument("vcf_dir", help="Directory searched recursively for .vcf / .vcf.gz files")
+    parser.add_argument("--out", required=True, help="Output file (appended to when resuming)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None, help="Default: from --out extension")
+    parser.add_argument("--drugs", help="Comma-separated drugs (default: every drug with rules)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Files per submitted task")
+    parser.add_argument("--checkpoint", help="Finished-files list (default: OUT.done)")
+    parser.add_argument("--all-samples", action="store_true", help="Evaluate every sample column, not just the first")
+    parser.add_argument(
+        "--index", choices=("auto", "off"), default="auto",
+        help="auto: read bgzipped VCFs via .tbi or a .pgi index built on first use; off: always scan whole files"
+    )
+    args = parser.parse_args()
+
+    if args.workers is not None and args.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+    _init_worker()
+    try:
+        drugs = resolve_drugs(args.drugs)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    fmt = args.format or ("csv" if args.out.endswith(".csv") else "jsonl")
+
+    stats = run_cohort(
+        args.vcf_dir, drugs, args.out,
+        fmt=fmt, workers=args.workers, chunk_size=args.chunk_size, checkpoint=args.checkpoint,
+        all_samples=args.all_samples, use_index=args.index == "auto"
+    )
+    print(
+        f"Done: {stats['files']} files ({stats['skipped']} already done), {stats['results']} results, "
+        f"{stats['errors']} errors in {stats['seconds']:.1f}s "
+        f"({stats['files_per_second']:.1f} files/s, {stats['workers']} workers)"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Builds region indexes (.pgi) for bgzipped VCFs ahead of a cohort run, so the
+one-time scan is not paid by the first run. Files that already have a tabix
+(.tbi) index or an up-to-date .pgi are skipped.
+
+Usage (from backend/):
+    python -m app.cli.index_vcf PATH [PATH ...] [--force]
+"""
+import argparse
+import os
+import time
+
+from app.cli.cohort import iter_vcf_files
+from app.engine.vcf_index import RegionIndex, is_bgzf
+
+def main():
+    parser = argparse.ArgumentParser(description="Build .pgi region indexes for bgzipped VCFs.")
+    parser.add_argument("paths", nargs="+", help="VCF files or directories (searched recursively)")
+    parser.add_argument("--force", action="store_true", help="Rebuild existing .pgi indexes")
+    args = parser.parse_args()
+
+    built = skipped = 0
+    for root in args.paths:
+        for path in iter_vcf_files(root) if os.path.isdir(root) else [root]:
+            if not is_bgzf(path):
+                print(f"skip {path}: not bgzip-compressed")
+                skipped += 1
+                continue
+            index_path = RegionIndex.path_for(path)
+            if not args.force and (os.path.exists(path + ".tbi") or RegionIndex.load(index_path, path)):
+                skipped += 1
+                continue
+            started = time.perf_counter()
+            RegionIndex.build(path).save(index_path)
+            print(f"indexed {path} in {time.perf_counter() - started:.1f}s")
+            built += 1
+    print(f"Done: {built} indexed, {skipped} skipped")
+
+if __name__ == "__main__":
+    main()
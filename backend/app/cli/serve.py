@@ -0,0 +1,134 @@
+"""
+Pre-fork API server. The rule index, the embedding model and the vector
+store are loaded once in a parent process, which then forks the uvicorn
+workers. Memory loaded before the fork stays shared copy-on-write, so N
+workers hold one copy of the model weights instead of N. `uvicorn --workers`
+spawns fresh interpreters and each of them loads its own copy. The knowledge
+base sync and the guideline table build also run once, in the parent. A
+worker that dies is forked again from the preloaded parent.
+
+Usage (from backend/):
+    python -m app.cli.serve [--host 0.0.0.0] [--port 8000] [--workers 4] [--threads 1]
+Per-worker memory: python -m benchmarks.memory --server both
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+import traceback
+
+MODE = os.getenv("PHARMAGUARD_MODE", "full")
+
+def preload() -> None:
+    # 1. Everything the workers import anyway: FastAPI, schemas, rule engine
+    import app.api.routes  # noqa: F401
+    from app.engine.rule_index import get_rule_index
+    get_rule_index()
+
+    # 2. Embedding model, vector store, knowledge base sync and guideline table
+    if MODE == "full":
+        from ml.rag_engine import rag_engine
+        if rag_engine.uses_embeddings:
+            # OpenMP thread pools do not survive a fork; keep the parent on one
+            # thread so each worker can start its own pool
+            import torch
+            torch.set_num_threads(1)
+        started = time.perf_counter()
+        rag_engine.initialize()
+        print(f"RAG engine {rag_engine.state} in {time.perf_counter() - started:.1f}s")
+        rag_engine.before_fork()
+
+    # 3. Keep the collector of each worker from writing to (and so copying)
+    #    the pages of everything loaded so far
+    gc.collect()
+    gc.freeze()
+
+def run_worker(index: int, sock: socket.socket, args) -> None:
+    os.environ["PHARMAGUARD_WORKER_INDEX"] = str(index)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    if MODE == "full":
+        from ml.rag_engine import rag_engine
+        rag_engine.after_fork()
+        if rag_engine.embedding_fn is not None:
+            import torch
+            torch.set_num_threads(args.threads)
+
+    import uvicorn
+    config = uvicorn.Config(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        log_level=args.log_level,
+        access_log=not args.no_access_log
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from workers forked after loading the model.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker (default: CPUs / workers)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args()
+    if args.threads is None:
+        args.threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    # The listening socket is created once and inherited by every worker
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+
+    started = time.perf_counter()
+    preload()
+    print(f"Preloaded in {time.perf_counter() - started:.1f}s (pid {os.getpid()})")
+
+    workers: dict[int, int] = {}  # pid -> worker index
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, sock, args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for index in range(args.workers):
+        spawn(index)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}; restarting")
+            time.sleep(1)
+            if not stopping:
+                spawn(index)
+
+if __name__ == "__main__":
+    main()
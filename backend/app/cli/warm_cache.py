@@ -0,0 +1,69 @@
+"""
+Pre-generates LLM explanations for every rule in DRUG_RULES so that
+/analyze-with-explanation is served from the explanation cache.
+
+Usage (from backend/):
+    python -m app.cli.warm_cache [--concurrency 2] [--clear]
+"""
+import argparse
+import asyncio
+import time
+
+from app.engine.rule_index import get_rule_index
+from app.services.explanation_service import explain_result, explanation_cache_key
+from ml.explanation_cache import explanation_cache
+from ml.local_llm import local_llm, is_fallback_response
+
+async def warm_cache(concurrency: int) -> int:
+    rules = get_rule_index().rules()
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+    done = 0
+
+    async def warm_one(drug, gene, result):
+        nonlocal failures, done
+        async with semaphore:
+            risk_label = result.risk_assessment.risk_label
+            key = explanation_cache_key(drug, gene, result.phenotype, risk_label)
+            if explanation_cache.get(key) is not None:
+                status = "cached"
+            else:
+                started = time.perf_counter()
+                explanation = await explain_result(
+                    drug=drug,
+                    gene=gene,
+                    phenotype=result.phenotype,
+                    risk_label=risk_label,
+                    rule_summary=f"{result.clinical_recommendation.dose_adjustment} {result.clinical_recommendation.monitoring}"
+                )
+                if is_fallback_response(explanation):
+                    failures += 1
+                    status = f"FAILED ({explanation.get('clinical_reasoning')})"
+                else:
+                    status = f"generated in {time.perf_counter() - started:.1f}s"
+            done += 1
+            print(f"[{done}/{len(rules)}] {drug} / {gene} / {result.phenotype}: {status}")
+
+    await asyncio.gather(*(warm_one(drug, gene, result) for drug, gene, result in rules))
+    await local_llm.aclose()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the explanation cache for all rule combinations.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Parallel generations")
+    parser.add_argument("--clear", action="store_true", help="Empty the cache before warming")
+    args = parser.parse_args()
+
+    if explanation_cache is None:
+        raise SystemExit("Explanation cache is disabled (EXPLANATION_CACHE_ENABLED=0).")
+    if args.clear:
+        explanation_cache.clear()
+
+    started = time.perf_counter()
+    failures = asyncio.run(warm_cache(args.concurrency))
+    print(f"Done in {time.perf_counter() - started:.1f}s. Cache: {explanation_cache.stats()}")
+    if failures:
+        raise SystemExit(f"{failures} combination(s) failed; re-run once Ollama is available.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Star-Allele Definitions
+# Maps Gene -> Star allele -> defining variants (rsID -> ALT allele)
+# Based on PharmVar core alleles, GRCh38 coordinates.
+# Only alleles that can be called from SNVs are listed (e.g. CYP2D6 *5 / xN
+# are structural and must be supplied as a diplotype directly).
+
+ALLELE_DEFINITIONS = {
+    "CYP2C19": {
+        "*2": {"rs4244285": "A"},
+        "*3": {"rs4986893": "A"},
+        "*17": {"rs12248560": "T"}
+    },
+    "CYP2C9": {
+        "*2": {"rs1799853": "T"},
+        "*3": {"rs1057910": "C"}
+    },
+    "CYP2D6": {
+        "*2": {"rs16947": "A"},
+        "*4": {"rs3892097": "T"}
+    },
+    "SLCO1B1": {
+        "*5": {"rs4149056": "C"},
+        "*15": {"rs4149056": "C", "rs2306283": "G"}
+    },
+    "TPMT": {
+        "*3A": {"rs1800460": "T", "rs1142345": "C"},
+        "*3C": {"rs1142345": "C"}
+    },
+    "DPYD": {
+        "*2A": {"rs3918290": "T"},
+        "*13": {"rs55886062": "C"}
+    }
+}
+
+# Variant coordinates, used to match records that carry no rsID.
+VARIANT_POSITIONS = {
+    "rs4244285": ("10", 94781859),
+    "rs4986893": ("10", 94780653),
+    "rs12248560": ("10", 94761900),
+    "rs1799853": ("10", 94942290),
+    "rs1057910": ("10", 94981296),
+    "rs16947": ("22", 42127941),
+    "rs3892097": ("22", 42128945),
+    "rs4149056": ("12", 21178615),
+    "rs2306283": ("12", 21176804),
+    "rs1800460": ("6", 18138997),
+    "rs1142345": ("6", 18130687),
+    "rs3918290": ("1", 97450058),
+    "rs55886062": ("1", 97515839)
+}
+
+# Gene Regions (chromosome, start, end), GRCh38, 1-based inclusive.
+# CYP2C19 is padded upstream to cover the *17 promoter variant.
+PHARMACOGENE_REGIONS = {
+    "CYP2C19": ("10", 94760681, 94855547),
+    "CYP2C9": ("10", 94938658, 94990091),
+    "CYP2D6": ("22", 42126499, 42130881),
+    "SLCO1B1": ("12", 21130388, 21239796),
+    "TPMT": ("6", 18128311, 18155305),
+    "DPYD": ("1", 97077743, 97921049)
+}
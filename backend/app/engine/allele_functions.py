@@ -0,0 +1,102 @@
+# Allele Function Tables
+# Maps Gene -> phenotype method, per-allele value and phenotype assignment
+# Based on CPIC allele functionality tables and phenotype standardization.
+#
+#   activity_score - allele value is its activity value; a diplotype's score is
+#                    the sum over both alleles (times copy number) and is binned
+#                    by `phenotypes`: (highest score, phenotype), None = no upper bound
+#   function_pairs - allele value is its function category; `phenotypes` maps
+#                    the unordered "function/function" pair to a phenotype
+#
+# Explicit PHENOTYPE_MAP entries take precedence over computed phenotypes.
+
+ACTIVITY_SCORE = "activity_score"
+FUNCTION_PAIRS = "function_pairs"
+
+ALLELE_FUNCTIONS = {
+    "CYP2D6": {
+        "method": ACTIVITY_SCORE,
+        "alleles": {
+            "*1": 1.0, "*2": 1.0, "*35": 1.0,
+            "*9": 0.5, "*17": 0.5, "*29": 0.5, "*41": 0.5,
+            "*10": 0.25,
+            "*3": 0.0, "*4": 0.0, "*5": 0.0, "*6": 0.0
+        },
+        "phenotypes": [
+            [0.0, "Poor Metabolizer"],
+            [1.0, "Intermediate Metabolizer"],
+            [2.25, "Normal Metabolizer"],
+            [None, "Ultrarapid Metabolizer"]
+        ]
+    },
+    "CYP2C9": {
+        "method": ACTIVITY_SCORE,
+        "alleles": {
+            "*1": 1.0,
+            "*2": 0.5, "*5": 0.5, "*8": 0.5, "*11": 0.5,
+            "*3": 0.0, "*6": 0.0
+        },
+        "phenotypes": [
+            [0.5, "Poor Metabolizer"],
+            [1.5, "Intermediate Metabolizer"],
+            [None, "Normal Metabolizer"]
+        ]
+    },
+    "DPYD": {
+        "method": ACTIVITY_SCORE,
+        "alleles": {
+            "*1": 1.0,
+            "*2A": 0.0, "*13": 0.0
+        },
+        "phenotypes": [
+            [0.5, "Poor Metabolizer"],
+            [1.5, "Intermediate Metabolizer"],
+            [None, "Normal Metabolizer"]
+        ]
+    },
+    "CYP2C19": {
+        "method": FUNCTION_PAIRS,
+        "alleles": {
+            "*1": "normal",
+            "*17": "increased",
+            "*9": "decreased",
+            "*2": "no", "*3": "no", "*4": "no", "*5": "no", "*6": "no", "*8": "no"
+        },
+        "phenotypes": {
+            "normal/normal": "Normal Metabolizer",
+            "normal/increased": "Rapid Metabolizer",
+            "increased/increased": "Ultrarapid Metabolizer",
+            "normal/decreased": "Intermediate Metabolizer",
+            "increased/decreased": "Intermediate Metabolizer",
+            "decreased/decreased": "Intermediate Metabolizer",
+            "normal/no": "Intermediate Metabolizer",
+            "increased/no": "Intermediate Metabolizer",
+            "decreased/no": "Poor Metabolizer",
+            "no/no": "Poor Metabolizer"
+        }
+    },
+    "TPMT": {
+        "method": FUNCTION_PAIRS,
+        "alleles": {
+            "*1": "normal",
+            "*2": "no", "*3A": "no", "*3B": "no", "*3C": "no", "*4": "no"
+        },
+        "phenotypes": {
+            "normal/normal": "Normal Metabolizer",
+            "normal/no": "Intermediate Metabolizer",
+            "no/no": "Poor Metabolizer"
+        }
+    },
+    "SLCO1B1": {
+        "method": FUNCTION_PAIRS,
+        "alleles": {
+            "*1": "normal",
+            "*5": "no", "*15": "no"
+        },
+        "phenotypes": {
+            "normal/normal": "Normal Function",
+            "normal/no": "Decreased Function",
+            "no/no": "Poor Metabolizer"
+        }
+    }
+}
@@ -0,0 +1,247 @@
+# Columnar Genotype Matrix
+# Multi-sample (biobank-style) VCFs are read into an int8 matrix of defining-ALT
+# copies (variants x samples). Diplotypes, phenotypes and rule results are then
+# computed for all samples at once with array operations; per-sample Python work
+# is limited to building the final response objects.
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.models.schemas import AnalyzeResponse, PharmacogenomicProfile
+from app.engine.allele_definitions import ALLELE_DEFINITIONS
+from app.engine.rule_index import get_rule_index
+from app.engine.phenotype_engine import INDETERMINATE
+from app.engine.vcf_parser import DEFINING_ALTS, VCFParseResult, VCFStreamParser, allele_sort_key
+
+MISSING = -1
+
+_SLASH, _PIPE, _COLON, _DOT, _ZERO = (ord(c) for c in "/|:.0")
+_GT_SPLIT = re.compile(rb"[/|]")
+
+# rsID -> gene whose allele definitions use it
+DEFINING_GENES = {
+    rsid: gene
+    for gene, alleles in ALLELE_DEFINITIONS.items()
+    for variants in alleles.values()
+    for rsid in variants
+}
+
+@dataclass
+class GenotypeMatrix:
+    """
+    Copies of each defining ALT allele per sample; MISSING where the genotype is missing.
+    Variants absent from the file are all zeros (reference), as in call_diplotype.
+    """
+    samples: list[str]
+    rsids: list[str]
+    dosage: np.ndarray
+    stats: VCFParseResult = field(default_factory=VCFParseResult)
+
+    def rows(self, rsids: Iterable[str]) -> list[int]:
+        index = {rsid: row for row, rsid in enumerate(self.rsids)}
+        return [index[rsid] for rsid in rsids]
+
+    def missing_per_sample(self) -> np.ndarray:
+        return (self.dosage == MISSING).sum(axis=0)
+
+def _alt_copies(format_field: bytes, sample_fields: list[bytes], alt_code: Optional[int]) -> np.ndarray:
+    """
+    Vectorized alt_copies() over all sample columns of one record.
+    `alt_code` is the ASCII digit of the defining ALT (None: count any non-reference allele).
+    """
+    n = len(sample_fields)
+    keys = format_field.split(b":")
+    if b"GT" not in keys:
+        return np.full(n, MISSING, dtype=np.int8)
+    gt_index = keys.index(b"GT")
+    if gt_index:
+        sample_fields = [
+            values[gt_index] if gt_index < len(values) else b"."
+            for values in (sample.split(b":") for sample in sample_fields)
+        ]
+
+    # Fixed-width byte view: the common "a/b" diploid single-digit GT is
+    # decoded for every sample at once; anything else takes the slow path.
+    raw = np.array(sample_fields, dtype=bytes)
+    width = raw.itemsize
+    copies = np.zeros(n, dtype=np.int8)
+    simple = np.zeros(n, dtype=bool)
+    if width >= 3:
+        chars = raw.view(np.uint8).reshape(n, width)
+        first, sep, second = chars[:, 0], chars[:, 1], chars[:, 2]
+        simple = (sep == _SLASH) | (sep == _PIPE)
+        if width > 3:
+            simple &= (chars[:, 3] == _COLON) | (chars[:, 3] == 0)
+        if alt_code is not None:
+            copies = ((first == alt_code).astype(np.int8) + (second == alt_code))
+        else:
+            copies = (
+                ((first != _ZERO) & (first != _DOT)).astype(np.int8)
+                + ((second != _ZERO) & (second != _DOT))
+            )
+        copies = copies.astype(np.int8)
+        copies[simple & (first == _DOT) & (second == _DOT)] = MISSING
+
+    for sample in np.flatnonzero(~simple):
+        genotype = sample_fields[sample].split(b":")[0]
+        if genotype in (b".", b"./.", b".|.", b""):
+            copies[sample] = MISSING
+            continue
+        alleles = _GT_SPLIT.split(genotype)
+        if alt_code is not None:
+            copies[sample] = alleles.count(bytes([alt_code]))
+        else:
+            copies[sample] = sum(1 for allele in alleles if allele not in (b"0", b"."))
+    return copies
+
+class VCFMatrixParser(VCFStreamParser):
+    """
+    Incremental multi-sample VCF reader producing a GenotypeMatrix.
+    Only records of defining variants for the requested genes are decoded.
+    """
+    def __init__(self, genes: Optional[Iterable[str]] = None):
+        super().__init__(genes=genes)
+        self.samples: list[str] = []
+        self.rsids = [
+            rsid
+            for gene in sorted(self.genes) if gene in ALLELE_DEFINITIONS
+            for rsid in dict.fromkeys(
+                rsid for variants in ALLELE_DEFINITIONS[gene].values() for rsid in variants
+            )
+        ]
+        self._row_of = {rsid: row for row, rsid in enumerate(self.rsids)}
+        self._columns: list[Optional[np.ndarray]] = [None] * len(self.rsids)
+
+    def _parse_header(self, line: bytes) -> None:
+        super()._parse_header(line)
+        self.samples = line.decode().split("\t")[9:]
+
+    def _parse_record(self, line: bytes, chrom: bytes) -> None:
+        located = self._locate(line, chrom)
+        if located is None:
+            return
+        fields, gene, _, _, rsid = located
+        row = self._row_of.get(rsid)
+        if row is None or DEFINING_GENES[rsid] != gene:
+            return
+        n = len(self.samples)
+        if len(fields) < 9 + n:
+            self.result.malformed_records += 1
+            return
+
+        alts = fields[4].split(b",")
+        expected = DEFINING_ALTS[rsid].encode()
+        alt_code = ord(str(alts.index(expected) + 1)) if expected in alts and alts.index(expected) < 9 else None
+        copies = _alt_copies(fields[8], fields[9:9 + n], alt_code)
+        # Duplicate records for one variant: keep the highest dosage, as call_diplotype does
+        previous = self._columns[row]
+        self._columns[row] = copies if previous is None else np.maximum(previous, copies)
+
+    def close(self) -> GenotypeMatrix:
+        stats = super().close()
+        n = len(self.samples)
+        dosage = np.zeros((len(self.rsids), n), dtype=np.int8)
+        for row, column in enumerate(self._columns):
+            if column is not None:
+                dosage[row] = column
+        return GenotypeMatrix(samples=self.samples, rsids=self.rsids, dosage=dosage, stats=stats)
+
+def read_genotype_matrix(chunks: Iterable[bytes], genes: Optional[Iterable[str]] = None) -> GenotypeMatrix:
+    parser = VCFMatrixParser(genes=genes)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+@dataclass
+class DiplotypeCalls:
+    """
+    Per-sample diplotypes for one gene as codes into `diplotypes` / `phenotypes`.
+    The last code is Indeterminate (more than two alleles called).
+    """
+    gene: str
+    codes: np.ndarray
+    diplotypes: list[str]
+    phenotypes: list[str]
+
+    def diplotype_of(self, sample: int) -> str:
+        return self.diplotypes[self.codes[sample]]
+
+    def phenotype_of(self, sample: int) -> str:
+        return self.phenotypes[self.codes[sample]]
+
+def call_diplotypes(matrix: GenotypeMatrix, gene: str) -> DiplotypeCalls:
+    """
+    Vectorized call_diplotype() for every sample: alleles defined by more
+    variants are matched first, uncalled copies default to *1, and more than
+    two called alleles give Indeterminate.
+    """
+    definitions = sorted(ALLELE_DEFINITIONS.get(gene, {}).items(), key=lambda item: -len(item[1]))
+    alleles = ["*1"] + [allele for allele, _ in definitions]
+    m = len(alleles)
+    n = len(matrix.samples)
+
+    # Missing genotypes count as reference, as in the single-sample path
+    gene_rsids = list(dict.fromkeys(rsid for _, variants in definitions for rsid in variants))
+    gene_rows = matrix.rows(gene_rsids)
+    dosage = np.clip(matrix.dosage[gene_rows], 0, None).astype(np.int8)
+    local = {rsid: row for row, rsid in enumerate(gene_rsids)}
+
+    first = np.zeros(n, dtype=np.int16)
+    second = np.zeros(n, dtype=np.int16)
+    filled = np.zeros(n, dtype=np.int8)
+    called = np.zeros(n, dtype=np.int16)
+    for k, (_, variants) in enumerate(definitions, start=1):
+        rows = [local[rsid] for rsid in variants]
+        copies = dosage[rows].min(axis=0)
+        dosage[rows] -= copies
+        first[(filled == 0) & (copies >= 1)] = k
+        second[((filled == 0) & (copies >= 2)) | ((filled == 1) & (copies >= 1))] = k
+        filled = np.minimum(filled + copies, 2).astype(np.int8)
+        called += copies
+
+    # Order each pair naturally (*1 < *2 < *17 < ...) and encode it as lo * m + hi
+    rank = np.empty(m, dtype=np.int16)
+    rank[sorted(range(m), key=lambda i: allele_sort_key(alleles[i]))] = np.arange(m)
+    lo = np.where(rank[first] <= rank[second], first, second)
+    hi = np.where(rank[first] <= rank[second], second, first)
+    codes = (lo.astype(np.int32) * m + hi).astype(np.int32)
+    codes[called > 2] = m * m
+
+    index = get_rule_index()
+    diplotypes = [f"{alleles[code // m]}/{alleles[code % m]}" for code in range(m * m)] + [INDETERMINATE]
+    phenotypes = [index.phenotype(gene, diplotype) for diplotype in diplotypes]
+    return DiplotypeCalls(gene=gene, codes=codes, diplotypes=diplotypes, phenotypes=phenotypes)
+
+def evaluate_genotype_matrix(matrix: GenotypeMatrix, drugs: Iterable[tuple[str, str]]) -> list[AnalyzeResponse]:
+    """
+    Rule-engine results for every (sample, drug) pair, sample-major.
+    Each distinct diplotype is looked up once per drug; responses share the
+    resulting sub-models.
+    """
+    index = get_rule_index()
+    per_drug = []
+    for drug, gene in drugs:
+        calls = call_diplotypes(matrix, gene)
+        outcomes = {}
+        for code in np.unique(calls.codes).tolist():
+            diplotype = calls.diplotypes[code]
+            rule = index.lookup(drug, gene, diplotype)
+            profile = PharmacogenomicProfile(primary_gene=gene, diplotype=diplotype, phenotype=rule.phenotype)
+            outcomes[code] = (profile, rule)
+        per_drug.append((drug, calls.codes.tolist(), outcomes))
+
+    results = []
+    for sample, patient_id in enumerate(matrix.samples):
+        for drug, codes, outcomes in per_drug:
+            profile, rule = outcomes[codes[sample]]
+            results.append(AnalyzeResponse(
+                patient_id=patient_id,
+                drug=drug,
+                risk_assessment=rule.risk_assessment,
+                pharmacogenomic_profile=profile,
+                clinical_recommendation=rule.clinical_recommendation
+            ))
+    return results
@@ -0,0 +1,224 @@
+# Activity-Score Phenotype Engine
+# Computes phenotypes from per-allele function (ALLELE_FUNCTIONS) instead of
+# enumerated diplotypes, following the CPIC activity-score and function-pair
+# methods. Copy-number forms (*1x2, *1xN) multiply the allele's activity;
+# function-pair genes have no phenotype for them (Indeterminate).
+#
+# Every allele x allele combination of a gene is precomputed into a flat
+# array of phenotype codes when the rules load; a lookup is two dict lookups
+# and one array index, in either allele order. Spellings already seen are
+# memoized, so repeated lookups are a single dict lookup.
+
+import math
+import re
+from array import array
+from typing import Optional
+
+from app.engine.allele_functions import ACTIVITY_SCORE, FUNCTION_PAIRS
+
+INDETERMINATE = "Indeterminate"
+
+# Copy numbers precomputed for activity-score alleles: 1 to MAX_COPIES, one
+# entry for every reported count above MAX_COPIES ("at least ABOVE_MAX_COPIES
+# copies") and "xN" (count not reported: "two or more copies"). The open-ended
+# entries get the phenotype that every count in their range gives, and
+# Indeterminate when the count would change the phenotype.
+MAX_COPIES = 4
+ABOVE_MAX_COPIES = MAX_COPIES + 1
+UNSPECIFIED_COPIES = None
+
+_COPY_SUFFIX = re.compile(r"X(\d+|N)$")
+_STAR_NUMBER = re.compile(r"^\*(\d+)(.*)$")
+
+def parse_allele(token: str) -> Optional[tuple[str, Optional[int]]]:
+    """
+    ("*1", 3) for "*1x3", "*1X3" or "CYP2D6*1x3", ("*1", None) for "*1xN";
+    None if the token is not a star allele.
+    """
+    token = token.strip().upper()
+    star = token.find("*")
+    if star < 0:
+        return None
+    name = token[star:]
+    copies = 1
+    match = _COPY_SUFFIX.search(name)
+    if match:
+        name = name[:match.start()]
+        copies = UNSPECIFIED_COPIES if match.group(1) == "N" else int(match.group(1))
+    if len(name) < 2 or (copies is not None and copies < 1):
+        return None
+    return name, copies
+
+def allele_label(name: str, copies: Optional[int]) -> str:
+    if copies is UNSPECIFIED_COPIES:
+        return f"{name}xN"
+    return name if copies == 1 else f"{name}x{copies}"
+
+def _allele_order(label: str) -> tuple:
+    # Star-allele order: *2 < *2A < *10, copy number last (xN after the counts)
+    name, copies = parse_allele(label)
+    copies = ABOVE_MAX_COPIES + 1 if copies is UNSPECIFIED_COPIES else copies
+    match = _STAR_NUMBER.match(name)
+    if match:
+        return (0, int(match.group(1)), match.group(2), copies)
+    return (1, 0, name, copies)
+
+def canonical_diplotype(diplotype: str) -> Optional[str]:
+    """
+    Canonical spelling of a diplotype: "*2/*1" -> "*1/*2", "*4 / *1XN" -> "*1xN/*4".
+    None if it is not two star alleles.
+    """
+    first, sep, second = diplotype.partition("/")
+    alleles = [parse_allele(first), parse_allele(second)] if sep else [None]
+    if None in alleles:
+        return None
+    return "/".join(sorted((allele_label(*allele) for allele in alleles), key=_allele_order))
+
+def compute_phenotype(functions: dict, first, second) -> str:
+    """
+    Phenotype for two allele values (activity values already multiplied by copy number).
+    """
+    if functions["method"] == ACTIVITY_SCORE:
+        score = first + second
+        for highest, phenotype in functions["phenotypes"]:
+            if highest is None or score <= highest:
+                return phenotype
+        return INDETERMINATE
+    pairs = functions["phenotypes"]
+    return pairs.get(f"{first}/{second}") or pairs.get(f"{second}/{first}") or INDETERMINATE
+
+def _activity_range(activity: float, copies: Optional[int]) -> tuple[float, float]:
+    # (lowest, highest) activity of an allele entry; the open-ended entries have no upper bound
+    if copies is UNSPECIFIED_COPIES:
+        lowest = activity * 2
+    elif copies >= ABOVE_MAX_COPIES:
+        lowest = activity * ABOVE_MAX_COPIES
+    else:
+        return activity * copies, activity * copies
+    return lowest, math.inf if activity else 0.0
+
+def _range_phenotype(functions: dict, first: tuple[float, float], second: tuple[float, float]) -> str:
+    # Score bins are ordered, so equal phenotypes at both ends hold for every score between
+    lowest = compute_phenotype(functions, first[0], second[0])
+    return lowest if lowest == compute_phenotype(functions, first[1], second[1]) else INDETERMINATE
+
+class PhenotypeTable:
+    """
+    Phenotypes of every diplotype of one gene: allele -> index, and a flat
+    (alleles x alleles) array of codes into `phenotypes`. Code 0 is Indeterminate.
+    """
+    __slots__ = ("gene", "labels", "phenotypes", "codes", "size", "_index", "_memo", "_memo_limit")
+
+    def __init__(self, gene: str, labels: list[str], phenotypes: list[str], codes: array):
+        self.gene = gene
+        self.labels = labels
+        self.phenotypes = phenotypes
+        self.codes = codes
+        self.size = len(labels)
+        # Upper-cased spellings (as normalize_diplotype produces) -> index
+        self._index = {label.upper(): i for i, label in enumerate(labels)}
+        # Diplotype spelling -> code; bounded so arbitrary input cannot grow it without limit
+        self._memo: dict[str, int] = {}
+        self._memo_limit = 4 * len(self._index) ** 2
+
+    def __len__(self) -> int:
+        return self.size * self.size
+
+    def _allele_index(self, token: str) -> Optional[int]:
+        # Unusual spelling (gene prefix, lower case, spaces) or a count above MAX_COPIES
+        allele = parse_allele(token)
+        if allele is None:
+            return None
+        name, copies = allele
+        if copies is not UNSPECIFIED_COPIES and copies > MAX_COPIES:
+            copies = ABOVE_MAX_COPIES
+        return self._index.get(allele_label(name, copies).upper())
+
+    def code(self, diplotype: str) -> int:
+        code = self._memo.get(diplotype)
+        if code is None:
+            code = self._code(diplotype)
+            if len(self._memo) < self._memo_limit:
+                self._memo[diplotype] = code
+        return code
+
+    def _code(self, diplotype: str) -> int:
+        first, sep, second = diplotype.partition("/")
+        i = self._index.get(first)
+        j = self._index.get(second)
+        if i is None or j is None:
+            if not sep:
+                return 0
+            i = self._allele_index(first) if i is None else i
+            j = self._allele_index(second) if j is None else j
+            if i is None or j is None:
+                return 0
+        return self.codes[i * self.size + j]
+
+    def phenotype(self, diplotype: str) -> str:
+        return self.phenotypes[self.code(diplotype)]
+
+    def diplotypes(self) -> list[tuple[str, str]]:
+        """
+        Every (canonical diplotype, phenotype) with a known phenotype.
+        """
+        return [
+            (f"{self.labels[i]}/{self.labels[j]}", self.phenotypes[self.codes[i * self.size + j]])
+            for i in range(self.size)
+            for j in range(i, self.size)
+            if self.codes[i * self.size + j]
+        ]
+
+def build_phenotype_table(gene: str, functions: Optional[dict], overrides: dict[str, str]) -> PhenotypeTable:
+    """
+    Precomputes the table for one gene from its allele functions (may be None)
+    and explicit diplotype -> phenotype entries, which take precedence.
+    """
+    if functions is not None and functions["method"] not in (ACTIVITY_SCORE, FUNCTION_PAIRS):
+        raise ValueError(f"Unknown phenotype method for {gene}: {functions['method']!r}")
+
+    # 1. Alleles: every defined allele (for activity scores with each copy number,
+    #    the above-MAX_COPIES entry and xN, valued by activity range), then alleles
+    #    only named by explicit entries
+    values: dict[str, object] = {}
+    activity = functions is not None and functions["method"] == ACTIVITY_SCORE
+    if functions is not None:
+        for name, value in functions["alleles"].items():
+            for copies in [*range(1, ABOVE_MAX_COPIES + 1), UNSPECIFIED_COPIES] if activity else (1,):
+                values[allele_label(name.upper(), copies)] = _activity_range(value, copies) if activity else value
+    explicit = []
+    for diplotype, phenotype in overrides.items():
+        canonical = canonical_diplotype(diplotype)
+        if canonical is None:
+            print(f"Ignoring unparseable {gene} diplotype {diplotype!r}")
+            continue
+        first, second = canonical.split("/")
+        for label in (first, second):
+            values.setdefault(label, None)
+        explicit.append((first, second, phenotype))
+    labels = sorted(values, key=_allele_order)
+    positions = {label: i for i, label in enumerate(labels)}
+
+    # 2. Computed phenotypes for every pair, then the explicit entries
+    phenotypes = [INDETERMINATE]
+    codes_of = {INDETERMINATE: 0}
+
+    def code_of(phenotype: str) -> int:
+        if phenotype not in codes_of:
+            codes_of[phenotype] = len(phenotypes)
+            phenotypes.append(phenotype)
+        return codes_of[phenotype]
+
+    size = len(labels)
+    codes = array("B", bytes(size * size))
+    for i, first in enumerate(labels):
+        for j in range(i, size):
+            second = labels[j]
+            if values[first] is None or values[second] is None:
+                continue
+            phenotype = (_range_phenotype if activity else compute_phenotype)(functions, values[first], values[second])
+            codes[i * size + j] = codes[j * size + i] = code_of(phenotype)
+    for first, second, phenotype in explicit:
+        i, j = positions[first], positions[second]
+        codes[i * size + j] = codes[j * size + i] = code_of(phenotype)
+    return PhenotypeTable(gene, labels, phenotypes, codes)
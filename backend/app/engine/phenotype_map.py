@@ -1,6 +1,7 @@
 # Phenotype Mapping
 # Maps Gene -> Diplotype -> Phenotype
 # Based on CPIC / PharmVar standardized terms
+# Explicit entries; every other diplotype is computed from allele_functions.py
 
 PHENOTYPE_MAP = {
     "CYP2C19": {
@@ -59,7 +60,9 @@ PHENOTYPE_MAP = {
 
 def get_phenotype(gene: str, diplotype: str) -> str:
     """
-    Returns the phenotype for a given gene and diplotype.
-    Defaults to 'Indeterminate' if not found.
+    Returns the phenotype for a given gene and diplotype: listed above, or
+    computed from allele function by the active rule index.
+    Defaults to 'Indeterminate' if neither applies.
     """
-    return PHENOTYPE_MAP.get(gene, {}).get(diplotype, "Indeterminate")
+    from app.engine.rule_index import get_rule_index
+    return get_rule_index().phenotype(gene, diplotype)
@@ -1,67 +1,161 @@
+from functools import lru_cache
+from typing import Any, Iterable, Mapping, Union
+
+from pydantic_core import to_json
+
 from app.models.schemas import (
+    AnalyzeRequest,
     AnalyzeResponse, 
-    RiskAssessment, 
     PharmacogenomicProfile, 
-    ClinicalRecommendation
+    BatchItemResult,
+    PanelAnalyzeResponse
 )
-from app.engine.phenotype_map import get_phenotype
-from app.engine.drug_rules import DRUG_RULES
+from app.engine.rule_index import RuleIndex, get_rule_index
+from app.metrics import timed
 
+@timed("rule_engine")
 def evaluate_drug_risk(patient_id: str, gene: str, diplotype: str, drug: str) -> AnalyzeResponse:
     """
     Evaluates the risk of a drug based on genetic diplotype.
     Deterministic and based on CPIC guidelines defined in constants.
+    Drug, gene and diplotype are matched case-insensitively via the compiled rule index.
     """
-    
-    # 1. Validate inputs & Normalize
-    # (Basic validation is handled by Pydantic, here we handle logic)
-    
-    # 2. Determine Phenotype
-    phenotype = get_phenotype(gene, diplotype)
-    
-    # 3. Prepare Default/Fallback Response
-    risk_assessment = RiskAssessment(
-        risk_label="Unknown",
-        confidence_score=0.5,
-        severity="low"
-    )
-    clinical_recommendation = ClinicalRecommendation(
-        dose_adjustment="No specific guideline found for this phenotype/drug combination.",
-        monitoring="Standard monitoring."
-    )
-    
-    # 4. Lookup Rule
-    drug_entry = DRUG_RULES.get(drug)
-    if drug_entry:
-        gene_entry = drug_entry.get(gene)
-        if gene_entry:
-            rule = gene_entry.get(phenotype)
-            
-            if rule:
-                risk_assessment = RiskAssessment(
-                    risk_label=rule["risk_label"],
-                    confidence_score=rule["confidence_score"],
-                    severity=rule["severity"]
-                )
-                clinical_recommendation = ClinicalRecommendation(
-                    dose_adjustment=rule["dose_adjustment"],
-                    monitoring=rule["monitoring"]
-                )
-            elif phenotype == "Indeterminate":
-                # Fallback for indeterminate phenotype
-                clinical_recommendation.dose_adjustment = "Diplotype not recognized. improved genetic data required."
+    return _response(get_rule_index(), patient_id, gene, diplotype, drug)
 
-    # 5. Construct Final Response
+def _response(index: RuleIndex, patient_id: str, gene: str, diplotype: str, drug: str) -> AnalyzeResponse:
+    rule = index.lookup(drug, gene, diplotype)
     profile = PharmacogenomicProfile(
         primary_gene=gene,
         diplotype=diplotype,
-        phenotype=phenotype
+        phenotype=rule.phenotype
     )
-    
+
     return AnalyzeResponse(
         patient_id=patient_id,
         drug=drug,
-        risk_assessment=risk_assessment,
+        risk_assessment=rule.risk_assessment,
         pharmacogenomic_profile=profile,
-        clinical_recommendation=clinical_recommendation
+        clinical_recommendation=rule.clinical_recommendation
+    )
+
+@timed("rule_engine")
+def render_drug_risk(patient_id: str, gene: str, diplotype: str, drug: str) -> bytes:
+    """
+    evaluate_drug_risk serialized as AnalyzeResponse JSON, without building models:
+    the request's values are spliced between the rule's pre-rendered fragments.
+    """
+    rule = get_rule_index().lookup(drug, gene, diplotype)
+    return b"".join([
+        b'{"patient_id":', to_json(patient_id),
+        b',"drug":', to_json(drug),
+        rule.json_head, to_json(gene),
+        b',"diplotype":', to_json(diplotype),
+        rule.json_tail
+    ])
+
+# Batch evaluation
+# The response for a (gene, diplotype, drug) triple only differs by patient_id,
+# so batches evaluate each distinct triple once and copy it per patient.
+# The index is part of the cache key so a rule reload never serves stale entries.
+_REQUEST_FIELDS = ("patient_id", "gene", "diplotype", "drug")
+
+@lru_cache(maxsize=4096)
+def _evaluate_template(gene: str, diplotype: str, drug: str, index: RuleIndex) -> AnalyzeResponse:
+    # Resolved against `index`, not the active index: a reload mid-batch must not
+    # cache results of the new rules under the old index's key
+    return _response(index, "", gene, diplotype, drug)
+
+def _evaluate_item(
+    index: int, patient_id: Any, gene: Any, diplotype: Any, drug: Any, rules: RuleIndex
+) -> BatchItemResult:
+    if not (type(patient_id) is str and type(gene) is str and type(diplotype) is str and type(drug) is str):
+        values = (patient_id, gene, diplotype, drug)
+        name = next(name for name, value in zip(_REQUEST_FIELDS, values) if not isinstance(value, str))
+        return BatchItemResult(index=index, error=f"Field '{name}' must be a string")
+    try:
+        template = _evaluate_template(gene, diplotype, drug, rules)
+    except Exception as e:
+        return BatchItemResult(index=index, error=str(e))
+    # Sub-models are shared with the cached template; pydantic does not
+    # revalidate model instances, which keeps this cheaper than model_copy.
+    result = AnalyzeResponse(
+        patient_id=patient_id,
+        drug=template.drug,
+        risk_assessment=template.risk_assessment,
+        pharmacogenomic_profile=template.pharmacogenomic_profile,
+        clinical_recommendation=template.clinical_recommendation
     )
+    return BatchItemResult(index=index, result=result)
+
+def evaluate_drug_risk_batch(
+    requests: Iterable[Union[AnalyzeRequest, Mapping[str, Any]]]
+) -> list[BatchItemResult]:
+    """
+    Evaluates many patient x drug requests in one call.
+    Results are returned in input order; a malformed entry yields an error
+    result for that index instead of failing the whole batch.
+    """
+    rules = get_rule_index()
+    results = []
+    for index, item in enumerate(requests):
+        if isinstance(item, AnalyzeRequest):
+            results.append(_evaluate_item(index, item.patient_id, item.gene, item.diplotype, item.drug, rules))
+        elif type(item) is dict or isinstance(item, Mapping):
+            missing = [name for name in _REQUEST_FIELDS if name not in item]
+            if missing:
+                results.append(BatchItemResult(
+                    index=index, error=f"Missing field(s): {', '.join(missing)}"
+                ))
+                continue
+            results.append(_evaluate_item(
+                index, item["patient_id"], item["gene"], item["diplotype"], item["drug"], rules
+            ))
+        else:
+            results.append(BatchItemResult(
+                index=index, error="Request must be an object"
+            ))
+    return results
+
+def evaluate_drug_risk_columns(
+    patient_ids: list[str], genes: list[str], diplotypes: list[str], drugs: list[str]
+) -> list[BatchItemResult]:
+    """
+    Columnar variant of evaluate_drug_risk_batch: the i-th entry of each column forms one request.
+    """
+    if not (len(patient_ids) == len(genes) == len(diplotypes) == len(drugs)):
+        raise ValueError("All columns must have the same length")
+    rules = get_rule_index()
+    return [
+        _evaluate_item(index, patient_id, gene, diplotype, drug, rules)
+        for index, (patient_id, gene, diplotype, drug)
+        in enumerate(zip(patient_ids, genes, diplotypes, drugs))
+    ]
+
+def evaluate_panel(patient_id: str, genotypes: Mapping[str, str]) -> PanelAnalyzeResponse:
+    """
+    Evaluates one patient's gene -> diplotype calls against every drug with
+    rules for those genes, using the index's reverse gene -> drugs map.
+    """
+    rules = get_rule_index()
+    results = []
+    genes_without_rules = []
+    for gene, diplotype in genotypes.items():
+        matches = rules.lookup_gene(gene, diplotype)
+        if not matches:
+            genes_without_rules.append(gene)
+            continue
+        # All drugs for this gene share one profile
+        profile = PharmacogenomicProfile(
+            primary_gene=gene,
+            diplotype=diplotype,
+            phenotype=matches[0][1].phenotype
+        )
+        for drug, rule in matches:
+            results.append(AnalyzeResponse(
+                patient_id=patient_id,
+                drug=drug,
+                risk_assessment=rule.risk_assessment,
+                pharmacogenomic_profile=profile,
+                clinical_recommendation=rule.clinical_recommendation
+            ))
+    return PanelAnalyzeResponse(patient_id=patient_id, results=results, genes_without_rules=genes_without_rules)
@@ -0,0 +1,294 @@
+# Compiled Rule Index
+# Compiles DRUG_RULES, ALLELE_FUNCTIONS and PHENOTYPE_MAP into a normalized
+# (drug, gene, diplotype) -> RuleResult lookup, built once per rule version:
+# per gene, a precomputed phenotype table covering every allele combination
+# (see phenotype_engine), and per (drug, gene) one prebuilt result per phenotype.
+# The active index is swapped atomically on reload; readers never lock.
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from pydantic_core import to_json
+
+from app.models.schemas import RiskAssessment, ClinicalRecommendation
+from app.engine.drug_rules import DRUG_RULES
+from app.engine.phenotype_map import PHENOTYPE_MAP
+from app.engine.allele_functions import ALLELE_FUNCTIONS
+from app.engine.phenotype_engine import INDETERMINATE, PhenotypeTable, build_phenotype_table
+
+NO_GUIDELINE = ClinicalRecommendation(
+    dose_adjustment="No specific guideline found for this phenotype/drug combination.",
+    monitoring="Standard monitoring."
+)
+UNRECOGNIZED_DIPLOTYPE = ClinicalRecommendation(
+    dose_adjustment="Diplotype not recognized. improved genetic data required.",
+    monitoring="Standard monitoring."
+)
+UNKNOWN_RISK = RiskAssessment(risk_label="Unknown", confidence_score=0.5, severity="low")
+
+def normalize_drug(drug: str) -> str:
+    return drug.strip().lower()
+
+def normalize_gene(gene: str) -> str:
+    return gene.strip().upper()
+
+def normalize_diplotype(diplotype: str) -> str:
+    return diplotype.replace(" ", "").upper()
+
+@dataclass(frozen=True, slots=True)
+class RuleResult:
+    """
+    Prebuilt, immutable outcome of a rule lookup.
+    `json_head` / `json_tail` are the invariant parts of the serialized
+    AnalyzeResponse, around the request's gene and diplotype (see render_drug_risk).
+    """
+    phenotype: str
+    risk_assessment: RiskAssessment
+    clinical_recommendation: ClinicalRecommendation
+    matched: bool
+    json_head: bytes = field(init=False, repr=False, compare=False)
+    json_tail: bytes = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "json_head", b"".join([
+            b',"risk_assessment":', self.risk_assessment.model_dump_json().encode(),
+            b',"pharmacogenomic_profile":{"primary_gene":'
+        ]))
+        object.__setattr__(self, "json_tail", b"".join([
+            b',"phenotype":', to_json(self.phenotype),
+            b'},"clinical_recommendation":', self.clinical_recommendation.model_dump_json().encode(), b"}"
+        ]))
+
+class RuleIndex:
+    """
+    Immutable compiled view of a rule set. Build a new instance to change rules.
+    """
+    def __init__(
+        self,
+        drug_rules: dict,
+        phenotype_map: dict,
+        version: Optional[str] = None,
+        source: str = "builtin",
+        allele_functions: Optional[dict] = None
+    ):
+        allele_functions = ALLELE_FUNCTIONS if allele_functions is None else allele_functions
+        self.source = source
+        self.version = version or _content_version(drug_rules, phenotype_map, allele_functions)
+
+        # normalized gene -> phenotype of every diplotype (computed, then explicit entries)
+        functions = {normalize_gene(gene): value for gene, value in allele_functions.items()}
+        explicit = {normalize_gene(gene): value for gene, value in phenotype_map.items()}
+        self._tables: dict[str, PhenotypeTable] = {
+            gene_key: build_phenotype_table(gene_key, functions.get(gene_key), explicit.get(gene_key, {}))
+            for gene_key in {**functions, **explicit}
+        }
+
+        # normalized drug -> canonical drug name; (drug, gene) pairs with rules
+        self.drug_names: dict[str, str] = {}
+        self.gene_names: dict[str, str] = {normalize_gene(gene): gene for gene in [*allele_functions, *phenotype_map]}
+        self._drug_genes: dict[str, tuple[str, ...]] = {}
+        # Reverse index: normalized gene -> normalized drugs with rules for it
+        self._gene_drugs: dict[str, tuple[str, ...]] = {}
+        # (drug, gene) -> one result per phenotype code of the gene's table
+        self._results: dict[tuple[str, str], tuple[RuleResult, ...]] = {}
+        # (canonical drug, canonical gene, RuleResult) for every rule in the source tables
+        self._rules: list[tuple[str, str, RuleResult]] = []
+        # phenotype -> result for lookups without any rule set
+        self._no_guideline: dict[str, RuleResult] = {}
+
+        # Rule set exists but the diplotype is not recognized
+        unrecognized = RuleResult(
+            phenotype=INDETERMINATE,
+            risk_assessment=UNKNOWN_RISK,
+            clinical_recommendation=UNRECOGNIZED_DIPLOTYPE,
+            matched=False
+        )
+        for drug, genes in drug_rules.items():
+            drug_key = normalize_drug(drug)
+            self.drug_names[drug_key] = drug
+            self._drug_genes[drug_key] = tuple(genes)
+            for gene, phenotype_rules in genes.items():
+                gene_key = normalize_gene(gene)
+                self.gene_names.setdefault(gene_key, gene)
+                compiled = {
+                    phenotype: RuleResult(
+                        phenotype=phenotype,
+                        risk_assessment=RiskAssessment(
+                            risk_label=rule["risk_label"],
+                            confidence_score=rule["confidence_score"],
+                            severity=rule["severity"]
+                        ),
+                        clinical_recommendation=ClinicalRecommendation(
+                            dose_adjustment=rule["dose_adjustment"],
+                            monitoring=rule["monitoring"]
+                        ),
+                        matched=True
+                    )
+                    for phenotype, rule in phenotype_rules.items()
+                }
+                self._rules.extend((drug, gene, result) for result in compiled.values())
+                self._gene_drugs[gene_key] = self._gene_drugs.get(gene_key, ()) + (drug_key,)
+                table = self._tables.get(gene_key)
+                self._results[(drug_key, gene_key)] = (unrecognized,) + tuple(
+                    compiled.get(phenotype) or self._no_guideline_result(phenotype)
+                    for phenotype in (table.phenotypes[1:] if table is not None else [])
+                )
+
+    def __len__(self) -> int:
+        # (drug, gene, diplotype) combinations covered
+        return sum(len(self._tables[gene_key]) for _, gene_key in self._results if gene_key in self._tables)
+
+    def rules(self) -> list[tuple[str, str, RuleResult]]:
+        """
+        Every (drug, gene, RuleResult) defined by the rule tables.
+        """
+        return list(self._rules)
+
+    def phenotype_table(self, gene: str) -> Optional[PhenotypeTable]:
+        return self._tables.get(normalize_gene(gene))
+
+    def _phenotype_code(self, gene_key: str, diplotype: str) -> int:
+        table = self._tables.get(gene_key)
+        return table.code(normalize_diplotype(diplotype)) if table is not None else 0
+
+    def _no_guideline_result(self, phenotype: str) -> RuleResult:
+        # No rule for this phenotype: one shared result per phenotype
+        result = self._no_guideline.get(phenotype)
+        if result is None:
+            result = self._no_guideline.setdefault(phenotype, RuleResult(
+                phenotype=phenotype,
+                risk_assessment=UNKNOWN_RISK,
+                clinical_recommendation=NO_GUIDELINE,
+                matched=False
+            ))
+        return result
+
+    def phenotype(self, gene: str, diplotype: str) -> str:
+        table = self._tables.get(normalize_gene(gene))
+        if table is None:
+            return INDETERMINATE
+        return table.phenotypes[table.code(normalize_diplotype(diplotype))]
+
+    def lookup(self, drug: str, gene: str, diplotype: str) -> RuleResult:
+        """
+        Returns the prebuilt result for (drug, gene, diplotype). Keys are
+        case-insensitive and the diplotype may list its alleles in either order.
+        """
+        gene_key = normalize_gene(gene)
+        table = self._tables.get(gene_key)
+        code = table.code(normalize_diplotype(diplotype)) if table is not None else 0
+        results = self._results.get((normalize_drug(drug), gene_key))
+        if results is not None:
+            return results[code]
+        return self._no_guideline_result(table.phenotypes[code] if table is not None else INDETERMINATE)
+
+    def lookup_gene(self, gene: str, diplotype: str) -> list[tuple[str, RuleResult]]:
+        """
+        Every (canonical drug, RuleResult) with rules for `gene`, for one diplotype.
+        The phenotype is resolved once for all of the gene's drugs.
+        """
+        gene_key = normalize_gene(gene)
+        drug_keys = self._gene_drugs.get(gene_key, ())
+        if not drug_keys:
+            return []
+        code = self._phenotype_code(gene_key, diplotype)
+        return [(self.drug_names[drug_key], self._results[(drug_key, gene_key)][code]) for drug_key in drug_keys]
+
+    def resolve_drug(self, drug: str) -> tuple[str, tuple[str, ...]]:
+        """
+        Returns the canonical drug name and the genes it has rules for.
+        Raises ValueError for drugs without rules.
+        """
+        drug_key = normalize_drug(drug)
+        if drug_key not in self.drug_names:
+            raise ValueError(f"Unsupported drug: {drug}")
+        return self.drug_names[drug_key], self._drug_genes[drug_key]
+
+def _content_version(drug_rules: dict, phenotype_map: dict, allele_functions: dict) -> str:
+    payload = json.dumps([drug_rules, phenotype_map, allele_functions], sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+def load_rule_index(path: str) -> RuleIndex:
+    """
+    Builds an index from a JSON rules file:
+    {"version": "...", "drug_rules": {...}, "phenotype_map": {...}, "allele_functions": {...}}
+    Sections missing from the file fall back to the built-in tables.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return RuleIndex(
+        drug_rules=data.get("drug_rules", DRUG_RULES),
+        phenotype_map=data.get("phenotype_map", PHENOTYPE_MAP),
+        version=data.get("version"),
+        source=path,
+        allele_functions=data.get("allele_functions", ALLELE_FUNCTIONS)
+    )
+
+# Active index. Readers take a reference with get_rule_index(); reloads
+# build a complete new index first and then rebind it in one assignment.
+_active_index = RuleIndex(DRUG_RULES, PHENOTYPE_MAP)
+_reload_lock = threading.Lock()
+
+def get_rule_index() -> RuleIndex:
+    return _active_index
+
+def swap_rule_index(index: RuleIndex) -> RuleIndex:
+    """
+    Atomically replaces the active index and returns the previous one.
+    """
+    global _active_index
+    with _reload_lock:
+        previous, _active_index = _active_index, index
+    return previous
+
+def reload_rules(path: Optional[str] = None) -> RuleIndex:
+    """
+    Loads rules from `path` (or RULES_FILE, or the built-in tables) and activates them.
+    On error the current index stays active and the exception propagates.
+    """
+    path = path or os.getenv("RULES_FILE")
+    index = load_rule_index(path) if path else RuleIndex(DRUG_RULES, PHENOTYPE_MAP)
+    swap_rule_index(index)
+    print(f"Rule index {index.version} loaded from {index.source} ({len(index)} entries)")
+    return index
+
+class RulesFileWatcher:
+    """
+    Polls a rules file and reloads the index when its modification time changes.
+    """
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self._mtime = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rules-file-watcher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check(self) -> bool:
+        """
+        Reloads the file if its modification time changed; True if a new index was activated.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            reload_rules(self.path)
+            return True
+        except Exception as e:
+            print(f"Rules reload failed, keeping version {get_rule_index().version}: {e}")
+            return False
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
@@ -0,0 +1,430 @@
+# Indexed Region Access for BGZF VCFs
+# A bgzipped VCF is a series of independently compressed blocks, so with an
+# index we can seek straight to the pharmacogene regions and decompress only
+# the blocks that hold them instead of streaming the whole genome.
+#
+# Offsets are BGZF "virtual offsets": (block file offset << 16) | offset in block.
+# Indexes, in order of preference:
+#   <file>.tbi - tabix index (htslib `tabix -p vcf`), linear index only
+#   <file>.pgi - project index, built here on first use by one full scan
+#
+# VCFStreamParser also keeps records whose INFO has GENE=<gene> when they lie
+# outside that gene's region (e.g. other coordinate builds). The project index
+# records where those are, so indexed reads keep them too; a tabix index cannot,
+# and tabix-indexed reads only see the records inside the regions.
+
+import gzip
+import json
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
+
+from app.engine.allele_definitions import ALLELE_DEFINITIONS, PHARMACOGENE_REGIONS
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+TABIX_WINDOW_SHIFT = 14
+INDEX_VERSION = 2
+
+# Genes whose GENE= tags the project index records
+TAGGED_GENES = tuple(sorted(set(PHARMACOGENE_REGIONS) | set(ALLELE_DEFINITIONS)))
+
+class BGZFFile:
+    """
+    Random access to the blocks of a BGZF file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_block(self, coffset: int) -> tuple[bytes, int]:
+        """
+        Decompresses the block starting at file offset `coffset`.
+        Returns (data, offset of the next block); data is b"" at end of file.
+        """
+        self._file.seek(coffset)
+        header = self._file.read(18)
+        if len(header) < 18:
+            return b"", coffset
+        if header[:4] != BGZF_MAGIC:
+            raise ValueError(f"Not a BGZF block at offset {coffset}")
+        xlen = struct.unpack_from("<H", header, 10)[0]
+        extra = header[12:18] + self._file.read(xlen - 6)
+        block_size = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            si1, si2, slen = extra[pos], extra[pos + 1], struct.unpack_from("<H", extra, pos + 2)[0]
+            if si1 == 66 and si2 == 67:  # "BC"
+                block_size = struct.unpack_from("<H", extra, pos + 4)[0] + 1
+                break
+            pos += 4 + slen
+        if block_size is None:
+            raise ValueError(f"Missing BGZF block size at offset {coffset}")
+        compressed = self._file.read(block_size - 12 - xlen - 8)
+        self._file.read(8)  # CRC32 + ISIZE
+        return zlib.decompress(compressed, -15), coffset + block_size
+
+    def iter_blocks(self, voffset: int = 0) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields (block file offset, data) from `voffset` on; the first block is
+        trimmed to start at the virtual offset's position.
+        """
+        coffset, uoffset = voffset >> 16, voffset & 0xFFFF
+        while True:
+            data, next_offset = self.read_block(coffset)
+            if not data:
+                if next_offset == coffset:
+                    return
+            else:
+                yield coffset, data[uoffset:]
+            uoffset = 0
+            coffset = next_offset
+
+def is_bgzf(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            header = f.read(16)
+    except OSError:
+        return False
+    return header[:4] == BGZF_MAGIC and header[12:14] == b"BC"
+
+def _chrom_aliases(chrom: str) -> tuple[str, ...]:
+    return (chrom[3:], chrom) if chrom.startswith("chr") else (chrom, "chr" + chrom)
+
+class TabixIndex:
+    """
+    Linear index of a tabix (.tbi) file: per sequence, the smallest virtual
+    offset of any record overlapping each 16 kb window.
+    """
+    def __init__(self, linear: dict[str, list[int]]):
+        self.linear = linear
+
+    def tagged_positions(self, gene: str) -> list[tuple[str, int]]:
+        # Not recorded by tabix
+        return []
+
+    @classmethod
+    def load(cls, path: str) -> "TabixIndex":
+        with open(path, "rb") as f:
+            data = gzip.decompress(f.read())
+        if data[:4] != b"TBI\x01":
+            raise ValueError(f"{path} is not a tabix index")
+        n_ref = struct.unpack_from("<i", data, 4)[0]
+        l_nm = struct.unpack_from("<i", data, 32)[0]
+        names = data[36:36 + l_nm].split(b"\x00")[:n_ref]
+        pos = 36 + l_nm
+        linear = {}
+        for name in names:
+            n_bin = struct.unpack_from("<i", data, pos)[0]
+            pos += 4
+            for _ in range(n_bin):
+                n_chunk = struct.unpack_from("<i", data, pos + 4)[0]
+                pos += 8 + 16 * n_chunk
+            n_intv = struct.unpack_from("<i", data, pos)[0]
+            pos += 4
+            linear[name.decode()] = list(struct.unpack_from(f"<{n_intv}Q", data, pos))
+            pos += 8 * n_intv
+        return cls(linear)
+
+    def start_offset(self, chrom: str, start: int) -> Optional[int]:
+        """
+        Virtual offset to start reading from for records at or after `start` (1-based),
+        or None if the sequence has no records there.
+        """
+        for name in _chrom_aliases(chrom):
+            offsets = self.linear.get(name)
+            if offsets is None:
+                continue
+            window = (start - 1) >> TABIX_WINDOW_SHIFT
+            if window >= len(offsets):
+                return None
+            # Empty windows are 0 in some writers; the next non-empty one is still correct
+            return next((offset for offset in offsets[window:] if offset), None)
+        return None
+
+class RegionIndex:
+    """
+    Project index: per sequence, sorted (position, virtual offset) checkpoints
+    taken at the first record of each BGZF block (at most one per 16 kb window),
+    plus the first record of every sequence. Per gene, also the (chrom, pos)
+    of records tagged GENE=<gene> outside the gene's region.
+    """
+    def __init__(
+        self,
+        checkpoints: dict[str, list[tuple[int, int]]],
+        size: int,
+        mtime: float,
+        tagged: Optional[dict[str, list[tuple[str, int]]]] = None
+    ):
+        self.checkpoints = checkpoints
+        self.size = size
+        self.mtime = mtime
+        self.tagged = tagged or {}
+        self._positions = {chrom: [pos for pos, _ in points] for chrom, points in checkpoints.items()}
+
+    @staticmethod
+    def path_for(vcf_path: str) -> str:
+        return vcf_path + ".pgi"
+
+    def tagged_positions(self, gene: str) -> list[tuple[str, int]]:
+        return self.tagged.get(gene, [])
+
+    @classmethod
+    def build(cls, vcf_path: str) -> "RegionIndex":
+        """
+        Scans the whole file once. Per block only the first record is parsed,
+        plus every record of a block in which the sequence changes, plus the
+        records in which a search for GENE=<gene> finds a match.
+        """
+        checkpoints: dict[str, list[tuple[int, int]]] = {}
+        last_window: dict[str, int] = {}
+        current = [None]  # sequence of the last record seen
+        tagged: dict[str, set[tuple[str, int]]] = {}
+        tag_tail = b""  # partial last line of the blocks searched so far
+
+        def find_tags(text: bytes) -> None:
+            # `text` holds complete lines. Matches are a superset of what the
+            # parser accepts (it checks the INFO field); extra ones cost one read.
+            for gene in TAGGED_GENES:
+                needle = b"GENE=" + gene.encode()
+                i = text.find(needle)
+                while i >= 0:
+                    line_start = text.rfind(b"\n", 0, i) + 1
+                    fields = text[line_start:text.find(b"\n", i)].split(b"\t", 2)
+                    if len(fields) > 2 and text[line_start] != 35 and fields[1].isdigit():
+                        chrom, pos = fields[0].decode(), int(fields[1])
+                        region = PHARMACOGENE_REGIONS.get(gene)
+                        if region is None or not (
+                            chrom in _chrom_aliases(region[0]) and region[1] <= pos <= region[2]
+                        ):
+                            tagged.setdefault(gene, set()).add((chrom, pos))
+                    i = text.find(needle, i + len(needle))
+
+        def visit(line: bytes, voffset: int, first_in_block: bool) -> None:
+            if not line or line[0] == 35:  # '#'
+                return
+            chrom_field, pos_field = line.split(b"\t", 2)[:2]
+            chrom, pos = chrom_field.decode(), int(pos_field)
+            window = pos >> TABIX_WINDOW_SHIFT
+            if chrom != current[0] or (first_in_block and last_window[chrom] != window):
+                checkpoints.setdefault(chrom, []).append((pos, voffset))
+                last_window[chrom] = window
+                current[0] = chrom
+
+        carry, carry_voffset = b"", 0
+        with BGZFFile(vcf_path) as bgzf:
+            for coffset, data in bgzf.iter_blocks():
+                text = tag_tail + data if tag_tail else data
+                complete = text.rfind(b"\n") + 1
+                if text.find(b"GENE=", 0, complete) >= 0:
+                    find_tags(text[:complete])
+                tag_tail = text[complete:]
+                pos = 0
+                if carry:
+                    newline = data.find(b"\n")
+                    if newline < 0:
+                        carry += data
+                        continue
+                    visit((carry + data[:newline]).rstrip(b"\r"), carry_voffset, False)
+                    carry, pos = b"", newline + 1
+
+                last_newline = data.rfind(b"\n")
+                if last_newline >= pos:
+                    first_end = data.find(b"\n", pos)
+                    visit(data[pos:first_end].rstrip(b"\r"), (coffset << 16) | pos, True)
+                    # Sorted input: if the block's last record is on the current
+                    # sequence, no sequence starts inside this block
+                    last_start = max(data.rfind(b"\n", 0, last_newline) + 1, pos)
+                    if last_start > first_end and not (
+                        current[0] is not None and data.startswith(current[0].encode() + b"\t", last_start)
+                    ):
+                        line_start = first_end + 1
+                        while line_start <= last_start:
+                            line_end = data.find(b"\n", line_start)
+                            visit(data[line_start:line_end].rstrip(b"\r"), (coffset << 16) | line_start, False)
+                            line_start = line_end + 1
+                    pos = last_newline + 1
+                if pos < len(data):
+                    carry, carry_voffset = data[pos:], (coffset << 16) | pos
+            if carry:
+                visit(carry.rstrip(b"\r"), carry_voffset, False)
+            if b"GENE=" in tag_tail:
+                find_tags(tag_tail + b"\n")
+
+        stat = os.stat(vcf_path)
+        return cls(checkpoints, stat.st_size, stat.st_mtime, {gene: sorted(points) for gene, points in tagged.items()})
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "size": self.size,
+                "mtime": self.mtime,
+                "checkpoints": self.checkpoints,
+                "tagged": self.tagged
+            }, f)
+
+    @classmethod
+    def load(cls, path: str, vcf_path: str) -> Optional["RegionIndex"]:
+        """
+        Loads the index if it exists and still matches the VCF's size and mtime.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(vcf_path)
+        if data.get("version") != INDEX_VERSION or data["size"] != stat.st_size or data["mtime"] != stat.st_mtime:
+            return None
+        return cls(
+            {chrom: [tuple(point) for point in points] for chrom, points in data["checkpoints"].items()},
+            data["size"],
+            data["mtime"],
+            {gene: [tuple(point) for point in points] for gene, points in data["tagged"].items()}
+        )
+
+    def start_offset(self, chrom: str, start: int) -> Optional[int]:
+        for name in _chrom_aliases(chrom):
+            points = self.checkpoints.get(name)
+            if points is None:
+                continue
+            # Last checkpoint strictly before `start`: records at `start` may precede a checkpoint at it
+            i = bisect_left(self._positions[name], start) - 1
+            return points[max(i, 0)][1]
+        return None
+
+def open_index(vcf_path: str, build: bool = True):
+    """
+    The tabix index if present, else the project index (built and saved on
+    first use when `build`). None if the file is not BGZF or no index is available.
+    """
+    if not is_bgzf(vcf_path):
+        return None
+    if os.path.exists(vcf_path + ".tbi"):
+        try:
+            return TabixIndex.load(vcf_path + ".tbi")
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ignoring unreadable tabix index for {vcf_path}: {e}")
+    index_path = RegionIndex.path_for(vcf_path)
+    index = RegionIndex.load(index_path, vcf_path)
+    if index is None and build:
+        index = RegionIndex.build(vcf_path)
+        try:
+            index.save(index_path)
+        except OSError as e:
+            print(f"Could not save region index {index_path}: {e}")
+    return index
+
+def pharmacogene_regions(genes: Iterable[str]) -> list[tuple[str, int, int]]:
+    """
+    (chrom, start, end) for the genes, overlapping regions merged.
+    """
+    regions = sorted(
+        (PHARMACOGENE_REGIONS[gene] for gene in set(genes) if gene in PHARMACOGENE_REGIONS),
+        key=lambda region: (region[0], region[1])
+    )
+    merged: list[tuple[str, int, int]] = []
+    for chrom, start, end in regions:
+        if merged and merged[-1][0] == chrom and start <= merged[-1][2] + 1:
+            merged[-1] = (chrom, merged[-1][1], max(merged[-1][2], end))
+        else:
+            merged.append((chrom, start, end))
+    return merged
+
+def _read_header(bgzf: BGZFFile) -> bytes:
+    lines = []
+    buffer = b""
+    for _, data in bgzf.iter_blocks():
+        buffer += data
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline + 1], buffer[newline + 1:]
+            if not line.startswith(b"#"):
+                return b"".join(lines)
+            lines.append(line)
+    # Header-only file without a final newline
+    return b"".join(lines) + (buffer if buffer.startswith(b"#") else b"")
+
+def iter_region_lines(bgzf: BGZFFile, voffset: int, chrom: str, start: int, end: int) -> Iterator[bytes]:
+    """
+    Records of `chrom` with start <= POS <= end, read from virtual offset `voffset`.
+    """
+    names = {name.encode() for name in _chrom_aliases(chrom)}
+    seen = False
+    buffer = b""
+    for _, data in bgzf.iter_blocks(voffset):
+        lines = (buffer + data).split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if not line or line[0] == 35:
+                continue
+            fields = line.split(b"\t", 2)
+            if fields[0] not in names:
+                if seen:
+                    return
+                continue
+            seen = True
+            pos = int(fields[1])
+            if pos > end:
+                return
+            if pos >= start:
+                yield line + b"\n"
+    if buffer and buffer.split(b"\t", 1)[0] in names:
+        fields = buffer.split(b"\t", 2)
+        if start <= int(fields[1]) <= end:
+            yield buffer + b"\n"
+
+def iter_vcf_chunks(
+    path: str,
+    genes: Iterable[str],
+    use_index: bool = True,
+    build_index: bool = True,
+    read_size: int = 1 << 20
+) -> Iterator[bytes]:
+    """
+    Byte chunks for VCFStreamParser / VCFMatrixParser. For an indexed BGZF
+    file: the header, then only the records in the genes' regions and, with a
+    project index, the records tagged with one of the genes outside them (as
+    plain text). Otherwise the raw file, read sequentially.
+    """
+    index = open_index(path, build=build_index) if use_index else None
+    if index is None:
+        with open(path, "rb") as f:
+            while chunk := f.read(read_size):
+                yield chunk
+        return
+
+    with BGZFFile(path) as bgzf:
+        yield _read_header(bgzf)
+        regions = pharmacogene_regions(genes)
+        # Tagged records that the region reads do not already cover, as one-position regions
+        tagged = {
+            (chrom, pos, pos)
+            for gene in set(genes)
+            for chrom, pos in index.tagged_positions(gene)
+            if not any(chrom in _chrom_aliases(r_chrom) and start <= pos <= end for r_chrom, start, end in regions)
+        }
+        # Regions in file order, so records come out as a full scan would return them
+        starts = [(index.start_offset(chrom, start), start, (chrom, start, end)) for chrom, start, end in [*regions, *tagged]]
+        for voffset, _, (chrom, start, end) in sorted(s for s in starts if s[0] is not None):
+            batch = []
+            for line in iter_region_lines(bgzf, voffset, chrom, start, end):
+                batch.append(line)
+                if len(batch) >= 4096:
+                    yield b"".join(batch)
+                    batch = []
+            if batch:
+                yield b"".join(batch)
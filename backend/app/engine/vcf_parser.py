@@ -0,0 +1,296 @@
+import os
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from app.engine.allele_definitions import ALLELE_DEFINITIONS, PHARMACOGENE_REGIONS, VARIANT_POSITIONS
+from app.engine.phenotype_map import PHENOTYPE_MAP
+from app.engine.phenotype_engine import INDETERMINATE
+
+# ALT allele that defines each variant, e.g. rs4244285 -> "A"
+DEFINING_ALTS = {
+    rsid: alt
+    for alleles in ALLELE_DEFINITIONS.values()
+    for variants in alleles.values()
+    for rsid, alt in variants.items()
+}
+
+_GT_SPLIT = re.compile(r"[/|]")
+_MISSING_GENOTYPES = {b".", b"./.", b".|."}
+
+# Longest accepted VCF line; a longer one (or input without newlines) is a parse
+# error rather than an unbounded buffer. Wide multi-sample lines may need more.
+MAX_LINE_BYTES = int(os.getenv("VCF_MAX_LINE_BYTES", str(16 << 20)))
+
+@dataclass
+class VCFRecord:
+    """
+    A pharmacogene VCF record reduced to the fields the caller needs.
+    """
+    gene: str
+    chrom: str
+    pos: int
+    rsid: str
+    ref: str
+    alt: str
+    genotype: str
+
+    def alt_copies(self) -> int:
+        """
+        Number of copies of the defining ALT allele carried by the sample.
+        If the record's ALT does not match the definition (strand/annotation
+        differences), any non-reference allele is counted.
+        """
+        alleles = _GT_SPLIT.split(self.genotype)
+        alts = self.alt.split(",")
+        expected = DEFINING_ALTS.get(self.rsid)
+        if expected in alts:
+            return alleles.count(str(alts.index(expected) + 1))
+        return sum(1 for a in alleles if a not in ("0", "."))
+
+@dataclass
+class VCFParseResult:
+    sample_id: Optional[str] = None
+    header_found: bool = False
+    records_scanned: int = 0
+    malformed_records: int = 0
+    missing_genotypes: int = 0
+    records: list[VCFRecord] = field(default_factory=list)
+
+    def records_for(self, gene: str) -> list[VCFRecord]:
+        return [record for record in self.records if record.gene == gene]
+
+class _GzipStreamDecoder:
+    """
+    Incremental decoder for gzip streams made of several members (e.g. BGZF).
+    """
+    def __init__(self):
+        self._decoder = zlib.decompressobj(wbits=31)
+
+    def decompress(self, data: bytes) -> bytes:
+        out = []
+        while data:
+            out.append(self._decoder.decompress(data))
+            if not self._decoder.eof:
+                break
+            data = self._decoder.unused_data
+            self._decoder = zlib.decompressobj(wbits=31)
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        return self._decoder.flush()
+
+class VCFStreamParser:
+    """
+    Incremental VCF parser.
+    Raw (plain or gzip/BGZF) chunks are fed as they arrive; only records that
+    fall inside a pharmacogene are kept, so memory stays flat for any file size.
+    """
+    def __init__(
+        self,
+        genes: Optional[Iterable[str]] = None,
+        sample: Optional[str] = None,
+        max_line_bytes: Optional[int] = None
+    ):
+        self.genes = set(genes) if genes is not None else set(PHENOTYPE_MAP)
+        self.sample = sample
+        self.max_line_bytes = MAX_LINE_BYTES if max_line_bytes is None else max_line_bytes
+        self.result = VCFParseResult()
+
+        # chrom -> [(start, end, gene)]
+        self._regions: dict[bytes, list[tuple[int, int, str]]] = {}
+        for gene in self.genes:
+            if gene in PHARMACOGENE_REGIONS:
+                chrom, start, end = PHARMACOGENE_REGIONS[gene]
+                self._regions.setdefault(chrom.encode(), []).append((start, end, gene))
+        for chrom in list(self._regions):
+            self._regions[b"chr" + chrom] = self._regions[chrom]
+        self._position_rsids = {position: rsid for rsid, position in VARIANT_POSITIONS.items()}
+
+        self._buffer = b""
+        self._decoder = None
+        self._started = False
+        self._sample_index = 9
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        if not self._started:
+            self._started = True
+            if chunk[:2] == b"\x1f\x8b":
+                self._decoder = _GzipStreamDecoder()
+        if self._decoder is not None:
+            chunk = self._decoder.decompress(chunk)
+        self._consume(chunk)
+
+    def close(self) -> VCFParseResult:
+        if self._decoder is not None:
+            self._consume(self._decoder.flush())
+        if self._buffer:
+            # Final line without a trailing newline
+            self._consume(b"\n")
+        return self.result
+
+    def _consume(self, data: bytes) -> None:
+        if not data:
+            return
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()
+        if len(self._buffer) > self.max_line_bytes:
+            raise ValueError(f"Invalid VCF: line longer than {self.max_line_bytes} bytes")
+        # Hot loop: most WGS lines are on an irrelevant chromosome and carry
+        # no GENE= tag, so they are rejected without any further parsing.
+        regions = self._regions
+        scanned = 0
+        for line in lines:
+            if not line:
+                continue
+            if line[0] == 35:  # '#'
+                if line.startswith(b"#CHROM"):
+                    self._parse_header(line.rstrip(b"\r"))
+                continue
+            scanned += 1
+            chrom = line[:line.find(b"\t")]
+            if chrom in regions or b"GENE=" in line:
+                self._parse_record(line, chrom)
+        self.result.records_scanned += scanned
+
+    def _locate(self, line: bytes, chrom: bytes) -> Optional[tuple[list[bytes], str, str, int, str]]:
+        """
+        Splits a candidate line and resolves (fields, gene, chrom, pos, rsid).
+        Returns None for malformed lines and records outside the requested genes.
+        """
+        if chrom.startswith(b"chr"):
+            chrom = chrom[3:]
+        regions = self._regions.get(chrom)
+        has_gene_tag = b"GENE=" in line
+
+        fields = line.rstrip(b"\r").split(b"\t")
+        if len(fields) < 8:
+            self.result.malformed_records += 1
+            return None
+        try:
+            pos = int(fields[1])
+        except ValueError:
+            self.result.malformed_records += 1
+            return None
+
+        gene = None
+        if has_gene_tag:
+            for entry in fields[7].split(b";"):
+                if entry.startswith(b"GENE="):
+                    tagged = entry[5:].decode()
+                    if tagged in self.genes:
+                        gene = tagged
+                    break
+        if gene is None and regions:
+            for start, end, region_gene in regions:
+                if start <= pos <= end:
+                    gene = region_gene
+                    break
+        if gene is None:
+            return None
+
+        chrom_str = chrom.decode()
+        rsid = fields[2].decode()
+        if rsid not in DEFINING_ALTS:
+            rsid = self._position_rsids.get((chrom_str, pos), rsid)
+        return fields, gene, chrom_str, pos, rsid
+
+    def _parse_record(self, line: bytes, chrom: bytes) -> None:
+        located = self._locate(line, chrom)
+        if located is None:
+            return
+        fields, gene, chrom_str, pos, rsid = located
+
+        genotype = self._genotype(fields)
+        if genotype is None:
+            self.result.missing_genotypes += 1
+            return
+
+        self.result.records.append(VCFRecord(
+            gene=gene,
+            chrom=chrom_str,
+            pos=pos,
+            rsid=rsid,
+            ref=fields[3].decode(),
+            alt=fields[4].decode(),
+            genotype=genotype
+        ))
+
+    def _parse_header(self, line: bytes) -> None:
+        self.result.header_found = True
+        columns = line.decode().split("\t")
+        samples = columns[9:]
+        if self.sample is not None:
+            # Never fall back to another column: that would be another patient's genotype
+            if self.sample not in samples:
+                raise ValueError(f"Sample {self.sample!r} not found in VCF header (samples: {', '.join(samples) or 'none'})")
+            self._sample_index = 9 + samples.index(self.sample)
+        if not samples:
+            return
+        self.result.sample_id = columns[self._sample_index]
+
+    def _genotype(self, fields: list[bytes]) -> Optional[str]:
+        if len(fields) <= self._sample_index:
+            return None
+        keys = fields[8].split(b":")
+        if b"GT" not in keys:
+            return None
+        values = fields[self._sample_index].split(b":")
+        gt_index = keys.index(b"GT")
+        if gt_index >= len(values) or values[gt_index] in _MISSING_GENOTYPES:
+            return None
+        return values[gt_index].decode()
+
+def parse_vcf(chunks: Iterable[bytes], genes: Optional[Iterable[str]] = None, sample: Optional[str] = None) -> VCFParseResult:
+    """
+    Parses a VCF from an iterable of byte chunks (e.g. a file read in blocks).
+    """
+    parser = VCFStreamParser(genes=genes, sample=sample)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+def allele_sort_key(allele: str) -> tuple:
+    match = re.match(r"\*(\d+)(.*)", allele)
+    if not match:
+        return (float("inf"), allele)
+    return (int(match.group(1)), match.group(2))
+
+def call_alleles(gene: str, records: Iterable[VCFRecord]) -> list[str]:
+    """
+    Every non-*1 star allele supported by the genotypes, one entry per copy, in allele order.
+    Alleles defined by more variants are matched first.
+    """
+    dosage: dict[str, int] = {}
+    for record in records:
+        if record.gene == gene and record.rsid in DEFINING_ALTS:
+            dosage[record.rsid] = max(dosage.get(record.rsid, 0), record.alt_copies())
+
+    called = []
+    definitions = sorted(ALLELE_DEFINITIONS.get(gene, {}).items(), key=lambda item: -len(item[1]))
+    for allele, variants in definitions:
+        copies = min(dosage.get(rsid, 0) for rsid in variants)
+        for _ in range(copies):
+            called.append(allele)
+            for rsid in variants:
+                dosage[rsid] -= 1
+
+    return sorted(called, key=allele_sort_key)
+
+def call_diplotype(gene: str, records: Iterable[VCFRecord]) -> str:
+    """
+    Calls a star-allele diplotype (e.g. "*1/*2") from unphased genotypes;
+    uncalled copies default to *1. More than two called alleles cannot be
+    resolved into a diplotype and give Indeterminate.
+    """
+    return diplotype_from_alleles(call_alleles(gene, records))
+
+def diplotype_from_alleles(called: list[str]) -> str:
+    if len(called) > 2:
+        return INDETERMINATE
+    called = called + ["*1"] * (2 - len(called))
+    called.sort(key=allele_sort_key)
+    return f"{called[0]}/{called[1]}"
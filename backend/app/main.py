@@ -1,12 +1,66 @@
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
+from app.api.health import router as health_router
+from app.engine.rule_index import RulesFileWatcher, reload_rules
+from app.metrics import METRICS_ENABLED, ServerTimingMiddleware
+
+# Deployment mode:
+#   full  - rule engine + AI explanation endpoints (RAG + local LLM)
+#   rules - rule engine only; torch / chromadb / sentence-transformers are never imported
+MODE = os.getenv("PHARMAGUARD_MODE", "full")
+if MODE not in ("full", "rules"):
+    raise ValueError(f"PHARMAGUARD_MODE must be 'full' or 'rules', got {MODE!r}")
+
+# When to load the RAG engine in full mode:
+#   background - start loading at startup without blocking it (default)
+#   eager      - block startup until loaded
+#   lazy       - load on the first explanation request
+ML_WARMUP = os.getenv("ML_WARMUP", "background")
+if ML_WARMUP not in ("background", "eager", "lazy"):
+    raise ValueError(f"ML_WARMUP must be 'background', 'eager' or 'lazy', got {ML_WARMUP!r}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optional external rules file, hot-reloaded when it changes
+    watcher = None
+    rules_file = os.getenv("RULES_FILE")
+    if rules_file:
+        reload_rules(rules_file)
+        watcher = RulesFileWatcher(rules_file, interval=float(os.getenv("RULES_RELOAD_INTERVAL", "5")))
+        watcher.start()
+
+    if MODE == "full":
+        from ml.rag_engine import rag_engine
+        from app.services.explanation_jobs import explanation_jobs
+        from ml.local_llm import local_llm
+        # Under app.cli.serve only the first worker requeues unfinished jobs
+        await explanation_jobs.start(requeue=os.getenv("PHARMAGUARD_WORKER_INDEX", "0") == "0")
+        # Probe the LLM backends before the first request needs one
+        local_llm.router.start_probes(local_llm.transport)
+        if ML_WARMUP == "eager":
+            rag_engine.initialize()
+        elif ML_WARMUP == "background":
+            rag_engine.start_background_warmup()
+
+    yield
+
+    if watcher:
+        watcher.stop()
+    if MODE == "full":
+        await explanation_jobs.stop()
+        await local_llm.aclose()
 
 app = FastAPI(
     title="PharmaGuard API",
     description="Deterministic CPIC-based Pharmacogenomics Rule Engine",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.state.mode = MODE
 
 # Configure CORS
 # Allow all origins for development
@@ -16,9 +70,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the stage timings of cross-origin calls
+    expose_headers=["Server-Timing"] if METRICS_ENABLED else [],
 )
+# Per-stage timings in a Server-Timing header; /metrics is served by the health router
+if METRICS_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(router, prefix="/api/v1")
+app.include_router(health_router)
+if MODE == "full":
+    from app.api.explanation_routes import router as explanation_router
+    app.include_router(explanation_router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
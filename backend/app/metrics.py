@@ -0,0 +1,205 @@
+# Latency Instrumentation
+# Per-stage timers and event counters, exported in the Prometheus text format
+# on /metrics. Stage timings of the current request are also collected in a
+# context variable and returned in a `Server-Timing` header.
+#
+# METRICS_ENABLED=0 turns everything off: @timed returns the function
+# unchanged, timer() is a shared no-op context and counters do nothing.
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Iterable, Optional
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; covers both sub-millisecond rule lookups and multi-second generations
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self.value)}"
+        ]
+
+class Histogram:
+    """
+    Histogram with one label; one series per label value.
+    """
+    def __init__(self, name: str, documentation: str, label: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> [per-bucket counts (last: +Inf), sum, count]
+        self._series: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: (counts.copy(), total, count) for value, (counts, total, count) in self._series.items()}
+        for value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total!r}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {count}')
+        return lines
+
+STAGE_SECONDS = Histogram("pharmaguard_stage_seconds", "Time spent per pipeline stage.", label="stage")
+LLM_FAILURES = Counter("pharmaguard_llm_failures_total", "LLM requests that failed (connection, timeout or HTTP error).")
+LLM_FALLBACKS = Counter("pharmaguard_llm_fallback_responses_total", "Explanations replaced by a fallback response.")
+CONTEXT_TABLE_HITS = Counter("pharmaguard_context_table_hits_total", "Guideline contexts served from the precomputed table.")
+CONTEXT_TOKENS = Counter("pharmaguard_context_tokens_total", "Estimated tokens of the guideline contexts served.")
+CONTEXT_TOKENS_SAVED = Counter(
+    "pharmaguard_context_tokens_saved_total",
+    "Estimated context tokens removed by de-duplication and the token budget."
+)
+
+METRICS = [STAGE_SECONDS, LLM_FAILURES, LLM_FALLBACKS, CONTEXT_TABLE_HITS, CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED]
+
+# Stage -> accumulated seconds for the request being handled (None outside requests).
+# Threads started via asyncio.to_thread / the threadpool inherit the same dict.
+_request_timings: contextvars.ContextVar[Optional[dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+class _StageTimer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stage, time.perf_counter() - self.started)
+
+_NO_TIMER = nullcontext()
+
+def timer(stage: str):
+    """
+    Context manager timing a block as `stage`.
+    """
+    return _StageTimer(stage) if METRICS_ENABLED else _NO_TIMER
+
+def timed(stage: str) -> Callable:
+    """
+    Decorator timing every call of a function (sync or async) as `stage`.
+    """
+    def decorate(fn: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record_stage(stage, time.perf_counter() - started)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_stage(stage, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def render_metrics(extra: Iterable[tuple[str, str, str, float]] = ()) -> str:
+    """
+    Prometheus text exposition of all metrics, plus `extra`
+    (name, type, help, value) samples read from other components at scrape time.
+    A name may carry labels (`name{backend="a"}`); HELP and TYPE are written
+    once per metric.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    described = set()
+    for name, kind, documentation, value in extra:
+        base = name.split("{", 1)[0]
+        if base not in described:
+            described.add(base)
+            lines.extend([f"# HELP {base} {documentation}", f"# TYPE {base} {kind}"])
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def format_server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware: collects the stage timings of each HTTP request and adds
+    them, plus `total` (time until the response starts), as a Server-Timing header.
+    For streamed responses only the stages finished before the first byte are included.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", format_server_timing(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
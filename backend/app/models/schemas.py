@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Any, Literal, Optional
 
 # Enum-like Literals for strict typing
 RiskLabel = Literal["Safe", "Adjust Dosage", "Toxic", "Ineffective", "Unknown"]
@@ -18,6 +18,9 @@ class RiskAssessment(BaseModel):
     """
     Assessment of the risk associated with the drug given the genotype.
     """
+    # Frozen: instances are prebuilt once per rule and shared between responses
+    model_config = ConfigDict(frozen=True)
+
     risk_label: RiskLabel
     confidence_score: float = Field(..., ge=0.0, le=1.0, description="Confidence score between 0 and 1")
     severity: SeverityLevel
@@ -34,6 +37,9 @@ class ClinicalRecommendation(BaseModel):
     """
     Actionable clinical advice.
     """
+    # Frozen: instances are prebuilt once per rule and shared between responses
+    model_config = ConfigDict(frozen=True)
+
     dose_adjustment: str
     monitoring: str
 
@@ -46,3 +52,166 @@ class AnalyzeResponse(BaseModel):
     risk_assessment: RiskAssessment
     pharmacogenomic_profile: PharmacogenomicProfile
     clinical_recommendation: ClinicalRecommendation
+
+# Extended response model including explanation
+class AIExplanation(BaseModel):
+    summary: str
+    biological_mechanism: str
+    clinical_reasoning: str
+    citations: str
+
+class AnalyzeResponseWithExplanation(AnalyzeResponse):
+    llm_generated_explanation: AIExplanation
+
+class DetectedVariant(BaseModel):
+    """
+    A pharmacogene variant observed in the uploaded VCF.
+    """
+    rsid: str
+    ref: str
+    alt: str
+    genotype: str
+
+class QualityMetrics(BaseModel):
+    """
+    VCF parsing statistics.
+    """
+    vcf_parsing_success: bool
+    variants_analyzed: int = Field(..., description="Pharmacogene records used for the primary gene")
+    records_scanned: int
+    malformed_records: int
+    missing_genotypes: int
+    sample_id: Optional[str] = None
+    called_alleles: list[str] = Field(
+        default_factory=list, description="Non-*1 star alleles called for the primary gene, one per copy"
+    )
+    warnings: list[str] = Field(default_factory=list, description="Calls that could not be made with confidence")
+
+class VCFPharmacogenomicProfile(PharmacogenomicProfile):
+    """
+    Pharmacogenomic profile called from a VCF, including the supporting variants.
+    """
+    detected_variants: list[DetectedVariant]
+
+class VCFAnalyzeResponse(AnalyzeResponse):
+    """
+    Analysis response for a VCF upload.
+    """
+    pharmacogenomic_profile: VCFPharmacogenomicProfile
+    quality_metrics: QualityMetrics
+
+class ColumnarAnalyzeRequest(BaseModel):
+    """
+    Column-oriented batch payload: the i-th entry of every column forms one request.
+    """
+    patient_id: list[str]
+    gene: list[str]
+    diplotype: list[str]
+    drug: list[str]
+
+    @model_validator(mode="after")
+    def _check_lengths(self):
+        lengths = {len(self.patient_id), len(self.gene), len(self.diplotype), len(self.drug)}
+        if len(lengths) > 1:
+            raise ValueError("All columns must have the same length")
+        return self
+
+class BatchAnalyzeRequest(BaseModel):
+    """
+    Schema for the batch analysis request.
+    Either `requests` (row-oriented) or `columns` (column-oriented) must be provided.
+    Rows are validated individually so one malformed entry does not fail the batch.
+    """
+    requests: Optional[list[Any]] = Field(
+        None, description="List of AnalyzeRequest objects"
+    )
+    columns: Optional[ColumnarAnalyzeRequest] = Field(
+        None, description="Columnar alternative to `requests`"
+    )
+
+    @model_validator(mode="after")
+    def _check_payload(self):
+        if (self.requests is None) == (self.columns is None):
+            raise ValueError("Provide exactly one of 'requests' or 'columns'")
+        return self
+
+class BatchItemResult(BaseModel):
+    """
+    Outcome of a single batch entry. Exactly one of `result` / `error` is set.
+    """
+    index: int
+    result: Optional[AnalyzeResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalyzeResponse(BaseModel):
+    """
+    Batch results, in the same order as the input.
+    """
+    results: list[BatchItemResult]
+    succeeded: int
+    failed: int
+
+class PanelAnalyzeRequest(BaseModel):
+    """
+    A patient's full set of diplotype calls, evaluated against every drug with rules.
+    """
+    patient_id: str = Field(..., description="Unique identifier for the patient")
+    genotypes: dict[str, str] = Field(
+        ..., description="Gene symbol -> diplotype (e.g., {\"CYP2C19\": \"*1/*2\", \"CYP2D6\": \"*1/*4\"})"
+    )
+
+class PanelAnalyzeResponse(BaseModel):
+    """
+    One result per applicable drug, grouped in the order the genes were given.
+    """
+    patient_id: str
+    results: list[AnalyzeResponse]
+    genes_without_rules: list[str] = Field(default_factory=list, description="Input genes no drug has rules for")
+
+class PanelAnalyzeResponseWithExplanation(PanelAnalyzeResponse):
+    results: list[AnalyzeResponseWithExplanation]
+
+JobPriority = Literal["interactive", "batch"]
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+class ExplanationJob(BaseModel):
+    """
+    An explanation generated in the background. `result` (deterministic) is
+    available at once; `explanation` once the job is done.
+    """
+    job_id: str
+    status: JobStatus
+    priority: JobPriority
+    result: AnalyzeResponse
+    explanation: Optional[AIExplanation] = None
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+
+class ExplanationJobBatchRequest(BaseModel):
+    requests: list[AnalyzeRequest] = Field(..., min_length=1)
+    priority: JobPriority = "batch"
+
+class ExplanationJobBatchResponse(BaseModel):
+    jobs: list[ExplanationJob]
+
+class RuleSetInfo(BaseModel):
+    """
+    The active compiled rule index.
+    """
+    version: str
+    source: str
+    entries: int
+
+class ComponentHealth(BaseModel):
+    state: str
+    detail: Optional[str] = None
+    metrics: Optional[dict[str, Any]] = None
+
+class HealthStatus(BaseModel):
+    """
+    Liveness / readiness report.
+    """
+    status: str
+    mode: str
+    components: dict[str, ComponentHealth]
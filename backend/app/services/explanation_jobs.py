@@ -0,0 +1,311 @@
+# Explanation Job Queue
+# Submitting returns the deterministic result and a job id at once; the
+# explanation is generated later by a fixed pool of workers and fetched by
+# polling or streaming. Jobs live in SQLite, so nothing beyond this process
+# is needed, and unfinished jobs are picked up again after a restart.
+#
+# Backpressure: the in-memory queue is bounded. A submission that does not fit
+# is rejected immediately (HTTP 429) instead of holding a connection open.
+# Interactive jobs are always taken before batch jobs.
+#
+# The store is opened on first use, and every store call runs on a worker
+# thread (asyncio.to_thread) so SQLite never blocks the event loop.
+
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.models.schemas import AnalyzeRequest, AnalyzeResponse, AIExplanation, ExplanationJob
+from app.engine.rule_engine import evaluate_drug_risk
+from app.services.explanation_service import generate_drug_explanation
+from ml.local_llm import is_fallback_response
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+FINISHED = ("done", "failed")
+POLL_SECONDS = 1.0
+
+# Next to the backend package rather than in whatever directory the server starts from
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "explanation_jobs.sqlite3"
+)
+
+class QueueFullError(Exception):
+    pass
+
+class QueueClosedError(Exception):
+    pass
+
+class JobStore:
+    """
+    SQLite table of jobs: request, deterministic result, status and explanation.
+    The database is opened on first use. All methods block; async callers
+    run them via asyncio.to_thread.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, status TEXT NOT NULL, priority TEXT NOT NULL,"
+                " request TEXT NOT NULL, result TEXT NOT NULL, explanation TEXT, error TEXT,"
+                " created_at REAL NOT NULL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def create(self, jobs: list[tuple[str, str, str, str, float]]) -> None:
+        # (id, priority, request JSON, result JSON, created_at)
+        with self._lock:
+            self._connection().executemany(
+                "INSERT INTO jobs (id, status, priority, request, result, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                jobs
+            )
+
+    def set_status(
+        self, job_id: str, status: str, explanation: Optional[str] = None, error: Optional[str] = None
+    ) -> None:
+        finished_at = time.time() if status in FINISHED else None
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET status = ?, explanation = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, explanation, error, finished_at, job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[ExplanationJob]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT id, status, priority, result, explanation, error, created_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, priority, result, explanation, error, created_at, finished_at = row
+        return ExplanationJob(
+            job_id=job_id,
+            status=status,
+            priority=priority,
+            result=AnalyzeResponse.model_validate_json(result),
+            explanation=AIExplanation.model_validate_json(explanation) if explanation else None,
+            error=error,
+            created_at=created_at,
+            finished_at=finished_at
+        )
+
+    def unfinished(self) -> list[tuple[str, str, str]]:
+        """
+        (id, priority, request JSON) of queued or interrupted jobs, oldest first.
+        """
+        with self._lock:
+            return self._connection().execute(
+                "SELECT id, priority, request FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+
+    def purge(self, finished_before: float) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,))
+
+class ExplanationJobQueue:
+    def __init__(
+        self,
+        path: str = os.getenv("EXPLANATION_JOBS_PATH") or DEFAULT_PATH,
+        max_queue: int = int(os.getenv("EXPLANATION_JOBS_MAX_QUEUE", "500")),
+        workers: int = int(os.getenv("EXPLANATION_JOBS_WORKERS", os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))),
+        ttl_seconds: float = float(os.getenv("EXPLANATION_JOBS_TTL", str(24 * 3600)))
+    ):
+        self.store = JobStore(path)
+        self.max_queue = max_queue
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+        # Created on the serving event loop by start()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._sequence = itertools.count()  # FIFO within a priority
+        self._reserved = 0  # slots held by submissions still writing to the store
+        self._changed: dict[str, asyncio.Event] = {}
+        self._waiters: dict[str, int] = {}  # job id -> wait() calls in progress
+        self._last_purge = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def start(self, requeue: bool = True) -> None:
+        """
+        Starts the workers and (with `requeue`) requeues jobs left unfinished
+        by a previous run. With several server processes on one store, only
+        one of them should requeue.
+        """
+        self._queue = asyncio.PriorityQueue()
+        await self._purge()
+        unfinished = await asyncio.to_thread(self.store.unfinished) if requeue else []
+        restored = 0
+        for job_id, priority, request in unfinished:
+            if restored >= self.max_queue:
+                await asyncio.to_thread(self.store.set_status, job_id, "failed", error="Dropped on restart: queue full")
+                continue
+            await asyncio.to_thread(self.store.set_status, job_id, "queued")
+            self._enqueue(job_id, priority, AnalyzeRequest.model_validate_json(request))
+            restored += 1
+        if restored:
+            print(f"Requeued {restored} unfinished explanation jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        # Queued and running jobs stay in the store and resume on the next start()
+        queue, self._queue = self._queue, None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if queue is not None:
+            while not queue.empty():
+                queue.get_nowait()
+
+    def _enqueue(self, job_id: str, priority: str, request: AnalyzeRequest) -> None:
+        self._queue.put_nowait((PRIORITIES[priority], next(self._sequence), job_id, request))
+
+    async def submit(self, requests: list[AnalyzeRequest], priority: str = "interactive") -> list[ExplanationJob]:
+        """
+        Evaluates the deterministic results and queues one job per request.
+        All or nothing: raises QueueFullError if the jobs do not all fit.
+        """
+        if self._queue is None:
+            raise QueueClosedError("Explanation queue is not running")
+        if self._queue.qsize() + self._reserved + len(requests) > self.max_queue:
+            self.rejected += len(requests)
+            raise QueueFullError(
+                f"Explanation queue is full ({self._queue.qsize()}/{self.max_queue} queued)"
+            )
+        # Held while the jobs are written, so concurrent submissions cannot overfill the queue
+        self._reserved += len(requests)
+        try:
+            return await self._create(requests, priority)
+        finally:
+            self._reserved -= len(requests)
+
+    async def _create(self, requests: list[AnalyzeRequest], priority: str) -> list[ExplanationJob]:
+
+        now = time.time()
+        jobs = []
+        for request in requests:
+            result = evaluate_drug_risk(
+                patient_id=request.patient_id,
+                gene=request.gene,
+                diplotype=request.diplotype,
+                drug=request.drug
+            )
+            jobs.append(ExplanationJob(
+                job_id=uuid.uuid4().hex, status="queued", priority=priority, result=result, created_at=now
+            ))
+        await asyncio.to_thread(self.store.create, [
+            (job.job_id, priority, request.model_dump_json(), job.result.model_dump_json(), now)
+            for job, request in zip(jobs, requests)
+        ])
+        if self._queue is None:
+            # Stopped while writing; the stored jobs are requeued on the next start()
+            raise QueueClosedError("Explanation queue is not running")
+        for job, request in zip(jobs, requests):
+            self._enqueue(job.job_id, priority, request)
+        return jobs
+
+    async def get(self, job_id: str) -> Optional[ExplanationJob]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: float, unless_status: Optional[str] = None) -> Optional[ExplanationJob]:
+        """
+        The job once its status differs from `unless_status` (default: once
+        finished), or as it is after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                changed = self._changed.setdefault(job_id, asyncio.Event())
+                job = await self.get(job_id)
+                if job is None or job.status in FINISHED or (unless_status is not None and job.status != unless_status):
+                    return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                try:
+                    # Re-read at least every POLL_SECONDS: the job may be run by another server process
+                    await asyncio.wait_for(changed.wait(), min(remaining, POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # The last waiter drops the job's event, whether or not it was set
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                self._changed.pop(job_id, None)
+
+    async def _set_status(self, job_id: str, status: str, **fields) -> None:
+        await asyncio.to_thread(self.store.set_status, job_id, status, **fields)
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def _work(self) -> None:
+        queue = self._queue
+        while True:
+            _, _, job_id, request = await queue.get()
+            await self._set_status(job_id, "running")
+            try:
+                response = await generate_drug_explanation(request)
+                explanation = response.llm_generated_explanation
+                if is_fallback_response(explanation.model_dump()):
+                    # The LLM was unavailable or its output unusable: fail, so the client can resubmit
+                    detail = explanation.clinical_reasoning if explanation.clinical_reasoning != "N/A" else explanation.biological_mechanism
+                    await self._set_status(job_id, "failed", error=f"{explanation.summary} {detail}")
+                    self.failed += 1
+                else:
+                    await self._set_status(job_id, "done", explanation=explanation.model_dump_json())
+                    self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Explanation job {job_id} failed: {e!r}")
+                await self._set_status(job_id, "failed", error=str(e))
+                self.failed += 1
+            finally:
+                queue.task_done()
+            await self._purge()
+
+    async def _purge(self) -> None:
+        # Finished jobs are kept for `ttl_seconds`; checked at most once a minute
+        now = time.time()
+        if now - self._last_purge >= 60:
+            self._last_purge = now
+            await asyncio.to_thread(self.store.purge, now - self.ttl_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+# Singleton (workers started by the app's lifespan in full mode; the store opens on first use)
+explanation_jobs = ExplanationJobQueue()
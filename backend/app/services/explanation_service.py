@@ -1,19 +1,86 @@
-from app.models.schemas import AnalyzeResponse, AnalyzeRequest
-from app.engine.rule_engine import evaluate_drug_risk
-from app.api.routes import AnalyzeResponse as BaseResponse
+import asyncio
+import json
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from app.models.schemas import (
+    AnalyzeRequest,
+    AnalyzeResponse,
+    AIExplanation,
+    AnalyzeResponseWithExplanation,
+    PanelAnalyzeRequest,
+    PanelAnalyzeResponseWithExplanation
+)
+from app.engine.rule_engine import evaluate_drug_risk, evaluate_panel
+from app.engine.rule_index import get_rule_index
 from ml.rag_engine import rag_engine
-from ml.local_llm import local_llm
-from pydantic import BaseModel
+from ml.local_llm import (
+    local_llm,
+    is_fallback_response,
+    extract_completed_fields,
+    EXPLANATION_FIELDS,
+    unavailable_response,
+    parse_failed_response
+)
+from ml.explanation_cache import explanation_cache, make_cache_key
+from ml.ingest import knowledge_base_version
+
+# Retrieved context (and so the explanation) depends on the retrieval mode too
+KB_VERSION = f"{knowledge_base_version()}-{rag_engine.retrieval_mode}"
+
+def explanation_cache_key(drug: str, gene: str, phenotype: str, risk_label: str) -> str:
+    return make_cache_key(
+        drug, gene, phenotype, risk_label,
+        model=local_llm.model,
+        rules_version=get_rule_index().version,
+        kb_version=KB_VERSION
+    )
+
+async def retrieve_guideline_context(drug: str, gene: str, phenotype: str) -> str:
+    # Known combinations come from the precomputed table; a live embedding
+    # search is CPU-bound, so keep it off the event loop
+    context = rag_engine.lookup_guideline_context(drug, gene, phenotype)
+    if context is not None:
+        return context
+    return await asyncio.to_thread(rag_engine.retrieve_guideline_context, drug, gene, phenotype)
+
+def validated_explanation(value) -> dict:
+    """
+    The LLM's reply as an AIExplanation dict, or the parse-failed fallback if
+    it is not one (e.g. a list, or missing fields). Only validated replies are cached.
+    """
+    try:
+        return AIExplanation.model_validate(value).model_dump()
+    except ValidationError:
+        print("LLM reply is not a valid explanation")
+        return parse_failed_response()
+
+async def explain_result(drug: str, gene: str, phenotype: str, risk_label: str, rule_summary: str) -> dict:
+    """
+    Explanation for a deterministic result. Depends only on the rule inputs
+    (never the patient), so it is served from the explanation cache when possible.
+    """
+    async def generate() -> dict:
+        context = await retrieve_guideline_context(drug, gene, phenotype)
 
-# Extended response model including explanation
-class AIExplanation(BaseModel):
-    summary: str
-    biological_mechanism: str
-    clinical_reasoning: str
-    citations: str
+        return validated_explanation(await local_llm.agenerate_explanation(
+            drug=drug,
+            gene=gene,
+            phenotype=phenotype,
+            risk_label=risk_label,
+            rule_summary=rule_summary,
+            retrieved_context=context
+        ))
 
-class AnalyzeResponseWithExplanation(BaseResponse):
-    llm_generated_explanation: AIExplanation
+    if explanation_cache is None:
+        return await generate()
+    # Validated again on the way out, in case of entries cached by older versions
+    return validated_explanation(await explanation_cache.get_or_create(
+        explanation_cache_key(drug, gene, phenotype, risk_label),
+        generate,
+        should_store=lambda value: not is_fallback_response(value)
+    ))
 
 async def generate_drug_explanation(request: AnalyzeRequest) -> AnalyzeResponseWithExplanation:
     # 1. Run Deterministic Rule Engine
@@ -24,26 +91,119 @@ async def generate_drug_explanation(request: AnalyzeRequest) -> AnalyzeResponseW
         drug=request.drug
     )
     
-    # 2. Build RAG Query
-    query = f"CPIC guideline for {request.drug} and {request.gene} phenotype {base_result.pharmacogenomic_profile.phenotype}"
-    
-    # 3. Retrieve Context
-    context = rag_engine.retrieve_context(query)
-    
-    # 4. Generate Explanation
+    # 2. Retrieve context and generate (or reuse) the explanation
     rule_summary = f"{base_result.clinical_recommendation.dose_adjustment} {base_result.clinical_recommendation.monitoring}"
     
-    explanation_dict = local_llm.generate_explanation(
+    explanation_dict = await explain_result(
         drug=request.drug,
         gene=request.gene,
         phenotype=base_result.pharmacogenomic_profile.phenotype,
         risk_label=base_result.risk_assessment.risk_label,
-        rule_summary=rule_summary,
-        retrieved_context=context
+        rule_summary=rule_summary
     )
     
-    # 5. Construct Final Response
+    # 3. Construct Final Response
     return AnalyzeResponseWithExplanation(
         **base_result.dict(),
         llm_generated_explanation=AIExplanation(**explanation_dict)
     )
+
+async def _explain_response(result: AnalyzeResponse) -> AnalyzeResponseWithExplanation:
+    recommendation = result.clinical_recommendation
+    explanation_dict = await explain_result(
+        drug=result.drug,
+        gene=result.pharmacogenomic_profile.primary_gene,
+        phenotype=result.pharmacogenomic_profile.phenotype,
+        risk_label=result.risk_assessment.risk_label,
+        rule_summary=f"{recommendation.dose_adjustment} {recommendation.monitoring}"
+    )
+    return AnalyzeResponseWithExplanation(
+        **result.model_dump(),
+        llm_generated_explanation=AIExplanation(**explanation_dict)
+    )
+
+async def generate_panel_explanation(request: PanelAnalyzeRequest) -> PanelAnalyzeResponseWithExplanation:
+    """
+    Panel evaluation plus an explanation per drug. Context retrieval and
+    generation run concurrently across drugs (the LLM client bounds how many
+    generations are in flight; identical ones are coalesced by the cache).
+    """
+    # 1. Deterministic results for every applicable drug
+    panel = evaluate_panel(request.patient_id, request.genotypes)
+
+    # 2. Explanations, all at once
+    results = await asyncio.gather(*(_explain_response(result) for result in panel.results))
+
+    return PanelAnalyzeResponseWithExplanation(
+        patient_id=panel.patient_id,
+        results=results,
+        genes_without_rules=panel.genes_without_rules
+    )
+
+async def stream_drug_explanation(request: AnalyzeRequest) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Yields (event, data) pairs for the streaming endpoint:
+    `result` (deterministic, sent before any AI work), then `token` deltas and
+    `field` events as each explanation field completes, then `explanation`
+    with the full object, and finally `done`.
+    """
+    # 1. Deterministic result goes out immediately
+    base_result = evaluate_drug_risk(
+        patient_id=request.patient_id,
+        gene=request.gene,
+        diplotype=request.diplotype,
+        drug=request.drug
+    )
+    yield "result", base_result.model_dump()
+
+    phenotype = base_result.pharmacogenomic_profile.phenotype
+    risk_label = base_result.risk_assessment.risk_label
+    rule_summary = f"{base_result.clinical_recommendation.dose_adjustment} {base_result.clinical_recommendation.monitoring}"
+    key = explanation_cache_key(request.drug, request.gene, phenotype, risk_label)
+
+    # 2. Cache hit: every field is available at once
+    cached = await explanation_cache.lookup(key) if explanation_cache is not None else None
+    if cached is not None:
+        # Entries cached by older versions may not be valid; those are regenerated
+        cached = validated_explanation(cached)
+    if cached is not None and not is_fallback_response(cached):
+        for name in EXPLANATION_FIELDS:
+            if name in cached:
+                yield "field", {"name": name, "value": cached[name]}
+        yield "explanation", cached
+        yield "done", {}
+        return
+
+    # 3. Retrieve context, then stream the generation
+    context = await retrieve_guideline_context(request.drug, request.gene, phenotype)
+
+    generated = ""
+    sent_fields = set()
+    try:
+        async for delta in local_llm.astream_explanation(
+            drug=request.drug,
+            gene=request.gene,
+            phenotype=phenotype,
+            risk_label=risk_label,
+            rule_summary=rule_summary,
+            retrieved_context=context
+        ):
+            generated += delta
+            yield "token", {"text": delta}
+            for name, value in extract_completed_fields(generated).items():
+                if name not in sent_fields:
+                    sent_fields.add(name)
+                    yield "field", {"name": name, "value": value}
+        explanation = validated_explanation(json.loads(generated or "{}"))
+    except json.JSONDecodeError:
+        print("Failed to parse LLM JSON output")
+        explanation = parse_failed_response()
+    except Exception as e:
+        print(f"Ollama Connection Error: {e!r}")
+        yield "error", {"detail": str(e)}
+        explanation = unavailable_response(e)
+
+    if explanation_cache is not None and not is_fallback_response(explanation):
+        await explanation_cache.aset(key, explanation)
+    yield "explanation", explanation
+    yield "done", {}
@@ -0,0 +1,90 @@
+from typing import AsyncIterable, Optional
+
+from app.models.schemas import (
+    VCFAnalyzeResponse,
+    VCFPharmacogenomicProfile,
+    DetectedVariant,
+    QualityMetrics
+)
+from app.engine.rule_engine import evaluate_drug_risk
+from app.engine.rule_index import get_rule_index
+from app.engine.vcf_parser import VCFStreamParser, VCFParseResult, call_alleles, diplotype_from_alleles
+
+def resolve_primary_gene(drug: str) -> str:
+    """
+    Returns the primary pharmacogene for `drug` (case-insensitive).
+    Raises ValueError for drugs without rules.
+    """
+    _, genes = get_rule_index().resolve_drug(drug)
+    return genes[0]
+
+def build_vcf_response(
+    parsed: VCFParseResult,
+    drug: str,
+    gene: str,
+    patient_id: Optional[str] = None
+) -> VCFAnalyzeResponse:
+    """
+    Calls the diplotype for `gene` from parsed VCF records and runs the rule engine.
+    """
+    if not parsed.header_found:
+        raise ValueError("Invalid VCF: missing #CHROM header line")
+
+    records = parsed.records_for(gene)
+    called = call_alleles(gene, records)
+    diplotype = diplotype_from_alleles(called)
+    warnings = []
+    if len(called) > 2:
+        warnings.append(
+            f"{len(called)} {gene} alleles called ({', '.join(called)});"
+            f" a diplotype has two, so it is reported as {diplotype}"
+        )
+    base_result = evaluate_drug_risk(
+        patient_id=patient_id or parsed.sample_id or "UNKNOWN",
+        gene=gene,
+        diplotype=diplotype,
+        drug=drug
+    )
+
+    detected = [
+        DetectedVariant(rsid=r.rsid, ref=r.ref, alt=r.alt, genotype=r.genotype)
+        for r in records
+        if any(allele not in ("0", ".") for allele in r.genotype.replace("|", "/").split("/"))
+    ]
+
+    return VCFAnalyzeResponse(
+        patient_id=base_result.patient_id,
+        drug=base_result.drug,
+        risk_assessment=base_result.risk_assessment,
+        pharmacogenomic_profile=VCFPharmacogenomicProfile(
+            **base_result.pharmacogenomic_profile.model_dump(),
+            detected_variants=detected
+        ),
+        clinical_recommendation=base_result.clinical_recommendation,
+        quality_metrics=QualityMetrics(
+            vcf_parsing_success=True,
+            variants_analyzed=len(records),
+            records_scanned=parsed.records_scanned,
+            malformed_records=parsed.malformed_records,
+            missing_genotypes=parsed.missing_genotypes,
+            sample_id=parsed.sample_id,
+            called_alleles=called,
+            warnings=warnings
+        )
+    )
+
+async def analyze_vcf_stream(
+    chunks: AsyncIterable[bytes],
+    drug: str,
+    patient_id: Optional[str] = None,
+    sample: Optional[str] = None
+) -> VCFAnalyzeResponse:
+    """
+    Streams an uploaded VCF through the parser chunk by chunk and evaluates `drug`.
+    Only records for the drug's pharmacogene are retained.
+    """
+    gene = resolve_primary_gene(drug)
+    parser = VCFStreamParser(genes=[gene], sample=sample)
+    async for chunk in chunks:
+        parser.feed(chunk)
+    return build_vcf_response(parser.close(), drug, gene, patient_id)
@@ -0,0 +1,121 @@
+"""
+Stand-in for the Ollama /api/generate API, for load tests without a GPU.
+
+Every generation takes --latency-ms (± --jitter-ms, uniform) and at most
+--parallel generations run at once; the rest queue, as in Ollama with
+OLLAMA_NUM_PARALLEL. A fraction of requests can fail with HTTP 500
+(--error-rate) or hang for --hang-seconds (--timeout-rate) to exercise the
+client's read timeout. Streaming requests ("stream": true) receive the
+answer in --stream-chunks NDJSON pieces spread over the latency.
+
+Usage (from backend/):
+    python -m benchmarks.fake_ollama [--port 11435] [--latency-ms 800] [--jitter-ms 200]
+                                     [--parallel 4] [--error-rate 0.01] [--timeout-rate 0.01]
+Then run the app with OLLAMA_URL=http://127.0.0.1:11435/api/generate.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EXPLANATION = {
+    "summary": "Genotype-guided explanation generated by the load-test stand-in.",
+    "biological_mechanism": "The gene product metabolizes the drug; reduced function changes exposure.",
+    "clinical_reasoning": "The deterministic risk label is followed as given.",
+    "citations": "CPIC (stand-in)"
+}
+
+def create_app(
+    latency_ms: float = 800,
+    jitter_ms: float = 0,
+    parallel: int = 4,
+    error_rate: float = 0.0,
+    timeout_rate: float = 0.0,
+    hang_seconds: float = 120,
+    stream_chunks: int = 20,
+    seed: int = 0
+) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(parallel)
+    stats = {"requests": 0, "errors": 0, "hangs": 0, "active": 0, "max_active": 0}
+
+    def generation_seconds() -> float:
+        return max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        roll = rng.random()
+        if roll < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        if roll < error_rate + timeout_rate:
+            stats["hangs"] += 1
+            await asyncio.sleep(hang_seconds)
+
+        text = json.dumps(EXPLANATION)
+        seconds = generation_seconds()
+        if not body.get("stream"):
+            async with slots:
+                stats["active"] += 1
+                stats["max_active"] = max(stats["max_active"], stats["active"])
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    stats["active"] -= 1
+            return {"model": body.get("model"), "response": text, "done": True}
+
+        async def chunks():
+            async with slots:
+                stats["active"] += 1
+                stats["max_active"] = max(stats["max_active"], stats["active"])
+                try:
+                    size = -(-len(text) // stream_chunks)
+                    for start in range(0, len(text), size):
+                        await asyncio.sleep(seconds / stream_chunks)
+                        yield json.dumps({"response": text[start:start + size], "done": False}) + "\n"
+                    yield json.dumps({"response": "", "done": True}) + "\n"
+                finally:
+                    stats["active"] -= 1
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    @app.get("/")
+    def root():
+        return "Ollama is running"
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server with injectable latency and failures.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=800, help="Mean generation time")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform jitter around the mean")
+    parser.add_argument("--parallel", type=int, default=4, help="Concurrent generations; others queue")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction answered with HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction that hang for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120)
+    parser.add_argument("--stream-chunks", type=int, default=20, help="NDJSON pieces per streamed answer")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, parallel=args.parallel,
+        error_rate=args.error_rate, timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds,
+        stream_chunks=args.stream_chunks, seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
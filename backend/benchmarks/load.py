@@ -0,0 +1,315 @@
+"""
+Open-loop load generator for capacity planning.
+
+Requests arrive as a Poisson process at each offered rate, whether or not
+earlier ones have finished (so a saturated server shows growing latency
+instead of a silently lower request rate). A fraction --explain-ratio of
+requests go to /analyze-with-explanation; the rest go to /analyze. Drug,
+gene and diplotype are drawn from the rule set.
+
+For each rate the harness reports achieved throughput, p50/p90/p99 latency,
+the error rate and the mean and peak number of explanation requests in
+flight. Together these give the saturation curve. A rate counts as
+saturated when completions fall more than 10% behind arrivals,
+when p99 exceeds --slo-ms, or when more than 1% of requests fail.
+
+Either point it at a running server (--url), or let it start the app and a
+fake Ollama (benchmarks/fake_ollama.py) itself with --spawn. The spawned
+app runs with the explanation cache disabled unless --with-cache is set, so
+every explanation request reaches the LLM.
+
+Usage (from backend/):
+    python -m benchmarks.load --spawn --rates 1,2,4,8 --duration 20 --explain-ratio 0.3
+                              [--llm-latency-ms 800] [--llm-parallel 4] [--llm-error-rate 0.01]
+                              [--histogram] [--out load_results.json]
+    python -m benchmarks.load --url http://localhost:8000 --rates 5,10,20
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+ANALYZE = "/api/v1/analyze"
+EXPLAIN = "/api/v1/analyze-with-explanation"
+
+# Histogram bucket upper bounds in milliseconds (log-spaced), last is +Inf
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, math.inf]
+
+@dataclass
+class EndpointStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies_ms) + sum(self.errors.values())
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies_ms:
+            return None
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def histogram(self) -> list[int]:
+        counts = [0] * len(HISTOGRAM_BOUNDS_MS)
+        for latency in self.latencies_ms:
+            counts[next(i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if latency <= bound)] += 1
+        return counts
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "ok": len(self.latencies_ms),
+            "errors": dict(self.errors),
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": max(self.latencies_ms) if self.latencies_ms else None,
+            "histogram": dict(zip(("+Inf" if math.isinf(b) else str(b) for b in HISTOGRAM_BOUNDS_MS), self.histogram()))
+        }
+
+def request_pool() -> list[dict]:
+    """
+    Request bodies for every (drug, gene, diplotype) combination in the built-in rule tables.
+    """
+    from app.engine.drug_rules import DRUG_RULES
+    from app.engine.phenotype_map import PHENOTYPE_MAP
+
+    combinations = [
+        (drug, gene, diplotype)
+        for drug, genes in DRUG_RULES.items()
+        for gene in genes
+        for diplotype in PHENOTYPE_MAP.get(gene, {})
+    ]
+    return [
+        {"patient_id": f"LOAD_{i:05d}", "drug": drug, "gene": gene, "diplotype": diplotype}
+        for i, (drug, gene, diplotype) in enumerate(combinations)
+    ]
+
+async def run_rate(client, rate: float, duration: float, explain_ratio: float, pool: list[dict], rng: random.Random) -> dict:
+    """
+    Offers `rate` requests/s for `duration` seconds and waits for every request to finish.
+    Throughput is measured over the second half of the arrival window, once
+    the pipeline has filled: arrivals vs. completions in that interval.
+    """
+    import httpx
+
+    stats = {ANALYZE: EndpointStats(), EXPLAIN: EndpointStats()}
+    finished_at: list[float] = []
+    in_flight = {"explain": 0, "explain_peak": 0}
+    explain_area = 0.0  # integral of in-flight explanations over time
+    last_change = time.perf_counter()
+
+    def track(delta: int) -> None:
+        nonlocal explain_area, last_change
+        now = time.perf_counter()
+        explain_area += in_flight["explain"] * (now - last_change)
+        last_change = now
+        in_flight["explain"] += delta
+        in_flight["explain_peak"] = max(in_flight["explain_peak"], in_flight["explain"])
+
+    async def one(path: str, body: dict) -> None:
+        if path == EXPLAIN:
+            track(1)
+        started = time.perf_counter()
+        try:
+            response = await client.post(path, json=body)
+            if response.status_code >= 400:
+                kind = f"http_{response.status_code}"
+            else:
+                # A fallback explanation is a failure from the user's point of view
+                kind = "llm_fallback" if path == EXPLAIN and response.json()["llm_generated_explanation"]["summary"] in (
+                    "Local AI unavailable.", "AI generation failed parsing."
+                ) else None
+        except httpx.TimeoutException:
+            kind = "timeout"
+        except httpx.HTTPError as e:
+            kind = type(e).__name__
+        finished_at.append(time.perf_counter())
+        elapsed_ms = (finished_at[-1] - started) * 1000
+        if kind is None:
+            stats[path].latencies_ms.append(elapsed_ms)
+        else:
+            stats[path].errors[kind] = stats[path].errors.get(kind, 0) + 1
+        if path == EXPLAIN:
+            track(-1)
+
+    tasks = []
+    window_start = time.perf_counter()
+    next_arrival = window_start
+    arrived_at: list[float] = []
+    while True:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival - window_start >= duration:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path = EXPLAIN if rng.random() < explain_ratio else ANALYZE
+        arrived_at.append(time.perf_counter())
+        tasks.append(asyncio.create_task(one(path, rng.choice(pool))))
+    window_end = window_start + duration
+    await asyncio.gather(*tasks)
+    total_seconds = time.perf_counter() - window_start
+    track(0)
+
+    half = window_start + duration / 2
+    steady_arrivals = sum(1 for t in arrived_at if t >= half)
+    steady = sum(1 for t in finished_at if half <= t < window_end)
+    errors = sum(sum(s.errors.values()) for s in stats.values())
+    return {
+        "offered_rps": rate,
+        "sent": len(tasks),
+        "arrival_rps": steady_arrivals / (duration / 2),
+        "achieved_rps": steady / (duration / 2),
+        "error_rate": errors / len(tasks) if tasks else 0.0,
+        "drain_seconds": total_seconds - duration,
+        "explain_in_flight_mean": explain_area / total_seconds if total_seconds else 0.0,
+        "explain_in_flight_peak": in_flight["explain_peak"],
+        "endpoints": {path: s.summary() for path, s in stats.items() if s.requests}
+    }
+
+def is_saturated(result: dict, slo_ms: float) -> bool:
+    p99s = [e["p99_ms"] for e in result["endpoints"].values() if e["p99_ms"] is not None]
+    return (
+        result["achieved_rps"] < 0.9 * result["arrival_rps"]
+        or result["error_rate"] > 0.01
+        or any(p99 > slo_ms for p99 in p99s)
+    )
+
+def print_histogram(name: str, histogram: dict) -> None:
+    total = sum(histogram.values()) or 1
+    print(f"  {name}")
+    for bound, count in histogram.items():
+        if count:
+            print(f"    <= {bound:>6} ms {count:>7}  {'#' * max(1, round(40 * count / total))}")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for(url: str, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+
+def spawn_servers(args) -> tuple[str, list[subprocess.Popen]]:
+    """
+    Starts the fake Ollama and the app (one uvicorn worker) on free ports.
+    """
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ollama_port, app_port = free_port(), free_port()
+    fake = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port),
+        "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+        "--parallel", str(args.llm_parallel), "--error-rate", str(args.llm_error_rate),
+        "--timeout-rate", str(args.llm_timeout_rate)
+    ], cwd=backend)
+    env = {
+        **os.environ,
+        "OLLAMA_URL": f"http://127.0.0.1:{ollama_port}/api/generate",
+        "EXPLANATION_CACHE_ENABLED": "1" if args.with_cache else "0"
+    }
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(app_port), "--log-level", "warning", "--no-access-log"
+    ], cwd=backend, env=env)
+    processes = [fake, app]
+    try:
+        wait_for(f"http://127.0.0.1:{ollama_port}/")
+        wait_for(f"http://127.0.0.1:{app_port}/health/live")
+    except SystemExit:
+        for process in processes:
+            process.terminate()
+        raise
+    return f"http://127.0.0.1:{app_port}", processes
+
+async def run(args, url: str) -> list[dict]:
+    import httpx
+
+    pool = request_pool()
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    results = []
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        for rate in args.rates:
+            result = await run_rate(client, rate, args.duration, args.explain_ratio, pool, rng)
+            result["saturated"] = is_saturated(result, args.slo_ms)
+            results.append(result)
+
+            explain = result["endpoints"].get(EXPLAIN, {})
+            analyze = result["endpoints"].get(ANALYZE, {})
+            fmt = lambda value: f"{value:8.1f}" if value is not None else "       -"
+            print(
+                f"{rate:7.1f} rps offered | {result['achieved_rps']:7.1f} achieved | "
+                f"errors {result['error_rate']:6.1%} | analyze p50/p99 {fmt(analyze.get('p50_ms'))} {fmt(analyze.get('p99_ms'))} ms | "
+                f"explain p50/p99 {fmt(explain.get('p50_ms'))} {fmt(explain.get('p99_ms'))} ms | "
+                f"explanations in flight {result['explain_in_flight_mean']:5.1f} (peak {result['explain_in_flight_peak']})"
+                f"{' | SATURATED' if result['saturated'] else ''}"
+            )
+            if args.histogram:
+                for path, summary in result["endpoints"].items():
+                    print_histogram(path, summary["histogram"])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the PharmaGuard API.")
+    parser.add_argument("--url", help="Base URL of a running server")
+    parser.add_argument("--spawn", action="store_true", help="Start the app and a fake Ollama on free ports")
+    parser.add_argument("--rates", default="1,2,4,8", help="Comma-separated offered request rates (requests/s)")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of arrivals per rate")
+    parser.add_argument("--explain-ratio", type=float, default=0.3, help="Fraction of requests with an AI explanation")
+    parser.add_argument("--timeout", type=float, default=60, help="Client timeout per request (s)")
+    parser.add_argument("--slo-ms", type=float, default=10000, help="p99 above this marks a rate as saturated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--histogram", action="store_true", help="Print latency histograms per rate")
+    parser.add_argument("--out", help="Write all results as JSON")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the explanation cache enabled (--spawn)")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Fake Ollama generation time (--spawn)")
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-parallel", type=int, default=4, help="Fake Ollama concurrent generations")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-timeout-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    args.rates = [float(rate) for rate in args.rates.split(",")]
+
+    if bool(args.url) == args.spawn:
+        raise SystemExit("Pass exactly one of --url or --spawn")
+
+    processes = []
+    url = args.url
+    if args.spawn:
+        url, processes = spawn_servers(args)
+    try:
+        results = asyncio.run(run(args, url))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    sustainable = [result["offered_rps"] for result in results if not result["saturated"]]
+    print(f"Highest unsaturated rate: {max(sustainable):.1f} rps" if sustainable else "Saturated at every offered rate")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items()}, "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
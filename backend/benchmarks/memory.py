@@ -0,0 +1,154 @@
+"""
+Per-worker memory of the API server, read from /proc/<pid>/smaps_rollup (Linux).
+
+Starts the server with --workers N, either as `uvicorn --workers N` (each
+worker loads its own model) or as the pre-fork server app.cli.serve (the
+model is loaded once and shared copy-on-write). Both run with ML_WARMUP=eager.
+The harness waits until /health/ready answers and the workers' memory has
+stopped growing, then sends --requests analyze requests. It reports RSS,
+PSS, shared and private memory for every server process. PSS splits each
+shared page between the processes that map it, so the PSS total is the
+memory the server really uses; the RSS total counts shared pages once per process.
+
+Usage (from backend/):
+    python -m benchmarks.memory [--server prefork|uvicorn|both] [--workers 4]
+                                [--requests 200] [--out memory.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.load import free_port, request_pool, wait_for
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+def read_memory(pid: int) -> dict:
+    """
+    smaps_rollup of one process, in MiB.
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        "rss_mb": round(values["Rss"], 1),
+        "pss_mb": round(values["Pss"], 1),
+        "shared_mb": round(values["Shared_Clean"] + values["Shared_Dirty"], 1),
+        "private_mb": round(values["Private_Clean"] + values["Private_Dirty"], 1)
+    }
+
+def child_pids(pid: int) -> list[int]:
+    # Direct children, without multiprocessing's helper processes
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid and b"resource_tracker" not in cmdline:
+            children.append(int(entry))
+    return sorted(children)
+
+def wait_until_settled(pid: int, workers: int, timeout: float) -> None:
+    """
+    Waits until all workers exist and their total RSS has been stable for three samples.
+    """
+    deadline = time.perf_counter() + timeout
+    history = []
+    while time.perf_counter() < deadline:
+        children = child_pids(pid)
+        if len(children) >= workers:
+            try:
+                history.append(sum(read_memory(child)["rss_mb"] for child in children))
+            except OSError:
+                history = []
+            if len(history) >= 3 and max(history[-3:]) - min(history[-3:]) < 0.01 * history[-1]:
+                return
+        time.sleep(1)
+    raise SystemExit(f"Workers did not settle within {timeout:.0f}s")
+
+def measure(server: str, workers: int, requests: int, timeout: float) -> dict:
+    import httpx
+
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    port = free_port()
+    if server == "prefork":
+        command = [sys.executable, "-m", "app.cli.serve", "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers)]
+    command += ["--port", str(port), "--log-level", "warning", "--no-access-log"]
+    process = subprocess.Popen(command, cwd=backend, env={**os.environ, "ML_WARMUP": "eager"})
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(f"{url}/health/ready", timeout)
+        wait_until_settled(process.pid, workers, timeout)
+        pool = request_pool()
+        with httpx.Client(base_url=url, timeout=30) as client:
+            for i in range(requests):
+                client.post("/api/v1/analyze", json=pool[i % len(pool)]).raise_for_status()
+
+        processes = [{"role": "parent", "pid": process.pid, **read_memory(process.pid)}]
+        processes += [{"role": "worker", "pid": pid, **read_memory(pid)} for pid in child_pids(process.pid)]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    worker_rows = [row for row in processes if row["role"] == "worker"]
+    return {
+        "server": server,
+        "workers": workers,
+        "processes": processes,
+        "worker_rss_mb": round(sum(row["rss_mb"] for row in worker_rows) / len(worker_rows), 1),
+        "worker_private_mb": round(sum(row["private_mb"] for row in worker_rows) / len(worker_rows), 1),
+        "total_rss_mb": round(sum(row["rss_mb"] for row in processes), 1),
+        "total_pss_mb": round(sum(row["pss_mb"] for row in processes), 1)
+    }
+
+def print_result(result: dict) -> None:
+    print(f"{result['server']} ({result['workers']} workers)")
+    print(f"  {'role':<8} {'pid':>8} {'rss_mb':>9} {'pss_mb':>9} {'shared_mb':>10} {'private_mb':>11}")
+    for row in result["processes"]:
+        print(
+            f"  {row['role']:<8} {row['pid']:>8} {row['rss_mb']:>9.1f} {row['pss_mb']:>9.1f}"
+            f" {row['shared_mb']:>10.1f} {row['private_mb']:>11.1f}"
+        )
+    print(
+        f"  per worker: {result['worker_rss_mb']:.1f} MB RSS, {result['worker_private_mb']:.1f} MB private;"
+        f" total: {result['total_rss_mb']:.1f} MB RSS, {result['total_pss_mb']:.1f} MB PSS"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-worker memory of the API server.")
+    parser.add_argument("--server", choices=["prefork", "uvicorn", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="Analyze requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for the workers to load")
+    parser.add_argument("--out", help="Write the results as JSON")
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise SystemExit("smaps_rollup is not available (Linux 4.14+ required)")
+
+    servers = ["uvicorn", "prefork"] if args.server == "both" else [args.server]
+    results = []
+    for server in servers:
+        result = measure(server, args.workers, args.requests, args.timeout)
+        print_result(result)
+        results.append(result)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
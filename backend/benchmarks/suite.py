@@ -0,0 +1,295 @@
+"""
+Benchmark suite for the rule engine, response schemas, retrieval and the
+HTTP endpoints. Results are written as JSON; with --compare, every benchmark
+whose median is more than --tolerance slower than the baseline is reported as
+a regression and the exit code is 1.
+
+End-to-end benchmarks run the app in-process (ASGI transport, no sockets)
+with Ollama replaced by an in-process stand-in that answers after
+--llm-latency-ms, so no model or server is needed. Retrieval benchmarks use a
+throwaway knowledge-base copy and are skipped if the retrieval mode needs ML
+dependencies that are not installed.
+
+Usage (from backend/):
+    python -m benchmarks.suite [--groups engine,schemas,retrieval,e2e] [--out results.json]
+                               [--compare baseline.json] [--tolerance 0.2]
+                               [--llm-latency-ms 50] [--retrieval-mode lexical]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from typing import Callable, Optional
+
+GROUPS = ("engine", "schemas", "retrieval", "e2e")
+
+SAMPLE_REQUEST = {"patient_id": "PATIENT_001", "gene": "CYP2C19", "diplotype": "*1/*2", "drug": "CLOPIDOGREL"}
+SAMPLE_EXPLANATION = {
+    "summary": "Reduced activation of clopidogrel.",
+    "biological_mechanism": "CYP2C19 converts clopidogrel into its active metabolite.",
+    "clinical_reasoning": "Intermediate metabolizers form less active metabolite.",
+    "citations": "CPIC"
+}
+
+def summarize(samples_us: list[float]) -> dict:
+    samples_us = sorted(samples_us)
+    return {
+        "median_us": statistics.median(samples_us),
+        "min_us": samples_us[0],
+        "p90_us": samples_us[int(0.9 * (len(samples_us) - 1))],
+        "samples": len(samples_us)
+    }
+
+def bench(fn: Callable[[], object], repeat: int = 7, min_seconds: float = 0.2) -> dict:
+    """
+    timeit-style microbenchmark: calls per sample are calibrated so one sample
+    takes about `min_seconds`; the median is over `repeat` samples, per call.
+    """
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_seconds / max(elapsed, 1e-9)))
+    samples = [seconds / number * 1e6 for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {**summarize(samples), "calls_per_sample": number}
+
+def bench_once(fn: Callable[[], object], repeat: int) -> dict:
+    # For operations too slow (or stateful) to loop: one timed call per sample
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return summarize(samples)
+
+def engine_benchmarks() -> dict:
+    from app.engine.phenotype_map import get_phenotype
+    from app.engine.rule_engine import evaluate_drug_risk, render_drug_risk
+    from app.engine.rule_index import get_rule_index
+
+    index = get_rule_index()
+    return {
+        "engine.get_phenotype": bench(lambda: get_phenotype("CYP2C19", "*1/*2")),
+        "engine.rule_index_phenotype": bench(lambda: index.phenotype("cyp2c19", "*2/*1")),
+        "engine.evaluate_drug_risk": bench(lambda: evaluate_drug_risk("PATIENT_001", "CYP2C19", "*1/*2", "CLOPIDOGREL")),
+        "engine.render_drug_risk": bench(lambda: render_drug_risk("PATIENT_001", "CYP2C19", "*1/*2", "CLOPIDOGREL"))
+    }
+
+def schema_benchmarks() -> dict:
+    from app.engine.rule_engine import evaluate_drug_risk
+    from app.models.schemas import AnalyzeRequest, AnalyzeResponse, AnalyzeResponseWithExplanation, AIExplanation
+
+    response = evaluate_drug_risk(**SAMPLE_REQUEST)
+    response_dict = response.model_dump()
+    request_json = json.dumps(SAMPLE_REQUEST)
+    return {
+        "schemas.request_validate_json": bench(lambda: AnalyzeRequest.model_validate_json(request_json)),
+        "schemas.response_from_dict": bench(lambda: AnalyzeResponse(**response_dict)),
+        "schemas.response_dump_json": bench(lambda: response.model_dump_json()),
+        "schemas.explained_response": bench(lambda: AnalyzeResponseWithExplanation(
+            **response.model_dump(), llm_generated_explanation=AIExplanation(**SAMPLE_EXPLANATION)
+        ))
+    }
+
+def retrieval_benchmarks(mode: str, repeat: int) -> dict:
+    """
+    cold: a fresh engine on an existing store (model load, store open,
+    knowledge-base check) plus the first query. warm: the same query again
+    (embedding cache hit), and previously unseen queries.
+    """
+    from ml.rag_engine import LocalRAGEngine
+
+    with tempfile.TemporaryDirectory() as db_path:
+        # Populate the throwaway store once; later engines only open it
+        if not LocalRAGEngine(db_path=db_path, retrieval_mode=mode).initialize():
+            return {}
+
+        def cold():
+            engine = LocalRAGEngine(db_path=db_path, retrieval_mode=mode)
+            engine.retrieve_context("clopidogrel poor metabolizer", drug="Clopidogrel", gene="CYP2C19")
+
+        results = {f"retrieval.{mode}.cold": bench_once(cold, repeat=max(3, repeat // 10))}
+
+        engine = LocalRAGEngine(db_path=db_path, retrieval_mode=mode)
+        engine.initialize()
+        query = "warfarin dosing for CYP2C9 intermediate metabolizers"
+        engine.retrieve_context(query, drug="Warfarin", gene="CYP2C9")
+        results[f"retrieval.{mode}.warm_cached"] = bench(
+            lambda: engine.retrieve_context(query, drug="Warfarin", gene="CYP2C9")
+        )
+        counter = iter(range(10 ** 9))
+        results[f"retrieval.{mode}.warm_uncached"] = bench_once(
+            lambda: engine.retrieve_context(f"{query} variant {next(counter)}", drug="Warfarin", gene="CYP2C9"),
+            repeat=repeat
+        )
+    return results
+
+class OllamaStandIn:
+    """
+    In-process replacement for the Ollama HTTP API: answers every
+    generate request with a fixed explanation after `latency_ms`.
+    """
+    def __init__(self, latency_ms: float):
+        self.latency_seconds = latency_ms / 1000
+        self.requests = 0
+
+    async def __call__(self, request):
+        import httpx
+
+        self.requests += 1
+        await asyncio.sleep(self.latency_seconds)
+        return httpx.Response(200, json={"response": json.dumps(SAMPLE_EXPLANATION), "done": True})
+
+async def _e2e(latency_ms: float, repeat: int) -> dict:
+    import httpx
+    from app.main import app
+    from ml.explanation_cache import explanation_cache
+    from ml.local_llm import local_llm
+
+    stand_in = OllamaStandIn(latency_ms)
+    await local_llm.aclose()
+    local_llm.transport = httpx.MockTransport(stand_in)
+
+    async def timed_post(client, path: str) -> float:
+        started = time.perf_counter()
+        response = await client.post(path, json=SAMPLE_REQUEST)
+        elapsed = (time.perf_counter() - started) * 1e6
+        response.raise_for_status()
+        return elapsed
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for _ in range(20):
+                await timed_post(client, "/api/v1/analyze")
+            results["e2e.analyze"] = summarize([await timed_post(client, "/api/v1/analyze") for _ in range(repeat * 10)])
+
+            # Every request misses the explanation cache and waits for the stand-in
+            uncached = []
+            for _ in range(repeat):
+                if explanation_cache is not None:
+                    explanation_cache.clear()
+                uncached.append(await timed_post(client, "/api/v1/analyze-with-explanation"))
+            results["e2e.explain_uncached"] = {**summarize(uncached), "llm_latency_ms": latency_ms}
+
+            if explanation_cache is not None:
+                results["e2e.explain_cached"] = summarize([
+                    await timed_post(client, "/api/v1/analyze-with-explanation") for _ in range(repeat * 10)
+                ])
+    await local_llm.aclose()
+    return results
+
+def e2e_benchmarks(latency_ms: float, repeat: int) -> dict:
+    return asyncio.run(_e2e(latency_ms, repeat))
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Names of benchmarks whose median exceeds the baseline's by more than `tolerance`.
+    Benchmarks missing from either side are ignored.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = result["median_us"] / reference["median_us"]
+        result["baseline_median_us"] = reference["median_us"]
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PharmaGuard benchmark suite.")
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"Comma-separated subset of {', '.join(GROUPS)}")
+    parser.add_argument("--out", default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. the baseline median (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=30, help="Samples for the slower (one call per sample) benchmarks")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Latency of the Ollama stand-in")
+    parser.add_argument("--retrieval-mode", default=os.getenv("RAG_RETRIEVAL_MODE", "vector"), help="vector, lexical or hybrid")
+    args = parser.parse_args()
+
+    groups = args.groups.split(",")
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f"Unknown groups: {', '.join(sorted(unknown))}")
+
+    # Keep benchmark runs away from the real caches and stores
+    scratch = tempfile.mkdtemp(prefix="pharmaguard-bench-")
+    os.environ["EXPLANATION_CACHE_PATH"] = os.path.join(scratch, "explanation_cache.sqlite3")
+    os.environ["EXPLANATION_JOBS_PATH"] = os.path.join(scratch, "explanation_jobs.sqlite3")
+    os.environ["CHROMA_DB_PATH"] = os.path.join(scratch, "chroma")
+    os.environ["RAG_RETRIEVAL_MODE"] = args.retrieval_mode
+    os.environ.setdefault("ML_WARMUP", "eager")
+
+    results: dict[str, dict] = {}
+    skipped: dict[str, str] = {}
+    for group in groups:
+        started = time.perf_counter()
+        try:
+            if group == "engine":
+                results.update(engine_benchmarks())
+            elif group == "schemas":
+                results.update(schema_benchmarks())
+            elif group == "retrieval":
+                group_results = retrieval_benchmarks(args.retrieval_mode, args.repeat)
+                if not group_results:
+                    skipped[group] = "RAG engine failed to initialize"
+                results.update(group_results)
+            elif group == "e2e":
+                results.update(e2e_benchmarks(args.llm_latency_ms, args.repeat))
+        except ImportError as e:
+            skipped[group] = f"missing dependency: {e.name}"
+        print(f"{group}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    regressions: Optional[list[str]] = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    report = {"environment": environment(), "skipped": skipped, "results": results}
+    if regressions is not None:
+        report["regressions"] = regressions
+        report["tolerance"] = args.tolerance
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    width = max((len(name) for name in results), default=0)
+    for name, result in results.items():
+        line = f"{name:<{width}}  median {result['median_us']:>12.2f}us  p90 {result['p90_us']:>12.2f}us"
+        if "ratio" in result:
+            flag = "  REGRESSION" if regressions and name in regressions else ""
+            line += f"  x{result['ratio']:.2f} vs baseline{flag}"
+        print(line)
+    for group, reason in skipped.items():
+        print(f"{group}: skipped ({reason})")
+    print(f"Results written to {args.out}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Compares vector store backends (ml/vector_store.py) on query latency and memory.
+Each backend runs in a fresh subprocess so RSS numbers are not shared.
+Embeddings are random unit vectors, so no embedding model is needed.
+
+Usage (from backend/):
+    python -m benchmarks.vector_store [--rows 500] [--dim 384] [--queries 500] [--batch 32]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+def rss_mb() -> float:
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def percentile_us(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1e6)
+
+def run_backend(args) -> dict:
+    """
+    Fills a store with random vectors, reopens it (the read path the server
+    uses) and times single and batched queries.
+    """
+    baseline = rss_mb()
+    try:
+        from ml.vector_store import open_vector_store
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.rows, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        ids = [f"chunk-{i}" for i in range(args.rows)]
+        metadatas = [{"drug": f"DRUG{i % 20}", "gene": f"GENE{i % 6}"} for i in range(args.rows)]
+
+        with tempfile.TemporaryDirectory() as path:
+            store = open_vector_store(path, backend=args.backend, dtype=args.dtype)
+            for start in range(0, args.rows, 256):
+                end = start + 256
+                store.upsert(ids[start:end], [f"document {i}" for i in range(start, min(end, args.rows))], metadatas[start:end], vectors[start:end].tolist())
+            del store
+
+            opened = time.perf_counter()
+            store = open_vector_store(path, backend=args.backend, dtype=args.dtype)
+            store.query(queries[:1].tolist(), args.k)
+            open_seconds = time.perf_counter() - opened
+
+            single = []
+            for query in queries:
+                started = time.perf_counter()
+                store.query([query.tolist()], args.k)
+                single.append(time.perf_counter() - started)
+
+            filtered = []
+            for i, query in enumerate(queries):
+                where = {"$and": [{"drug": f"DRUG{i % 20}"}, {"gene": f"GENE{i % 6}"}]}
+                started = time.perf_counter()
+                store.query([query.tolist()], args.k, where=where)
+                filtered.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for start in range(0, args.queries, args.batch):
+                store.query(queries[start:start + args.batch].tolist(), args.k)
+            batched_us = (time.perf_counter() - started) / args.queries * 1e6
+            rss = rss_mb()
+    except ImportError as e:
+        return {"backend": args.backend, "skipped": f"missing dependency: {e.name}"}
+
+    return {
+        "backend": args.backend,
+        "dtype": args.dtype if args.backend == "numpy" else "float32",
+        "open_ms": open_seconds * 1e3,
+        "single_p50_us": percentile_us(single, 50),
+        "single_p99_us": percentile_us(single, 99),
+        "filtered_p50_us": percentile_us(filtered, 50),
+        "batched_us_per_query": batched_us,
+        "rss_delta_mb": rss - baseline
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends.")
+    parser.add_argument("--rows", type=int, default=500, help="Stored vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (bge-small: 384)")
+    parser.add_argument("--queries", type=int, default=500, help="Queries per measurement")
+    parser.add_argument("--batch", type=int, default=32, help="Queries per batched call")
+    parser.add_argument("--k", type=int, default=3, help="Results per query")
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32", help="NumPy store dtype")
+    parser.add_argument("--backends", default="chroma,numpy", help="Comma-separated backends to compare")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: measure one backend and report as JSON
+    if args.backend:
+        print(json.dumps(run_backend(args)))
+        return
+
+    forwarded = [
+        "--rows", str(args.rows), "--dim", str(args.dim), "--queries", str(args.queries),
+        "--batch", str(args.batch), "--k", str(args.k), "--dtype", args.dtype
+    ]
+    print(f"{args.rows} vectors x {args.dim} dims, {args.queries} queries, top {args.k}")
+    for backend in args.backends.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.vector_store", "--backend", backend, *forwarded],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if "skipped" in result:
+            print(f"{backend:>7}: skipped ({result['skipped']})")
+            continue
+        print(
+            f"{backend:>7} ({result['dtype']}): open {result['open_ms']:.1f}ms | "
+            f"single p50 {result['single_p50_us']:.0f}us p99 {result['single_p99_us']:.0f}us | "
+            f"filtered p50 {result['filtered_p50_us']:.0f}us | "
+            f"batched {result['batched_us_per_query']:.1f}us/query | "
+            f"RSS +{result['rss_delta_mb']:.1f}MB"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Context assembly: turns ranked retrieval results into the guideline context of a prompt.
+
+Chunks are taken in rank order and
+1. de-duplicated: exact duplicates (ignoring case, punctuation and spacing) are
+   dropped, and so are near duplicates, chunks whose word shingles are mostly
+   (CONTEXT_DEDUP_THRESHOLD) already contained in the chunks kept so far;
+2. packed into CONTEXT_TOKEN_BUDGET tokens: a chunk that does not fit is
+   skipped and a shorter, lower-ranked one may take its place. The top chunk
+   is always kept, cut at a word boundary if it alone exceeds the budget.
+
+Token counts are estimates (about four characters per token); the LLM's
+tokenizer is not available locally. Every prompt token adds to Ollama's
+prefill time, so the tokens removed are reported (see AssembledContext).
+"""
+import os
+from dataclasses import dataclass
+
+from ml.lexical import tokenize
+
+CHARS_PER_TOKEN = 4
+SEPARATOR = "\n\n"
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def shingles(text: str, size: int) -> set[tuple[str, ...]]:
+    """
+    Word n-grams of the text (the whole text for texts shorter than `size` words).
+    """
+    words = tokenize(text)
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+@dataclass(frozen=True)
+class AssembledContext:
+    text: str
+    tokens: int
+    # Estimated tokens of the verbatim join of all retrieved chunks, minus `tokens`
+    tokens_saved: int
+    duplicates: int
+    over_budget: int
+
+class ContextAssembler:
+    def __init__(
+        self,
+        token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400")),
+        dedup_threshold: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8")),
+        shingle_size: int = int(os.getenv("CONTEXT_SHINGLE_SIZE", "3"))
+    ):
+        if token_budget < 1:
+            raise ValueError("CONTEXT_TOKEN_BUDGET must be at least 1")
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.shingle_size = shingle_size
+
+    def config(self) -> dict:
+        # Part of the retrieval table version: assembled contexts depend on it
+        return {
+            "token_budget": self.token_budget,
+            "dedup_threshold": self.dedup_threshold,
+            "shingle_size": self.shingle_size
+        }
+
+    def _deduplicate(self, chunks: list[str]) -> list[str]:
+        kept = []
+        seen_exact = set()
+        seen_shingles: set[tuple[str, ...]] = set()
+        for chunk in chunks:
+            words = tuple(tokenize(chunk))
+            if words in seen_exact:
+                continue
+            chunk_shingles = shingles(chunk, self.shingle_size)
+            if kept and len(chunk_shingles & seen_shingles) >= self.dedup_threshold * len(chunk_shingles):
+                continue
+            seen_exact.add(words)
+            seen_shingles |= chunk_shingles
+            kept.append(chunk)
+        return kept
+
+    def _truncate(self, chunk: str) -> str:
+        limit = self.token_budget * CHARS_PER_TOKEN
+        cut = chunk.rfind(" ", 0, limit + 1)
+        return chunk[:cut if cut > 0 else limit]
+
+    def assemble(self, chunks: list[str]) -> AssembledContext:
+        """
+        Context for chunks in rank order (best first).
+        """
+        verbatim_tokens = estimate_tokens(SEPARATOR.join(chunks))
+        unique = self._deduplicate(chunks)
+
+        selected = []
+        used = 0
+        separator_tokens = estimate_tokens(SEPARATOR)
+        for chunk in unique:
+            cost = estimate_tokens(chunk) + (separator_tokens if selected else 0)
+            if used + cost <= self.token_budget:
+                selected.append(chunk)
+                used += cost
+            elif not selected:
+                selected.append(self._truncate(chunk))
+                used = self.token_budget
+
+        text = SEPARATOR.join(selected)
+        tokens = estimate_tokens(text)
+        return AssembledContext(
+            text=text,
+            tokens=tokens,
+            tokens_saved=verbatim_tokens - tokens,
+            duplicates=len(chunks) - len(unique),
+            over_budget=len(unique) - len(selected)
+        )
+
+# Singleton instance used by the RAG engine
+context_assembler = ContextAssembler()
@@ -0,0 +1,113 @@
+"""
+Micro-batching embedding scheduler.
+
+Queries submitted from many threads (or event loops) are queued. A dedicated
+worker thread takes the first waiting query, gathers whatever else arrives
+within `window_ms` (up to `max_batch_size` queries), encodes them in one model
+call and resolves each caller's future.
+
+Configured by EMBED_BATCH_WINDOW_MS (0 disables batching) and EMBED_MAX_BATCH_SIZE.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], list],
+        max_batch_size: int = 32,
+        window_ms: float = 2.0
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_ms / 1000
+
+        self.batches = 0
+        self.queries = 0
+        # batch size -> number of model calls with that size
+        self.histogram: dict[int, int] = {}
+
+        self._queue: queue.SimpleQueue[Optional[tuple[str, Future]]] = queue.SimpleQueue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """
+        Queues one text; the returned future resolves to its embedding.
+        """
+        if self._worker is None:
+            self._start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> list[float]:
+        """
+        Blocking convenience wrapper around submit().
+        """
+        return self.submit(text).result()
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _collect(self, first: tuple[str, Future]) -> tuple[list[tuple[str, Future]], bool]:
+        # Gathers a batch starting with `first`; the flag reports a close() request
+        batch = [first]
+        deadline = time.perf_counter() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, closing = self._collect(first)
+            # Skip callers that gave up while queued
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                embeddings = self.embed_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            self.histogram[len(batch)] = self.histogram.get(len(batch), 0) + 1
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(list(embedding))
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window_seconds * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.histogram.copy().items()))
+        }
@@ -0,0 +1,20 @@
+from sentence_transformers import SentenceTransformer
+
+from app.metrics import timed
+
+try:
+    from chromadb.utils.embedding_functions import EmbeddingFunction
+except ImportError:
+    # chromadb is only needed for the Chroma vector store backend
+    EmbeddingFunction = object
+
+# Wrapper for SentenceTransformer to match ChromaDB's EmbeddingFunction interface
+class LocalEmbeddingFunction(EmbeddingFunction):
+    def __init__(self, model_name="BAAI/bge-small-en-v1.5"):
+        self.model = SentenceTransformer(model_name)
+
+    @timed("embedding_model")
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        # Returns a list of embeddings
+        embeddings = self.model.encode(input).tolist()
+        return embeddings
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+# Next to the backend package rather than in whatever directory the server starts from
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "explanation_cache.sqlite3")
+
+def make_cache_key(
+    drug: str,
+    gene: str,
+    phenotype: str,
+    risk_label: str,
+    model: str,
+    rules_version: str,
+    kb_version: str
+) -> str:
+    """
+    Cache key over every input that determines the generated explanation.
+    The patient is deliberately not part of it.
+    """
+    payload = json.dumps([
+        drug.strip().lower(), gene.strip().upper(), phenotype, risk_label,
+        model, rules_version, kb_version
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ExplanationCache:
+    """
+    Disk-backed (SQLite) explanation cache with TTL and LRU eviction.
+    Concurrent misses for the same key are coalesced into one generation.
+    The database is opened on first use. Async callers use aget/aset, which
+    run the SQLite calls on a worker thread instead of the event loop.
+    """
+    def __init__(
+        self,
+        path: str = os.getenv("EXPLANATION_CACHE_PATH") or DEFAULT_PATH,
+        max_entries: int = int(os.getenv("EXPLANATION_CACHE_MAX_ENTRIES", "10000")),
+        ttl_seconds: float = float(os.getenv("EXPLANATION_CACHE_TTL", str(30 * 24 * 3600)))
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS explanations ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON explanations(accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, created_at FROM explanations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM explanations WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE explanations SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO explanations (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        conn = self._connection()
+        conn.execute("DELETE FROM explanations WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        excess = conn.execute("SELECT COUNT(*) FROM explanations").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM explanations WHERE key IN "
+                "(SELECT key FROM explanations ORDER BY accessed_at ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM explanations").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM explanations")
+
+    async def aget(self, key: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: dict) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    async def lookup(self, key: str) -> Optional[dict]:
+        """
+        aget that counts the hit or miss, for callers that generate and aset
+        the value themselves (e.g. the streaming endpoint).
+        """
+        value = await self.aget(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def get_or_create(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[dict]],
+        should_store: Callable[[dict], bool] = lambda value: True
+    ) -> dict:
+        """
+        Returns the cached value for `key`, or awaits `factory()` to produce it.
+        If a generation for `key` is already running, waits for that one instead.
+        Values rejected by `should_store` (e.g. fallback responses) are returned but not cached.
+        """
+        cached = await self.aget(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fill(key, factory, should_store))
+            self._inflight[key] = task
+        # Shielded so one cancelled caller does not abort the shared generation
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, factory: Callable[[], Awaitable[dict]], should_store: Callable[[dict], bool]) -> dict:
+        try:
+            value = await factory()
+            if should_store(value):
+                await self.aset(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight)
+        }
+
+# Singleton (None when disabled)
+explanation_cache = ExplanationCache() if os.getenv("EXPLANATION_CACHE_ENABLED", "1") == "1" else None
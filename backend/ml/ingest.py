@@ -0,0 +1,194 @@
+"""
+Knowledge-base ingestion pipeline.
+
+Chunks are identified by a hash of their content and metadata, so syncing a
+collection only embeds chunks that are new or changed and deletes chunks that
+disappeared from the sources. Embedding runs in bounded batches.
+
+Usage (from backend/):
+    python -m ml.ingest [--store chroma|numpy] [--batch-size 64] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+KB_DIR = os.path.join(os.path.dirname(__file__), "knowledge_base")
+GUIDELINES_PATH = os.path.join(KB_DIR, "cpic_guidelines.txt")
+RAG_DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data-clean", "master_rag_data.json")
+
+@dataclass(frozen=True)
+class Chunk:
+    id: str
+    text: str
+    metadata: dict = field(hash=False)
+
+def make_chunk(text: str, **metadata) -> Chunk:
+    metadata = {key: value for key, value in metadata.items() if value is not None}
+    payload = json.dumps([text, metadata], sort_keys=True)
+    return Chunk(id=hashlib.sha256(payload.encode()).hexdigest()[:32], text=text, metadata=metadata)
+
+def _parse_guideline_fields(line: str) -> dict:
+    # "Drug: CLOPIDOGREL | Gene: CYP2C19 | Risk: ... | Recommendation: ..."
+    fields = {}
+    for part in line.split("|"):
+        name, sep, value = part.partition(":")
+        if sep:
+            fields[name.strip().lower()] = value.strip()
+    return fields
+
+def load_guideline_lines(path: str = GUIDELINES_PATH) -> list[Chunk]:
+    """
+    One chunk per non-empty line of the guideline text file.
+    """
+    if not os.path.exists(path):
+        print(f"Knowledge base not found at {path}")
+        return []
+    chunks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            fields = _parse_guideline_fields(line)
+            chunks.append(make_chunk(
+                line,
+                source=os.path.basename(path),
+                drug=fields.get("drug", "").upper() or None,
+                gene=fields.get("gene", "").upper() or None
+            ))
+    return chunks
+
+def load_rag_records(path: str = RAG_DATA_PATH) -> list[Chunk]:
+    """
+    One chunk per structured record of master_rag_data.json.
+    """
+    if not os.path.exists(path):
+        print(f"Structured RAG data not found at {path}")
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    chunks = []
+    for record in records:
+        drug = str(record.get("drug", "")).upper()
+        gene = str(record.get("gene", "")).upper()
+        text = (
+            f"Drug: {drug} | Gene: {gene} | Risk: {record.get('risk_label', '')} | "
+            f"Recommendation: {record.get('clinical_recommendation', '')} | "
+            f"Strength: {record.get('confidence_score', 'N/A')}"
+        )
+        chunks.append(make_chunk(
+            text,
+            source=os.path.basename(path),
+            drug=drug or None,
+            gene=gene or None,
+            strength=record.get("confidence_score")
+        ))
+    return chunks
+
+def load_default_chunks() -> list[Chunk]:
+    """
+    All knowledge-base chunks, de-duplicated by id.
+    """
+    chunks = {}
+    for chunk in load_guideline_lines() + load_rag_records():
+        chunks.setdefault(chunk.id, chunk)
+    return list(chunks.values())
+
+def knowledge_base_version(chunks: Optional[list[Chunk]] = None) -> str:
+    """
+    Hash over all chunk ids, so anything derived from the knowledge base
+    (explanation cache, retrieval table) is invalidated when it changes.
+    """
+    ids = sorted(chunk.id for chunk in (chunks if chunks is not None else load_default_chunks()))
+    return hashlib.sha256("".join(ids).encode()).hexdigest()[:12]
+
+@dataclass
+class IngestStats:
+    added: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.added / self.seconds if self.seconds else 0.0
+
+def _batches(items: list, size: int) -> Iterable[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def sync_collection(
+    collection,
+    chunks: list[Chunk],
+    embed: Callable[[list[str]], list],
+    batch_size: int = 64,
+    dry_run: bool = False,
+    progress: Callable[[str], None] = print
+) -> IngestStats:
+    """
+    Makes `collection` (an ml.vector_store.VectorStore) contain exactly `chunks`: embeds and upserts new ids in
+    batches of `batch_size`, deletes ids no longer present, leaves the rest.
+    """
+    started = time.perf_counter()
+    wanted = {chunk.id: chunk for chunk in chunks}
+    existing = set(collection.ids())
+
+    to_add = [chunk for chunk_id, chunk in wanted.items() if chunk_id not in existing]
+    to_delete = [chunk_id for chunk_id in existing if chunk_id not in wanted]
+    stats = IngestStats(unchanged=len(wanted) - len(to_add))
+
+    if dry_run:
+        stats.added, stats.deleted = len(to_add), len(to_delete)
+        return stats
+
+    for batch in _batches(to_add, batch_size):
+        embeddings = embed([chunk.text for chunk in batch])
+        collection.upsert(
+            ids=[chunk.id for chunk in batch],
+            documents=[chunk.text for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+            embeddings=[list(map(float, vector)) for vector in embeddings]
+        )
+        stats.added += len(batch)
+        elapsed = time.perf_counter() - started
+        progress(f"Embedded {stats.added}/{len(to_add)} chunks ({stats.added / elapsed:.1f} chunks/s)")
+
+    for batch in _batches(to_delete, batch_size):
+        collection.delete(ids=batch)
+        stats.deleted += len(batch)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync the knowledge base into the vector store.")
+    parser.add_argument("--db", default=os.getenv("CHROMA_DB_PATH", "./chroma_local_db"), help="ChromaDB directory")
+    parser.add_argument("--store", choices=("chroma", "numpy"), default=None, help="Vector store backend (default: VECTOR_STORE or chroma)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks embedded per model call")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    chunks = load_default_chunks()
+    print(f"Loaded {len(chunks)} chunks (knowledge base version {knowledge_base_version(chunks)})")
+
+    from ml.embeddings import LocalEmbeddingFunction
+    from ml.vector_store import open_vector_store
+
+    embedding_fn = LocalEmbeddingFunction()
+    collection = open_vector_store(args.db, backend=args.store, embedding_fn=embedding_fn)
+
+    stats = sync_collection(collection, chunks, embedding_fn, batch_size=args.batch_size, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"Would add {stats.added}, delete {stats.deleted}, keep {stats.unchanged} chunks")
+    else:
+        print(
+            f"Added {stats.added}, deleted {stats.deleted}, unchanged {stats.unchanged} "
+            f"in {stats.seconds:.2f}s ({stats.chunks_per_second:.1f} chunks/s)"
+        )
+
+if __name__ == "__main__":
+    main()
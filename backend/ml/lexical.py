@@ -0,0 +1,117 @@
+"""
+In-process lexical retrieval: BM25 over knowledge-base chunks, with exact
+drug/gene metadata filtering. Needs no embedding model or vector store.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+from ml.ingest import Chunk
+
+_TOKEN = re.compile(r"[a-z0-9*]+")
+
+# Metadata fields usable as exact filters, in the order they are relaxed
+FILTER_FIELDS = ("drug", "gene")
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Merges ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in.
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: -scores[item])
+
+def chroma_where(filters: dict) -> Optional[dict]:
+    """
+    Chroma `where` clause for exact-match filters.
+    """
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return dict(filters)
+    return {"$and": [{field: value} for field, value in filters.items()]}
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of chunks. Build a new instance to change chunks.
+    """
+    def __init__(self, chunks: list[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+
+        self._term_freqs = [Counter(tokenize(chunk.text)) for chunk in self.chunks]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+        document_freqs = Counter()
+        for tf in self._term_freqs:
+            document_freqs.update(tf.keys())
+        n = len(self.chunks)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_freqs.items()
+        }
+
+        # field -> upper-cased value -> chunk positions
+        self._postings: dict[str, dict[str, frozenset[int]]] = {}
+        for field in FILTER_FIELDS:
+            values: dict[str, set[int]] = {}
+            for position, chunk in enumerate(self.chunks):
+                value = chunk.metadata.get(field)
+                if value:
+                    values.setdefault(str(value).upper(), set()).add(position)
+            self._postings[field] = {value: frozenset(positions) for value, positions in values.items()}
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def candidates(self, drug: Optional[str] = None, gene: Optional[str] = None) -> tuple[Optional[frozenset[int]], dict]:
+        """
+        Chunk positions matching the exact drug/gene filter, and the filter applied.
+        If nothing matches both, falls back to drug only, then gene only, then
+        no filter (positions None).
+        """
+        requested = {
+            field: value.strip().upper()
+            for field, value in (("drug", drug), ("gene", gene))
+            if value and value.strip()
+        }
+        attempts = [requested] if requested else []
+        if len(requested) > 1:
+            attempts += [{field: value} for field, value in requested.items()]
+        for filters in attempts:
+            positions = None
+            for field, value in filters.items():
+                matches = self._postings[field].get(value, frozenset())
+                positions = matches if positions is None else positions & matches
+            if positions:
+                return positions, filters
+        return None, {}
+
+    def search(self, query: str, n_results: int, positions: Optional[frozenset[int]] = None) -> list[tuple[Chunk, float]]:
+        """
+        Top n_results (chunk, score) among `positions` (all chunks when None).
+        Ties keep knowledge-base order.
+        """
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        k1, b, avg_length = self.k1, self.b, self._avg_length or 1.0
+
+        def score(position: int) -> float:
+            tf = self._term_freqs[position]
+            norm = k1 * (1 - b + b * self._lengths[position] / avg_length)
+            return sum(
+                self._idf[term] * tf[term] * (k1 + 1) / (tf[term] + norm)
+                for term in terms if term in tf
+            )
+
+        pool = range(len(self.chunks)) if positions is None else sorted(positions)
+        scored = [(score(position), -position) for position in pool]
+        return [(self.chunks[-neg], value) for value, neg in heapq.nlargest(n_results, scored)]
@@ -0,0 +1,207 @@
+"""
+Routing of LLM generations across several Ollama-compatible backends.
+
+Each request goes to the available backend with the fewest generations in
+flight (ties rotate). Every backend has a circuit breaker: after
+`failure_threshold` consecutive failures it opens and the backend is
+skipped; failed health probes count toward the threshold like failed
+requests. After `reset_seconds`, or as soon as a health probe succeeds, one
+trial request is let through (half-open). If that request succeeds the
+breaker closes; if it fails the breaker opens again. When no backend is
+available, acquire() fails immediately instead of waiting for a timeout.
+
+Backends come from OLLAMA_BACKENDS, a comma-separated list of
+`url` or `url|model` entries (the model defaults to OLLAMA_MODEL). Without
+it, OLLAMA_URL is the only backend.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class NoBackendAvailable(Exception):
+    pass
+
+class LLMBackend:
+    def __init__(self, url: str, model: str, failure_threshold: int = 3, reset_seconds: float = 10.0):
+        self.url = url
+        self.model = model
+        parts = urlsplit(url)
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        self.name = f"{model}@{parts.netloc}"
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        # Circuit breaker
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.healthy: Optional[bool] = None  # None until the first probe
+        self.latencies: deque[float] = deque(maxlen=512)
+
+    def available(self, now: float) -> bool:
+        if self.state == OPEN and now - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == CLOSED
+
+    def open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.trial_in_flight = False
+
+    def record(self, ok: bool, seconds: float, error: Optional[str], now: float) -> None:
+        self.requests += 1
+        self.trial_in_flight = False
+        if ok:
+            self.latencies.append(seconds)
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            return
+        self.errors += 1
+        self.last_error = error
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.open(now)
+
+    def record_probe(self, healthy: bool, now: float) -> None:
+        self.healthy = healthy
+        if healthy:
+            if self.state == OPEN:
+                # Let the next request through as a trial instead of waiting out the reset time
+                self.state = HALF_OPEN
+            return
+        self.last_error = "health probe failed"
+        self.consecutive_failures += 1
+        if self.state != OPEN and (self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold):
+            self.open(now)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        percentile = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else None
+        return {
+            "name": self.name,
+            "url": self.url,
+            "model": self.model,
+            "state": self.state,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p99_ms": percentile(0.99),
+            "last_error": self.last_error
+        }
+
+class LLMRouter:
+    def __init__(
+        self,
+        backends: list[LLMBackend],
+        probe_interval: float = 5.0,
+        probe_path: str = "/",
+        probe_timeout: float = 2.0
+    ):
+        if not backends:
+            raise ValueError("At least one LLM backend is required")
+        self.backends = backends
+        self.probe_interval = probe_interval
+        self.probe_path = probe_path
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._next = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, default_url: str, default_model: str, probe_timeout: float = 2.0) -> "LLMRouter":
+        failure_threshold = int(os.getenv("OLLAMA_BREAKER_FAILURES", "3"))
+        reset_seconds = float(os.getenv("OLLAMA_BREAKER_RESET", "10"))
+        entries = [entry.strip() for entry in os.getenv("OLLAMA_BACKENDS", "").split(",") if entry.strip()]
+        backends = []
+        for entry in entries or [default_url]:
+            url, _, model = entry.partition("|")
+            backends.append(LLMBackend(url.strip(), model.strip() or default_model, failure_threshold, reset_seconds))
+        return cls(
+            backends,
+            probe_interval=float(os.getenv("OLLAMA_PROBE_INTERVAL", "5")),
+            probe_path=os.getenv("OLLAMA_PROBE_PATH", "/"),
+            probe_timeout=probe_timeout
+        )
+
+    def acquire(self) -> LLMBackend:
+        """
+        Reserves the available backend with the fewest outstanding requests.
+        Pair with release().
+        """
+        now = time.monotonic()
+        with self._lock:
+            n = len(self.backends)
+            # Rotate the starting point so ties are spread evenly
+            order = [self.backends[(self._next + i) % n] for i in range(n)]
+            self._next = (self._next + 1) % n
+            candidates = [backend for backend in order if backend.available(now)]
+            if not candidates:
+                raise NoBackendAvailable("No LLM backend available (all circuit breakers open)")
+            backend = min(candidates, key=lambda b: b.outstanding)
+            backend.outstanding += 1
+            if backend.state == HALF_OPEN:
+                backend.trial_in_flight = True
+            return backend
+
+    def release(self, backend: LLMBackend, ok: Optional[bool], seconds: float, error: Optional[str] = None) -> None:
+        """
+        Ends a reservation. `ok=None` records no outcome (e.g. the client went away).
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            if ok is None:
+                backend.trial_in_flight = False
+            else:
+                backend.record(ok, seconds, error, time.monotonic())
+
+    def start_probes(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        """
+        Starts the background health probes on the running event loop (idempotent).
+        """
+        if self.probe_interval > 0 and (self._probe_task is None or self._probe_task.done()):
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop(transport))
+
+    async def stop_probes(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+
+    async def _probe(self, client: httpx.AsyncClient, backend: LLMBackend) -> None:
+        try:
+            response = await client.get(backend.base_url + self.probe_path)
+            healthy = response.status_code < 500
+        except httpx.HTTPError:
+            healthy = False
+        with self._lock:
+            backend.record_probe(healthy, time.monotonic())
+
+    async def _probe_loop(self, transport: Optional[httpx.AsyncBaseTransport]) -> None:
+        # Separate client, so probes never queue behind generations in the main pool
+        async with httpx.AsyncClient(timeout=self.probe_timeout, transport=transport) as client:
+            while True:
+                await asyncio.gather(*(self._probe(client, backend) for backend in self.backends))
+                await asyncio.sleep(self.probe_interval)
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [backend.stats() for backend in self.backends]
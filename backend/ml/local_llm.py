@@ -1,31 +1,106 @@
+import asyncio
+import re
+import time
 import requests
+import httpx
 import json
 import os
+from typing import AsyncIterator, Optional
+
+from app.metrics import LLM_FAILURES, LLM_FALLBACKS, timed
+from ml.llm_router import LLMRouter, NoBackendAvailable
+
+SYSTEM_PROMPT = """You are a pharmacogenomics clinical assistant.
+Only use provided context.
+Do not hallucinate.
+Do not override deterministic risk.
+You must return the output as valid JSON."""
+
+# Summaries of the fallback responses below; these must never be cached
+FALLBACK_SUMMARIES = {"Local AI unavailable.", "AI generation failed parsing."}
+
+def is_fallback_response(explanation: dict) -> bool:
+    return explanation.get("summary") in FALLBACK_SUMMARIES
+
+EXPLANATION_FIELDS = ("summary", "biological_mechanism", "clinical_reasoning", "citations")
+
+# A complete `"key": "value"` string pair inside (possibly unfinished) JSON text
+_COMPLETED_FIELD = re.compile(r'"(\w+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+def extract_completed_fields(partial_json: str) -> dict:
+    """
+    Returns the explanation fields whose string values are already complete
+    in a JSON document that is still being generated.
+    """
+    fields = {}
+    for match in _COMPLETED_FIELD.finditer(partial_json):
+        key = match.group(1)
+        if key in EXPLANATION_FIELDS:
+            try:
+                fields[key] = json.loads(f'"{match.group(2)}"')
+            except json.JSONDecodeError:
+                continue
+    return fields
+
+def unavailable_response(error: Exception) -> dict:
+    LLM_FAILURES.inc()
+    LLM_FALLBACKS.inc()
+    return {
+        "summary": "Local AI unavailable.",
+        "biological_mechanism": "Check if Ollama is running.",
+        "clinical_reasoning": str(error),
+        "citations": "N/A"
+    }
+
+def parse_failed_response() -> dict:
+    LLM_FALLBACKS.inc()
+    return {
+        "summary": "AI generation failed parsing.",
+        "biological_mechanism": "Invalid JSON response.",
+        "clinical_reasoning": "N/A",
+        "citations": "N/A"
+    }
 
 class LocalClinicalLLM:
-    def __init__(self, model="mixtral", api_url="http://localhost:11434/api/generate"):
-        self.model = model
-        self.api_url = api_url
+    def __init__(
+        self,
+        model=os.getenv("OLLAMA_MODEL", "mixtral"),
+        api_url=os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate"),
+        max_concurrency=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4")),
+        connect_timeout=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "2")),
+        read_timeout=float(os.getenv("OLLAMA_READ_TIMEOUT", "30")),
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        router: Optional[LLMRouter] = None
+    ):
+        # Spreads generations over OLLAMA_BACKENDS (default: just api_url/model)
+        self.router = router or LLMRouter.from_env(api_url, model, probe_timeout=connect_timeout)
+        # The primary backend; its model is part of the explanation cache key
+        self.model = self.router.backends[0].model
+        self.api_url = self.router.backends[0].url
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Custom transport for the async client (e.g. an in-process stand-in in benchmarks)
+        self.transport = transport
 
-    def generate_explanation(
+        # Async client state, created lazily on the running event loop
+        self._client = None
+        self._semaphore = None
+
+    @timed("prompt_build")
+    def build_payload(
         self,
         drug: str,
         gene: str,
         phenotype: str,
         risk_label: str,
         rule_summary: str,
-        retrieved_context: str
+        retrieved_context: str,
+        stream: bool = False
     ) -> dict:
         """
-        Generates a clinical explanation using a local LLM via Ollama.
+        Builds the Ollama /api/generate payload for a clinical explanation.
         """
-        
-        system_prompt = """You are a pharmacogenomics clinical assistant.
-Only use provided context.
-Do not hallucinate.
-Do not override deterministic risk.
-You must return the output as valid JSON."""
-
         user_prompt = f"""
         CONTEXT:
         - Drug: {drug}
@@ -44,42 +119,184 @@ You must return the output as valid JSON."""
         4. Return VALID JSON with keys: "summary", "biological_mechanism", "clinical_reasoning", "citations".
         """
 
-        payload = {
+        return {
             "model": self.model,
-            "prompt": f"{system_prompt}\n\n{user_prompt}",
-            "stream": False,
+            "prompt": f"{SYSTEM_PROMPT}\n\n{user_prompt}",
+            "stream": stream,
             "format": "json",
             "options": {
                 "temperature": 0.2
             }
         }
 
+    @timed("llm_generation")
+    def generate_explanation(
+        self,
+        drug: str,
+        gene: str,
+        phenotype: str,
+        risk_label: str,
+        rule_summary: str,
+        retrieved_context: str
+    ) -> dict:
+        """
+        Generates a clinical explanation using a local LLM via Ollama.
+        Blocking; use agenerate_explanation from async code.
+        """
+        payload = self.build_payload(drug, gene, phenotype, risk_label, rule_summary, retrieved_context)
+
         try:
-            response = requests.post(self.api_url, json=payload, timeout=30)
+            backend = self.router.acquire()
+        except NoBackendAvailable as e:
+            return unavailable_response(e)
+
+        started = time.perf_counter()
+        try:
+            response = requests.post(
+                backend.url, json={**payload, "model": backend.model}, timeout=(self.connect_timeout, self.read_timeout)
+            )
             response.raise_for_status()
-            
+        except requests.exceptions.RequestException as e:
+            self.router.release(backend, False, time.perf_counter() - started, repr(e))
+            print(f"Ollama Connection Error: {e}")
+            return unavailable_response(e)
+        self.router.release(backend, True, time.perf_counter() - started)
+
+        try:
             data = response.json()
             generated_text = data.get("response", "{}")
             
             # Parse JSON from string
             return json.loads(generated_text)
             
-        except requests.exceptions.RequestException as e:
-            print(f"Ollama Connection Error: {e}")
-            return {
-                "summary": "Local AI unavailable.",
-                "biological_mechanism": "Check if Ollama is running.",
-                "clinical_reasoning": str(e),
-                "citations": "N/A"
-            }
         except json.JSONDecodeError:
             print("Failed to parse LLM JSON output")
-            return {
-                "summary": "AI generation failed parsing.",
-                "biological_mechanism": "Invalid JSON response.",
-                "clinical_reasoning": "N/A",
-                "citations": "N/A"
-            }
+            return parse_failed_response()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    connect=self.connect_timeout,
+                    read=self.read_timeout,
+                    write=self.connect_timeout,
+                    pool=None
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                transport=self.transport
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.router.start_probes(self.transport)
+        return self._client
+
+    async def _apost(self, client: httpx.AsyncClient, payload: dict) -> httpx.Response:
+        """
+        Posts to the least busy backend. A connection failure (the request
+        never reached the server) is retried once on another backend.
+        """
+        attempts = min(2, len(self.router.backends))
+        for attempt in range(attempts):
+            backend = self.router.acquire()
+            started = time.perf_counter()
+            try:
+                response = await client.post(backend.url, json={**payload, "model": backend.model})
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                self.router.release(backend, False, time.perf_counter() - started, repr(e))
+                if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) and attempt + 1 < attempts:
+                    continue
+                raise
+            self.router.release(backend, True, time.perf_counter() - started)
+            return response
+
+    @timed("llm_generation")
+    async def agenerate_explanation(
+        self,
+        drug: str,
+        gene: str,
+        phenotype: str,
+        risk_label: str,
+        rule_summary: str,
+        retrieved_context: str
+    ) -> dict:
+        """
+        Async variant of generate_explanation.
+        Uses a pooled keep-alive client; at most `max_concurrency` generations
+        are in flight, the rest wait without blocking the event loop.
+        """
+        payload = self.build_payload(drug, gene, phenotype, risk_label, rule_summary, retrieved_context)
+        client = self._get_client()
+
+        try:
+            async with self._semaphore:
+                response = await self._apost(client, payload)
+
+            data = response.json()
+            generated_text = data.get("response", "{}")
+            return json.loads(generated_text)
+
+        except (httpx.HTTPError, NoBackendAvailable) as e:
+            print(f"Ollama Connection Error: {e!r}")
+            return unavailable_response(e)
+        except json.JSONDecodeError:
+            print("Failed to parse LLM JSON output")
+            return parse_failed_response()
+
+    async def astream_explanation(
+        self,
+        drug: str,
+        gene: str,
+        phenotype: str,
+        risk_label: str,
+        rule_summary: str,
+        retrieved_context: str
+    ) -> AsyncIterator[str]:
+        """
+        Streams the raw generated JSON text from Ollama as it is produced.
+        Connection and HTTP errors (and NoBackendAvailable) propagate to the
+        caller, as does a stream that ends before Ollama's `done` frame.
+        """
+        payload = self.build_payload(
+            drug, gene, phenotype, risk_label, rule_summary, retrieved_context, stream=True
+        )
+        client = self._get_client()
+
+        async with self._semaphore:
+            backend = self.router.acquire()
+            started = time.perf_counter()
+            done, error = False, None
+            try:
+                async with client.stream("POST", backend.url, json={**payload, "model": backend.model}) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            done = True
+                            break
+                    if not done:
+                        raise httpx.RemoteProtocolError("LLM stream ended before the done frame", request=response.request)
+            except (httpx.HTTPError, json.JSONDecodeError) as e:
+                error = repr(e)
+                raise
+            finally:
+                # Only a done frame is a success; a client that disconnects
+                # mid-stream is not the backend's fault and records nothing
+                ok = True if done else (False if error is not None else None)
+                self.router.release(backend, ok, time.perf_counter() - started, error)
+
+    async def aclose(self) -> None:
+        await self.router.stop_probes()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
 
 # Singleton
 local_llm = LocalClinicalLLM()
@@ -1,82 +1,361 @@
+import json
 import os
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
 
-# Wrapper for SentenceTransformer to match ChromaDB's EmbeddingFunction interface
-class LocalEmbeddingFunction(embedding_functions.EmbeddingFunction):
-    def __init__(self, model_name="BAAI/bge-small-en-v1.5"):
-        self.model = SentenceTransformer(model_name)
+from ml.ingest import knowledge_base_version, load_default_chunks, sync_collection
+from ml.lexical import BM25Index, chroma_where, reciprocal_rank_fusion
+from ml.embedding_batcher import EmbeddingBatcher
+from ml.context_assembly import AssembledContext, context_assembler, estimate_tokens
+from app.metrics import CONTEXT_TABLE_HITS, CONTEXT_TOKENS, CONTEXT_TOKENS_SAVED, timed, timer
 
-    def __call__(self, input: list[str]) -> list[list[float]]:
-        # Returns a list of embeddings
-        embeddings = self.model.encode(input).tolist()
-        return embeddings
+# Lifecycle states reported by /health/ready
+COLD, WARMING, READY, FAILED = "cold", "warming", "ready", "failed"
+
+# The query template used by the explanation service
+GUIDELINE_QUERY = "CPIC guideline for {drug} and {gene} phenotype {phenotype}"
+# Chunks retrieved per query; context assembly then drops duplicates and
+# whatever does not fit the token budget
+DEFAULT_N_RESULTS = int(os.getenv("CONTEXT_CANDIDATES", "15"))
+
+# Retrieval modes:
+#   vector  - embedding search over the whole collection
+#   lexical - exact drug/gene metadata filter, then BM25; never loads the embedding model
+#   hybrid  - exact drug/gene metadata filter, then BM25 and vector rankings fused (RRF)
+VECTOR, LEXICAL, HYBRID = "vector", "lexical", "hybrid"
+RETRIEVAL_MODES = (VECTOR, LEXICAL, HYBRID)
+# Candidates taken from each ranking before fusion, per requested result
+FUSION_DEPTH = 4
+
+def guideline_key(drug: str, gene: str, phenotype: str) -> str:
+    return f"{drug.strip().lower()}|{gene.strip().upper()}|{phenotype}"
 
 class LocalRAGEngine:
-    def __init__(self):
-        try:
-            self.embedding_fn = LocalEmbeddingFunction()
-            self.client = chromadb.PersistentClient(path="./chroma_local_db")
-            
-            self.collection = self.client.get_or_create_collection(
-                name="cpic_guidelines_local",
-                embedding_function=self.embedding_fn
-            )
-            
-            # Check if empty, then ingest
-            if self.collection.count() == 0:
-                self._ingest_knowledge_base()
-        except Exception as e:
-            print(f"RAG Engine Initialization Error: {e}")
-            self.collection = None
+    """
+    Local RAG engine (SentenceTransformer embeddings + a vector store, and/or in-process BM25).
+    Construction is cheap: torch, the embedding model and Chroma are only
+    imported/loaded by initialize(), called by a background warm-up or on first use,
+    and never in lexical mode. The vector store backend comes from VECTOR_STORE.
+    """
+    def __init__(
+        self,
+        db_path: str = "./chroma_local_db",
+        embedding_cache_size: int = 1024,
+        retrieval_mode: str = VECTOR
+    ):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"RAG_RETRIEVAL_MODE must be one of {RETRIEVAL_MODES}, got {retrieval_mode!r}")
+        self.db_path = db_path
+        self.retrieval_mode = retrieval_mode
+        self.embedding_fn = None
+        self.batcher: Optional[EmbeddingBatcher] = None
+        self.collection = None
+        self.state = COLD
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        self._lexical_index: Optional[BM25Index] = None
 
-    def _ingest_knowledge_base(self):
-        kb_path = os.path.join(os.path.dirname(__file__), "knowledge_base", "cpic_guidelines.txt")
-        if not os.path.exists(kb_path):
-            print(f"Knowledge base not found at {kb_path}")
-            return
+        # Precomputed contexts for every templated (drug, gene, phenotype) query,
+        # loaded from disk without the embedding model when still current.
+        self.table_path = os.path.join(db_path, "retrieval_table.json")
+        self._context_table: Optional[dict[str, str]] = None
+        # Key -> tokens the assembly removed from that context
+        self._tokens_saved: dict[str, int] = {}
+        self._table_checked = False
+        self._table_lock = threading.Lock()
 
-        with open(kb_path, "r", encoding="utf-8") as f:
-            full_text = f.read()
+        # LRU cache for free-form query embeddings
+        self._embed_query = lru_cache(maxsize=embedding_cache_size)(self._embed_query_uncached)
 
-        # Simple chunking by line for now (since our txt is line-based)
-        # For larger texts, we'd use a more sophisticated splitter
-        lines = [line.strip() for line in full_text.split('\n') if line.strip()]
+    @property
+    def uses_embeddings(self) -> bool:
+        return self.retrieval_mode != LEXICAL
 
-        if not lines:
-            return
+    def _is_usable(self) -> bool:
+        if self.uses_embeddings:
+            return self.collection is not None
+        return self._lexical_index is not None
 
-        ids = [str(i) for i in range(len(lines))]
-        
-        print(f"Ingesting {len(lines)} guidelines into Local ChromaDB...")
-        self.collection.add(
-            documents=lines,
-            ids=ids
-        )
-        print("Ingestion complete.")
+    def initialize(self) -> bool:
+        """
+        Loads the embedding model and opens the collection (only the BM25
+        index in lexical mode). Idempotent and thread-safe; returns True when
+        the engine is usable.
+        """
+        if self.state in (READY, FAILED):
+            return self._is_usable()
+
+        with self._lock:
+            if self.state in (READY, FAILED):
+                return self._is_usable()
+            self.state = WARMING
+            started = time.perf_counter()
+            try:
+                if self.retrieval_mode != VECTOR:
+                    self._lexical_index = BM25Index(load_default_chunks())
+                if not self.uses_embeddings:
+                    self.state = READY
+                    self.load_seconds = time.perf_counter() - started
+                    return True
+
+                from ml.embeddings import LocalEmbeddingFunction
+                from ml.vector_store import open_vector_store
+
+                self.embedding_fn = LocalEmbeddingFunction()
+                # Concurrent single-query embeddings are merged into batched model calls
+                window_ms = float(os.getenv("EMBED_BATCH_WINDOW_MS", "2"))
+                if window_ms > 0:
+                    self.batcher = EmbeddingBatcher(
+                        self.embedding_fn,
+                        max_batch_size=int(os.getenv("EMBED_MAX_BATCH_SIZE", "32")),
+                        window_ms=window_ms
+                    )
+                self.collection = open_vector_store(self.db_path, embedding_fn=self.embedding_fn)
+
+                # Bring the collection in line with the knowledge base;
+                # only new or changed chunks are embedded
+                if os.getenv("RAG_AUTO_INGEST", "1") == "1":
+                    self._sync_knowledge_base()
+                if self._load_context_table() is None:
+                    self._build_context_table()
+                self.state = READY
+            except Exception as e:
+                print(f"RAG Engine Initialization Error: {e}")
+                self.collection = None
+                self.error = str(e)
+                self.state = FAILED
+            self.load_seconds = time.perf_counter() - started
+        return self._is_usable()
 
-    def retrieve_context(self, query: str, n_results: int = 3) -> str:
+    def before_fork(self) -> None:
         """
-        Retrieves top n_results relevant context chunks for the query using local embeddings.
+        Called in a pre-fork server's parent after initialize(): releases what
+        must not be shared with forked workers. The model weights and the
+        NumPy store's pages stay shared copy-on-write.
         """
-        if not self.collection:
-            return "RAG Engine not initialized."
+        if self.batcher is not None:
+            # The worker thread restarts lazily in each process
+            self.batcher.close()
+        if self.collection is not None and not self.collection.fork_safe:
+            self.collection.close()
 
-        try:
+    def after_fork(self) -> None:
+        """
+        Called in each forked worker: reopens a store closed by before_fork().
+        """
+        if self.collection is not None and not self.collection.fork_safe:
+            from ml.vector_store import open_vector_store
+            self.collection = open_vector_store(self.db_path, embedding_fn=self.embedding_fn)
+
+    def start_background_warmup(self) -> threading.Thread:
+        """
+        Initializes the engine on a daemon thread so startup is not blocked.
+        """
+        thread = threading.Thread(target=self.initialize, name="rag-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _sync_knowledge_base(self):
+        stats = sync_collection(self.collection, load_default_chunks(), self.embedding_fn, progress=lambda message: None)
+        if stats.added or stats.deleted:
+            print(f"Knowledge base synced: {stats.added} added, {stats.deleted} deleted, {stats.unchanged} unchanged")
+
+    @timed("query_embedding")
+    def _embed_query_uncached(self, query: str) -> tuple[float, ...]:
+        if self.batcher is not None:
+            return tuple(self.batcher.embed(query))
+        return tuple(self.embedding_fn([query])[0])
+
+    def _query_documents(self, embeddings: list, n_results: int) -> list[list[str]]:
+        with timer("vector_search"):
+            results = self.collection.query(embeddings, n_results)
+        return results['documents'] or []
+
+    def _search(
+        self,
+        query: str,
+        n_results: int,
+        drug: Optional[str] = None,
+        gene: Optional[str] = None,
+        embedding: Optional[list] = None
+    ) -> list[str]:
+        """
+        Ranked context chunks for the query according to the retrieval mode.
+        `embedding` may carry a precomputed query embedding.
+        """
+        if self.retrieval_mode == VECTOR:
+            if embedding is None:
+                embedding = list(self._embed_query(query))
+            documents = self._query_documents([embedding], n_results)
+            return documents[0] if documents else []
+
+        # 1. Exact metadata filter, 2. lexical ranking within the candidates
+        positions, filters = self._lexical_index.candidates(drug, gene)
+        depth = n_results if self.retrieval_mode == LEXICAL else n_results * FUSION_DEPTH
+        with timer("lexical_search"):
+            lexical = self._lexical_index.search(query, depth, positions)
+        if self.retrieval_mode == LEXICAL:
+            return [chunk.text for chunk, _ in lexical]
+
+        # 3. Vector ranking within the same candidates, fused with the lexical one
+        if embedding is None:
+            embedding = list(self._embed_query(query))
+        with timer("vector_search"):
             results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+                [embedding],
+                min(depth, len(positions)) if positions else depth,
+                where=chroma_where(filters)
             )
-            
-            if not results['documents']:
+        texts = {chunk.id: chunk.text for chunk, _ in lexical}
+        vector_ids = results['ids'][0] if results['ids'] else []
+        texts.update(zip(vector_ids, results['documents'][0] if vector_ids else []))
+        fused = reciprocal_rank_fusion([[chunk.id for chunk, _ in lexical], vector_ids])
+        return [texts[chunk_id] for chunk_id in fused[:n_results]]
+
+    def _assemble(self, chunks: list[str]) -> AssembledContext:
+        with timer("context_assembly"):
+            return context_assembler.assemble(chunks)
+
+    @timed("retrieval")
+    def retrieve_context(
+        self,
+        query: str,
+        n_results: int = DEFAULT_N_RESULTS,
+        drug: Optional[str] = None,
+        gene: Optional[str] = None
+    ) -> str:
+        """
+        Retrieves top n_results relevant context chunks for the query and
+        assembles them (duplicates removed, within the token budget).
+        In lexical/hybrid mode `drug`/`gene` restrict candidates by exact metadata match.
+        Query embeddings are LRU-cached.
+        """
+        if not self.initialize():
+            return "RAG Engine not initialized."
+
+        try:
+            context_chunks = self._search(query, n_results, drug=drug, gene=gene)
+
+            if not context_chunks:
                 return "No relevant guidelines found."
 
-            # Flatten list of lists
-            context_chunks = results['documents'][0]
-            return "\n\n".join(context_chunks)
+            context = self._assemble(context_chunks)
+            CONTEXT_TOKENS.inc(context.tokens)
+            CONTEXT_TOKENS_SAVED.inc(context.tokens_saved)
+            return context.text
         except Exception as e:
             return f"Error retrieving context: {str(e)}"
 
-# Singleton instance
-rag_engine = LocalRAGEngine()
+    def lookup_guideline_context(self, drug: str, gene: str, phenotype: str) -> Optional[str]:
+        """
+        Precomputed context for a known (drug, gene, phenotype) combination, or None.
+        Never loads the embedding model.
+        """
+        table = self._context_table if self._context_table is not None else self._load_context_table()
+        if table is None:
+            return None
+        key = guideline_key(drug, gene, phenotype)
+        context = table.get(key)
+        if context is not None:
+            CONTEXT_TABLE_HITS.inc()
+            CONTEXT_TOKENS.inc(estimate_tokens(context))
+            CONTEXT_TOKENS_SAVED.inc(self._tokens_saved.get(key, 0))
+        return context
+
+    def retrieve_guideline_context(self, drug: str, gene: str, phenotype: str) -> str:
+        """
+        Context for the templated guideline query: the precomputed table for
+        known combinations, otherwise a live (cached-embedding) search.
+        """
+        context = self.lookup_guideline_context(drug, gene, phenotype)
+        if context is not None:
+            return context
+        return self.retrieve_context(
+            GUIDELINE_QUERY.format(drug=drug, gene=gene, phenotype=phenotype),
+            drug=drug,
+            gene=gene
+        )
+
+    def _table_version(self) -> dict:
+        from app.engine.rule_index import get_rule_index
+        return {
+            "kb_version": knowledge_base_version(),
+            "rules_version": get_rule_index().version,
+            "n_results": DEFAULT_N_RESULTS,
+            "context_assembly": context_assembler.config(),
+            "retrieval_mode": self.retrieval_mode,
+            "vector_store": os.getenv("VECTOR_STORE", "chroma")
+        }
+
+    def _load_context_table(self) -> Optional[dict[str, str]]:
+        """
+        Loads the persisted table if it matches the current KB and rule versions.
+        """
+        with self._table_lock:
+            if self._context_table is not None or self._table_checked:
+                return self._context_table
+            self._table_checked = True
+            try:
+                with open(self.table_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if data.get("version") != self._table_version():
+                return None
+            self._tokens_saved = data.get("tokens_saved", {})
+            self._context_table = data["contexts"]
+            return self._context_table
+
+    def _build_context_table(self) -> None:
+        """
+        Embeds every templated query for the rule combinations in one batch,
+        runs one batched search and persists the resulting contexts.
+        """
+        from app.engine.rule_index import get_rule_index
+
+        combinations = {
+            guideline_key(drug, gene, result.phenotype): (
+                GUIDELINE_QUERY.format(drug=drug, gene=gene, phenotype=result.phenotype), drug, gene
+            )
+            for drug, gene, result in get_rule_index().rules()
+        }
+        if not combinations:
+            return
+        keys = list(combinations)
+        started = time.perf_counter()
+        embeddings = self.embedding_fn([combinations[key][0] for key in keys])
+        if self.retrieval_mode == VECTOR:
+            documents = self._query_documents(embeddings, DEFAULT_N_RESULTS)
+        else:
+            # Filters differ per combination, so searches run one by one
+            documents = [
+                self._search(query, DEFAULT_N_RESULTS, drug=drug, gene=gene, embedding=list(map(float, embedding)))
+                for (query, drug, gene), embedding in zip((combinations[key] for key in keys), embeddings)
+            ]
+        assembled = {key: self._assemble(chunks) for key, chunks in zip(keys, documents)}
+        table = {key: context.text for key, context in assembled.items()}
+        tokens_saved = {key: context.tokens_saved for key, context in assembled.items()}
+
+        with self._table_lock:
+            self._tokens_saved = tokens_saved
+            self._context_table = table
+        try:
+            with open(self.table_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self._table_version(), "contexts": table, "tokens_saved": tokens_saved}, f)
+        except OSError as e:
+            print(f"Could not persist retrieval table: {e}")
+        print(f"Precomputed {len(table)} guideline contexts in {time.perf_counter() - started:.2f}s")
+        print(
+            f"Context assembly: {sum(context.tokens for context in assembled.values())} tokens kept,"
+            f" {sum(tokens_saved.values())} saved; {sum(context.duplicates for context in assembled.values())}"
+            f" duplicate and {sum(context.over_budget for context in assembled.values())} over-budget chunks dropped"
+        )
+
+# Singleton instance (not initialized until warm-up or first use)
+rag_engine = LocalRAGEngine(
+    db_path=os.getenv("CHROMA_DB_PATH", "./chroma_local_db"),
+    retrieval_mode=os.getenv("RAG_RETRIEVAL_MODE", VECTOR)
+)
@@ -0,0 +1,245 @@
+"""
+Pluggable vector stores for the RAG engine and ingestion.
+
+- ChromaVectorStore: a ChromaDB persistent collection (SQLite + HNSW).
+- NumpyVectorStore: a normalized embedding matrix in a memory-mapped .npy file,
+  searched with a vectorized dot product. For a corpus of a few hundred chunks
+  this is exact and cheaper than an ANN index.
+
+Select with VECTOR_STORE=chroma|numpy (and VECTOR_STORE_DTYPE=float32|float16).
+"""
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+COLLECTION_NAME = "cpic_guidelines_local"
+BACKENDS = ("chroma", "numpy")
+
+class VectorStore:
+    """
+    Interface used by the RAG engine and ml.ingest (a subset of Chroma's collection API).
+    `query` returns {"ids", "documents", "distances"}, each a list per query embedding.
+    `fork_safe` stores may be used by processes forked after opening them;
+    others are closed before the fork and reopened in each child.
+    """
+    fork_safe = True
+
+    def close(self) -> None:
+        pass
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def ids(self) -> list[str]:
+        raise NotImplementedError
+
+    def upsert(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings: list) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]) -> None:
+        raise NotImplementedError
+
+    def query(self, query_embeddings: list, n_results: int, where: Optional[dict] = None) -> dict:
+        raise NotImplementedError
+
+class ChromaVectorStore(VectorStore):
+    # SQLite connections and client threads do not survive a fork
+    fork_safe = False
+
+    def __init__(self, path: str, embedding_fn=None):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            embedding_function=embedding_fn
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def ids(self) -> list[str]:
+        return self.collection.get(include=[])["ids"]
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def query(self, query_embeddings, n_results, where=None) -> dict:
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+    def close(self) -> None:
+        # Stops the shared system behind every client on this path, so a new client starts fresh
+        self.client.clear_system_cache()
+
+def _matches(metadata: dict, where: dict) -> bool:
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    return all(metadata.get(field) == value for field, value in where.items())
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact cosine search over an in-process matrix. Vectors are L2-normalized on
+    write and stored as `vectors.npy` (memory-mapped on read); ids, documents and
+    metadata live in `index.json`. Writes rewrite both files atomically.
+    """
+    def __init__(self, path: str, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"VECTOR_STORE_DTYPE must be 'float32' or 'float16', got {dtype!r}")
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(path, "vectors.npy")
+        self.index_path = os.path.join(path, "index.json")
+        os.makedirs(path, exist_ok=True)
+
+        self._ids: list[str] = []
+        self._documents: list[str] = []
+        self._metadatas: list[dict] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._masks: dict[str, np.ndarray] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            matrix = np.load(self.vectors_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+        if index.get("dtype") != self.dtype.name or len(index["ids"]) != len(matrix):
+            print(f"Vector store at {self.path} does not match dtype {self.dtype.name}; re-ingest required")
+            return
+        self._ids, self._documents, self._metadatas = index["ids"], index["documents"], index["metadatas"]
+        self._matrix = matrix
+        self._masks = {}
+
+    def _save(self, matrix: np.ndarray) -> None:
+        # Write-then-rename so readers in other processes never see a partial file
+        tmp_vectors = self.vectors_path + ".tmp.npy"
+        tmp_index = self.index_path + ".tmp"
+        np.save(tmp_vectors, matrix.astype(self.dtype))
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({
+                "dtype": self.dtype.name,
+                "ids": self._ids,
+                "documents": self._documents,
+                "metadatas": self._metadatas
+            }, f)
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_index, self.index_path)
+        self._load()
+
+    def _current_matrix(self, dim: int) -> np.ndarray:
+        if self._matrix is None:
+            return np.empty((0, dim), dtype=np.float32)
+        return np.array(self._matrix, dtype=np.float32)
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def ids(self) -> list[str]:
+        return list(self._ids)
+
+    def upsert(self, ids, documents, metadatas, embeddings) -> None:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        matrix = self._current_matrix(vectors.shape[1])
+        positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        # An id repeated within the batch is written once: the last occurrence wins
+        last_rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        appended = []
+        for chunk_id, row in last_rows.items():
+            document, metadata = documents[row], metadatas[row]
+            position = positions.get(chunk_id)
+            if position is None:
+                positions[chunk_id] = len(self._ids)
+                self._ids.append(chunk_id)
+                self._documents.append(document)
+                self._metadatas.append(metadata or {})
+                appended.append(row)
+            else:
+                matrix[position] = vectors[row]
+                self._documents[position] = document
+                self._metadatas[position] = metadata or {}
+        self._save(np.vstack([matrix, vectors[appended]]))
+
+    def delete(self, ids) -> None:
+        removed = set(ids)
+        keep = [i for i, chunk_id in enumerate(self._ids) if chunk_id not in removed]
+        if len(keep) == len(self._ids):
+            return
+        matrix = self._current_matrix(0 if self._matrix is None else self._matrix.shape[1])[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._save(matrix)
+
+    def _mask(self, where: Optional[dict]) -> Optional[np.ndarray]:
+        # Boolean row mask per distinct filter, cached until the next write
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((_matches(metadata, where) for metadata in self._metadatas), dtype=bool, count=len(self._metadatas))
+            self._masks[key] = mask
+        return mask
+
+    def query(self, query_embeddings, n_results, where=None) -> dict:
+        queries = np.array(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        result = {"ids": [], "documents": [], "distances": []}
+        if self._matrix is None or not self._ids:
+            for _ in range(len(queries)):
+                result["ids"].append([])
+                result["documents"].append([])
+                result["distances"].append([])
+            return result
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1, norms)
+
+        mask = self._mask(where)
+        rows = np.arange(len(self._ids)) if mask is None else np.flatnonzero(mask)
+        matrix = self._matrix if mask is None else self._matrix[rows]
+        # (candidates, dim) @ (dim, queries) -> cosine similarity per candidate and query;
+        # float16 rows are upcast, so scoring always runs in float32
+        scores = (matrix @ queries.T).T
+        k = min(n_results, len(rows))
+
+        for query_scores in scores:
+            if k == 0:
+                top = np.empty(0, dtype=np.intp)
+            elif k < len(rows):
+                top = np.argpartition(-query_scores, k - 1)[:k]
+                top = top[np.argsort(-query_scores[top], kind="stable")]
+            else:
+                top = np.argsort(-query_scores, kind="stable")
+            result["ids"].append([self._ids[rows[i]] for i in top])
+            result["documents"].append([self._documents[rows[i]] for i in top])
+            result["distances"].append((1.0 - query_scores[top]).tolist())
+        return result
+
+def open_vector_store(
+    path: str,
+    backend: Optional[str] = None,
+    embedding_fn=None,
+    dtype: Optional[str] = None
+) -> VectorStore:
+    """
+    Opens the configured backend under `path` (a ChromaDB directory).
+    The NumPy store lives in its `numpy_index/` subdirectory.
+    """
+    backend = backend or os.getenv("VECTOR_STORE", "chroma")
+    if backend == "chroma":
+        return ChromaVectorStore(path, embedding_fn=embedding_fn)
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(path, "numpy_index"), dtype=dtype or os.getenv("VECTOR_STORE_DTYPE", "float32"))
+    raise ValueError(f"VECTOR_STORE must be one of {BACKENDS}, got {backend!r}")
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Add backend to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# The API tests run the rule engine only; ML components are tested directly
+os.environ.setdefault("PHARMAGUARD_MODE", "rules")
+
+# Stores opened by the module-level singletons go to a scratch directory, not the source tree
+_scratch = tempfile.TemporaryDirectory(prefix="pharmaguard-tests-")
+os.environ.setdefault("EXPLANATION_CACHE_PATH", os.path.join(_scratch.name, "explanation_cache.sqlite3"))
+os.environ.setdefault("EXPLANATION_JOBS_PATH", os.path.join(_scratch.name, "explanation_jobs.sqlite3"))
@@ -0,0 +1,73 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.engine.drug_rules import DRUG_RULES
+from app.engine.phenotype_map import PHENOTYPE_MAP
+from app.engine.rule_engine import (
+    _evaluate_template, evaluate_drug_risk, evaluate_drug_risk_batch, evaluate_drug_risk_columns
+)
+from app.engine.rule_index import RuleIndex, get_rule_index, swap_rule_index
+
+client = TestClient(app)
+
+VALID = {"patient_id": "P1", "gene": "CYP2C19", "diplotype": "*1/*2", "drug": "Clopidogrel"}
+
+def test_batch_matches_single_evaluation():
+    results = evaluate_drug_risk_batch([VALID, {**VALID, "patient_id": "P2", "diplotype": "*2/*2"}])
+    assert [item.index for item in results] == [0, 1]
+    assert results[0].result == evaluate_drug_risk(**VALID)
+    assert results[1].result.patient_id == "P2"
+    assert results[1].result.pharmacogenomic_profile.phenotype == "Poor Metabolizer"
+
+def test_batch_reports_malformed_rows_individually():
+    results = evaluate_drug_risk_batch([
+        VALID,
+        "not an object",
+        {"patient_id": "P3", "gene": "CYP2C19"},
+        {**VALID, "drug": 42},
+        None,
+        VALID
+    ])
+    assert [item.error is None for item in results] == [True, False, False, False, False, True]
+    assert results[1].error == "Request must be an object"
+    assert results[2].error == "Missing field(s): diplotype, drug"
+    assert results[3].error == "Field 'drug' must be a string"
+
+def test_template_uses_the_index_it_is_keyed_by():
+    before = get_rule_index()
+    rules = json.loads(json.dumps(DRUG_RULES))
+    rules["Clopidogrel"]["CYP2C19"]["Poor Metabolizer"]["monitoring"] = "Swapped"
+    swap_rule_index(RuleIndex(rules, PHENOTYPE_MAP, version="v-swapped"))
+    try:
+        # A batch that started before the swap still evaluates with its own index
+        template = _evaluate_template("CYP2C19", "*2/*2", "Clopidogrel", before)
+    finally:
+        swap_rule_index(before)
+    expected = before.lookup("Clopidogrel", "CYP2C19", "*2/*2").clinical_recommendation.monitoring
+    assert template.clinical_recommendation.monitoring == expected != "Swapped"
+
+def test_columns_match_rows():
+    rows = evaluate_drug_risk_batch([VALID, {**VALID, "patient_id": "P2"}])
+    columns = evaluate_drug_risk_columns(["P1", "P2"], ["CYP2C19"] * 2, ["*1/*2"] * 2, ["Clopidogrel"] * 2)
+    assert columns == rows
+
+def test_batch_endpoint_mixed_rows():
+    response = client.post("/api/v1/analyze/batch", json={"requests": [VALID, "oops", 7, [], {"patient_id": "P2"}]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["succeeded"] == 1
+    assert body["failed"] == 4
+    assert [item["index"] for item in body["results"]] == [0, 1, 2, 3, 4]
+    assert body["results"][0]["result"]["drug"] == "Clopidogrel"
+    assert all(item["error"] for item in body["results"][1:])
+
+def test_batch_endpoint_requires_exactly_one_payload():
+    assert client.post("/api/v1/analyze/batch", json={}).status_code == 422
+    columns = {"patient_id": ["P1"], "gene": ["CYP2C19"], "diplotype": ["*1/*2"], "drug": ["Clopidogrel"]}
+    assert client.post("/api/v1/analyze/batch", json={"requests": [VALID], "columns": columns}).status_code == 422
+
+def test_batch_endpoint_columns_must_have_equal_lengths():
+    columns = {"patient_id": ["P1", "P2"], "gene": ["CYP2C19"], "diplotype": ["*1/*2"], "drug": ["Clopidogrel"]}
+    assert client.post("/api/v1/analyze/batch", json={"columns": columns}).status_code == 422
@@ -0,0 +1,66 @@
+import csv
+import json
+import os
+
+from app.cli.cohort import CSV_FIELDS, run_cohort
+from vcf_fixtures import make_vcf
+
+DRUGS = [("Clopidogrel", "CYP2C19")]
+
+def write_vcf(path, sample: str, genotype: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(make_vcf([sample], [("rs4244285", "G", "A", [genotype])]))
+
+def run(root, out, **kwargs) -> dict:
+    # One chunk per run: rows are written in file order
+    return run_cohort(str(root), DRUGS, str(out), workers=1, report_every=60, **kwargs)
+
+def test_csv_output_and_resume(tmp_path):
+    root, out = tmp_path / "vcfs", tmp_path / "results.csv"
+    write_vcf(root / "a.vcf", "PA", "1/1")
+    write_vcf(root / "nested" / "b.vcf", "PB", "0/0")
+    (root / "notes.txt").write_text("not a VCF")
+
+    stats = run(root, out, fmt="csv")
+    assert (stats["files"], stats["skipped"], stats["results"], stats["errors"]) == (2, 0, 2, 0)
+    with open(out, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["patient_id"], row["diplotype"], row["risk_label"]) for row in rows] == [
+        ("PA", "*2/*2", "Ineffective"), ("PB", "*1/*1", "Safe")
+    ]
+    assert rows[0]["file"] == str(root / "a.vcf") and rows[0]["error"] == ""
+
+    # Resuming evaluates only the new file and does not repeat the header
+    write_vcf(root / "c.vcf", "PC", "0/1")
+    stats = run(root, out, fmt="csv")
+    assert (stats["files"], stats["skipped"]) == (1, 2)
+    lines = out.read_text().splitlines()
+    assert lines[0] == ",".join(CSV_FIELDS) and lines.count(lines[0]) == 1
+    assert [row["patient_id"] for row in csv.DictReader(lines)] == ["PA", "PB", "PC"]
+
+def test_checkpoint_is_keyed_by_resolved_path(tmp_path, monkeypatch):
+    root, out = tmp_path / "vcfs", tmp_path / "results.jsonl"
+    write_vcf(root / "a.vcf", "PA", "1/1")
+    run(root, out)
+    assert (tmp_path / "results.jsonl.done").read_text() == os.path.realpath(root / "a.vcf") + "\n"
+
+    # The same files through a relative root and through a symlink are done
+    monkeypatch.chdir(tmp_path)
+    assert run("vcfs", out)["files"] == 0
+    os.symlink(root, tmp_path / "link")
+    stats = run(tmp_path / "link", out)
+    assert (stats["files"], stats["skipped"]) == (0, 1)
+    assert len(out.read_text().splitlines()) == 1
+
+def test_skipped_counts_only_files_of_this_root(tmp_path):
+    out, checkpoint = tmp_path / "results.jsonl", tmp_path / "shared.done"
+    write_vcf(tmp_path / "first" / "a.vcf", "PA", "1/1")
+    write_vcf(tmp_path / "first" / "b.vcf", "PB", "1/1")
+    write_vcf(tmp_path / "second" / "c.vcf", "PC", "0/0")
+    run(tmp_path / "first", out, checkpoint=str(checkpoint))
+
+    stats = run(tmp_path / "second", out, checkpoint=str(checkpoint))
+    assert (stats["files"], stats["skipped"]) == (1, 0)
+    stats = run(tmp_path / "second", out, checkpoint=str(checkpoint))
+    assert (stats["files"], stats["skipped"]) == (0, 1)
+    assert [json.loads(line)["patient_id"] for line in out.read_text().splitlines()] == ["PA", "PB", "PC"]
@@ -0,0 +1,49 @@
+from ml.context_assembly import SEPARATOR, ContextAssembler, estimate_tokens, shingles
+
+TOP = "Clopidogrel poor metabolizers should use prasugrel or ticagrelor instead."
+OTHER = "Warfarin dosing depends on CYP2C9 and VKORC1 genotype."
+
+def test_shingles():
+    assert shingles("a b c d", 3) == {("a", "b", "c"), ("b", "c", "d")}
+    assert shingles("a b", 3) == {("a", "b")}
+
+def test_exact_duplicates_are_dropped():
+    assembler = ContextAssembler(token_budget=400)
+    # Same words, different case, punctuation and spacing
+    context = assembler.assemble([TOP, "clopidogrel POOR metabolizers should use prasugrel, or ticagrelor instead", OTHER])
+    assert context.text == TOP + SEPARATOR + OTHER
+    assert context.duplicates == 1 and context.over_budget == 0
+    assert context.tokens == estimate_tokens(context.text)
+
+def test_near_duplicates_are_dropped():
+    assembler = ContextAssembler(token_budget=400, dedup_threshold=0.8, shingle_size=3)
+    # Every 3-gram of the record already appears in the top chunk
+    record = "Poor metabolizers should use prasugrel or ticagrelor."
+    # Only some 3-grams in common: kept
+    related = "Clopidogrel poor metabolizers have higher rates of stent thrombosis."
+    context = assembler.assemble([TOP, record, related])
+    assert context.text == TOP + SEPARATOR + related
+    assert context.duplicates == 1
+
+    # A lower threshold drops the related chunk too
+    assert ContextAssembler(token_budget=400, dedup_threshold=0.1).assemble([TOP, related]).duplicates == 1
+
+def test_chunk_that_does_not_fit_is_skipped():
+    long_chunk = "Detailed dosing table " * 20
+    budget = estimate_tokens(TOP) + estimate_tokens(SEPARATOR) + estimate_tokens(OTHER)
+    context = ContextAssembler(token_budget=budget).assemble([TOP, long_chunk, OTHER])
+    # A shorter, lower-ranked chunk takes the place of the long one
+    assert context.text == TOP + SEPARATOR + OTHER
+    assert context.over_budget == 1 and context.duplicates == 0
+    assert context.tokens <= budget
+    assert context.tokens_saved == estimate_tokens(SEPARATOR.join([TOP, long_chunk, OTHER])) - context.tokens
+
+def test_top_chunk_is_always_kept():
+    assembler = ContextAssembler(token_budget=5)
+    context = assembler.assemble([TOP, "short"])
+    # Cut at a word boundary within the budget, and nothing else fits
+    assert context.text == "Clopidogrel poor"
+    assert context.tokens <= 5 and context.over_budget == 1
+
+    assert ContextAssembler(token_budget=3).assemble(["x" * 40]).text == "x" * 12
+    assert ContextAssembler(token_budget=400).assemble([]).text == ""
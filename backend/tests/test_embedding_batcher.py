@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from ml.embedding_batcher import EmbeddingBatcher
+
+def recording_embed(calls: list):
+    def embed(texts: list[str]) -> list:
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+    return embed
+
+def test_queries_within_the_window_share_one_call():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embed(calls), max_batch_size=8, window_ms=200)
+    futures = [batcher.submit(text) for text in ("a", "bb", "ccc")]
+    assert [future.result(5) for future in futures] == [[1.0], [2.0], [3.0]]
+    batcher.close()
+    assert calls == [["a", "bb", "ccc"]]
+    assert batcher.stats()["batch_size_histogram"] == {3: 1}
+
+def test_batches_are_capped_at_max_batch_size():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embed(calls), max_batch_size=2, window_ms=200)
+    futures = [batcher.submit(str(i)) for i in range(5)]
+    for future in futures:
+        future.result(5)
+    batcher.close()
+    assert calls == [["0", "1"], ["2", "3"], ["4"]]
+    stats = batcher.stats()
+    assert stats["batches"] == 3 and stats["queries"] == 5 and stats["mean_batch_size"] == 1.67
+    assert stats["batch_size_histogram"] == {1: 1, 2: 2}
+
+def test_model_error_reaches_every_waiter_of_the_batch():
+    failing = [True]
+
+    def embed(texts):
+        if failing[0]:
+            raise RuntimeError("model crashed")
+        return [[0.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(embed, max_batch_size=8, window_ms=200)
+    futures = [batcher.submit(text) for text in ("a", "b")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(5)
+
+    # The worker keeps serving; failed batches are not counted
+    failing[0] = False
+    assert batcher.embed("c") == [0.0]
+    batcher.close()
+    assert batcher.batches == 1 and batcher.queries == 1
+
+def test_cancelled_queries_are_not_encoded():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+    embed = recording_embed(calls)
+
+    def blocking_embed(texts):
+        started.set()
+        release.wait(5)
+        return embed(texts)
+
+    batcher = EmbeddingBatcher(blocking_embed, max_batch_size=1, window_ms=0)
+    first = batcher.submit("a")
+    assert started.wait(5)
+    # Queued behind the running call; the caller gives up
+    cancelled = batcher.submit("b")
+    assert cancelled.cancel()
+    last = batcher.submit("c")
+    release.set()
+    assert first.result(5) == [1.0] and last.result(5) == [1.0]
+    batcher.close()
+    assert calls == [["a"], ["c"]]
+    assert cancelled.cancelled()
+
+def test_max_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        EmbeddingBatcher(lambda texts: [], max_batch_size=0)
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+from ml.explanation_cache import ExplanationCache, make_cache_key
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_creates_no_database(tmp_path):
+    env = {**os.environ, "PYTHONPATH": BACKEND, "EXPLANATION_CACHE_ENABLED": "1"}
+    env.pop("EXPLANATION_CACHE_PATH", None)
+    subprocess.run([sys.executable, "-c", "import ml.explanation_cache"], cwd=tmp_path, env=env, check=True)
+    assert list(tmp_path.iterdir()) == []
+
+def test_database_is_opened_on_first_use(tmp_path):
+    path = tmp_path / "cache" / "explanations.sqlite3"
+    cache = ExplanationCache(path=str(path))
+    assert not path.exists()
+    assert cache.get("missing") is None
+    assert path.exists()
+
+def test_key_ignores_case_and_patient():
+    key = make_cache_key("Codeine", "cyp2d6", "Poor Metabolizer", "Ineffective", "mixtral", "r1", "k1")
+    assert key == make_cache_key(" codeine ", "CYP2D6", "Poor Metabolizer", "Ineffective", "mixtral", "r1", "k1")
+    assert key != make_cache_key("Codeine", "CYP2D6", "Poor Metabolizer", "Ineffective", "llama3", "r1", "k1")
+
+def test_ttl_and_lru_eviction(tmp_path):
+    cache = ExplanationCache(path=str(tmp_path / "c.sqlite3"), max_entries=2, ttl_seconds=3600)
+    cache.set("a", {"summary": "a"})
+    cache.set("b", {"summary": "b"})
+    assert cache.get("a") == {"summary": "a"}  # "b" is now least recently used
+    cache.set("c", {"summary": "c"})
+    assert len(cache) == 2
+    assert cache.get("b") is None and cache.get("a") is not None
+
+    expired = ExplanationCache(path=str(tmp_path / "e.sqlite3"), ttl_seconds=-1)
+    expired.set("a", {"summary": "a"})
+    assert expired.get("a") is None
+
+def test_async_access_runs_off_the_event_loop(tmp_path):
+    cache = ExplanationCache(path=str(tmp_path / "c.sqlite3"))
+    threads = []
+    get = cache.get
+
+    def recording_get(key):
+        threads.append(threading.current_thread())
+        return get(key)
+
+    cache.get = recording_get
+
+    async def run():
+        await cache.aset("a", {"summary": "a"})
+        return await cache.aget("a")
+
+    assert asyncio.run(run()) == {"summary": "a"}
+    assert threads and threading.main_thread() not in threads
+
+def test_concurrent_misses_share_one_generation(tmp_path):
+    cache = ExplanationCache(path=str(tmp_path / "c.sqlite3"))
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"summary": "generated"}
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_create("k", factory) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"summary": "generated"}] * 5
+    assert calls == 1
+    assert cache.misses == 1 and cache.coalesced == 4
+    assert cache.get("k") == {"summary": "generated"}
+
+    asyncio.run(cache.get_or_create("k", factory))
+    assert calls == 1 and cache.hits == 1
+
+def test_rejected_values_are_not_stored(tmp_path):
+    cache = ExplanationCache(path=str(tmp_path / "c.sqlite3"))
+
+    async def factory():
+        return {"summary": "fallback"}
+
+    value = asyncio.run(cache.get_or_create("k", factory, should_store=lambda value: False))
+    assert value == {"summary": "fallback"}
+    assert cache.get("k") is None
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import explanation_routes
+from app.models.schemas import AnalyzeRequest, AnalyzeResponseWithExplanation, AIExplanation
+from app.engine.rule_engine import evaluate_drug_risk
+from app.services import explanation_jobs as jobs_module
+from app.services.explanation_jobs import DEFAULT_PATH, ExplanationJobQueue, QueueFullError
+from ml.local_llm import unavailable_response
+
+EXPLANATION = AIExplanation(
+    summary="Reduced activation.", biological_mechanism="CYP2C19 loss of function.",
+    clinical_reasoning="Use an alternative.", citations="CPIC"
+)
+
+def make_request(patient_id: str = "P1") -> AnalyzeRequest:
+    return AnalyzeRequest(patient_id=patient_id, gene="CYP2C19", diplotype="*2/*2", drug="Clopidogrel")
+
+def fake_generator(seen: list, explanation: dict = EXPLANATION.model_dump()):
+    async def generate(request: AnalyzeRequest) -> AnalyzeResponseWithExplanation:
+        seen.append(request.patient_id)
+        result = evaluate_drug_risk(request.patient_id, request.gene, request.diplotype, request.drug)
+        return AnalyzeResponseWithExplanation(**result.model_dump(), llm_generated_explanation=explanation)
+    return generate
+
+def test_interactive_jobs_run_before_batch_jobs(tmp_path, monkeypatch):
+    seen = []
+    generate = fake_generator(seen)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def generate_after_release(request):
+            # The first job holds the only worker until everything else is queued
+            if request.patient_id == "B0":
+                await release.wait()
+            return await generate(request)
+
+        monkeypatch.setattr(jobs_module, "generate_drug_explanation", generate_after_release)
+        queue = ExplanationJobQueue(path=str(tmp_path / "jobs.sqlite3"), workers=1)
+        await queue.start()
+        first = await queue.submit([make_request("B0")], "batch")
+        await queue.wait(first[0].job_id, 5, unless_status="queued")
+        batch = await queue.submit([make_request("B1"), make_request("B2")], "batch")
+        interactive = await queue.submit([make_request("I1")], "interactive")
+        release.set()
+        jobs = [await queue.wait(job.job_id, 5) for job in batch + interactive]
+        await queue.stop()
+        return queue, jobs
+
+    queue, jobs = asyncio.run(run())
+    assert seen == ["B0", "I1", "B1", "B2"]
+    assert [job.status for job in jobs] == ["done"] * 3
+    assert jobs[0].explanation == EXPLANATION
+    assert jobs[0].result.risk_assessment.risk_label == "Ineffective"
+    assert queue.stats()["completed"] == 4
+
+def test_full_queue_rejects_the_whole_submission(tmp_path):
+    async def run():
+        queue = ExplanationJobQueue(path=str(tmp_path / "jobs.sqlite3"), max_queue=2, workers=0)
+        await queue.start()
+        await queue.submit([make_request()])
+        with pytest.raises(QueueFullError):
+            await queue.submit([make_request(), make_request()])
+        stats = queue.stats()
+        await queue.stop()
+        return queue, stats
+
+    queue, stats = asyncio.run(run())
+    assert stats["queued"] == 1 and stats["rejected"] == 2
+    assert len(queue.store.unfinished()) == 1
+
+def test_concurrent_submissions_cannot_overfill_the_queue(tmp_path):
+    async def run():
+        queue = ExplanationJobQueue(path=str(tmp_path / "jobs.sqlite3"), max_queue=2, workers=0)
+        await queue.start()
+        results = await asyncio.gather(
+            *(queue.submit([make_request(f"P{i}")]) for i in range(3)), return_exceptions=True
+        )
+        stats = queue.stats()
+        await queue.stop()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+    assert [type(result) for result in results[:2]] == [list, list]
+    assert isinstance(results[2], QueueFullError)
+    assert stats["queued"] == 2 and stats["rejected"] == 1
+
+def test_store_opens_lazily_and_runs_off_the_event_loop(tmp_path, monkeypatch):
+    assert os.path.dirname(DEFAULT_PATH) == os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = tmp_path / "jobs" / "jobs.sqlite3"
+    queue = ExplanationJobQueue(path=str(path), workers=1)
+    assert not path.exists()
+
+    monkeypatch.setattr(jobs_module, "generate_drug_explanation", fake_generator([]))
+    threads = []
+    for name in ("create", "get", "set_status", "unfinished", "purge"):
+        method = getattr(queue.store, name)
+
+        def record(*args, _method=method, **kwargs):
+            threads.append(threading.get_ident())
+            return _method(*args, **kwargs)
+
+        monkeypatch.setattr(queue.store, name, record)
+
+    async def run():
+        await queue.start()
+        job = (await queue.submit([make_request()]))[0]
+        job = await queue.wait(job.job_id, 5)
+        await queue.stop()
+        return job, threading.get_ident()
+
+    job, loop_thread = asyncio.run(run())
+    assert job.status == "done" and path.exists()
+    assert len(threads) >= 5 and loop_thread not in threads
+
+def test_fallback_explanation_marks_job_failed(tmp_path, monkeypatch):
+    seen = []
+    fallback = unavailable_response(ConnectionError("connection refused"))
+    monkeypatch.setattr(jobs_module, "generate_drug_explanation", fake_generator(seen, fallback))
+
+    async def run():
+        queue = ExplanationJobQueue(path=str(tmp_path / "jobs.sqlite3"), workers=1)
+        await queue.start()
+        job = (await queue.submit([make_request()]))[0]
+        job = await queue.wait(job.job_id, 5)
+        await queue.stop()
+        return queue, job
+
+    queue, job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.explanation is None
+    assert job.error == "Local AI unavailable. connection refused"
+    assert queue.stats()["failed"] == 1 and queue.stats()["completed"] == 0
+
+def test_wait_timeout_releases_the_event(tmp_path):
+    async def run():
+        queue = ExplanationJobQueue(path=str(tmp_path / "jobs.sqlite3"), workers=0)
+        await queue.start()
+        job = (await queue.submit([make_request()]))[0]
+        waits = [queue.wait(job.job_id, 0.05), queue.wait(job.job_id, 0.2)]
+        first, second = await asyncio.gather(*waits)
+        leftover = dict(queue._changed), dict(queue._waiters)
+        await queue.stop()
+        return first, second, leftover
+
+    first, second, leftover = asyncio.run(run())
+    assert first.status == second.status == "queued"
+    assert leftover == ({}, {})
+
+def test_unfinished_jobs_are_requeued_on_start(tmp_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(jobs_module, "generate_drug_explanation", fake_generator(seen))
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def run():
+        first = ExplanationJobQueue(path=path, workers=0)
+        await first.start()
+        job = (await first.submit([make_request("R1")]))[0]
+        await first.stop()
+
+        second = ExplanationJobQueue(path=path, workers=1)
+        await second.start()
+        job = await second.wait(job.job_id, 5)
+        await second.stop()
+        return job
+
+    assert asyncio.run(run()).status == "done"
+    assert seen == ["R1"]
+
+def test_submit_endpoint_queues_on_the_event_loop(tmp_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(jobs_module, "generate_drug_explanation", fake_generator(seen))
+    queue = ExplanationJobQueue(path=str(tmp_path / "jobs.sqlite3"), workers=1)
+    monkeypatch.setattr(explanation_routes, "explanation_jobs", queue)
+    loops = []
+    submit = queue.submit
+
+    async def submit_on_loop(*args):
+        # Raises RuntimeError when called from a threadpool thread
+        loops.append(asyncio.get_running_loop())
+        return await submit(*args)
+
+    monkeypatch.setattr(queue, "submit", submit_on_loop)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await queue.start()
+        yield
+        await queue.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(explanation_routes.router, prefix="/api/v1")
+    with TestClient(app) as client:
+        response = client.post("/api/v1/explanation-jobs", json=make_request().model_dump())
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        job = client.get(f"/api/v1/explanation-jobs/{job_id}", params={"wait": 5}).json()
+        assert job["status"] == "done"
+
+        response = client.post(
+            "/api/v1/explanation-jobs/batch",
+            json={"requests": [make_request("B1").model_dump(), make_request("B2").model_dump()]}
+        )
+        assert response.status_code == 202
+        assert [job["priority"] for job in response.json()["jobs"]] == ["batch", "batch"]
+    assert len(loops) == 2
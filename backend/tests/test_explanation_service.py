@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import explanation_routes
+from app.models.schemas import AnalyzeRequest
+from app.services import explanation_service
+from ml.explanation_cache import ExplanationCache
+from ml.local_llm import parse_failed_response
+
+REQUEST = AnalyzeRequest(patient_id="P1", gene="CYP2C19", diplotype="*2/*2", drug="Clopidogrel")
+VALID = {
+    "summary": "Reduced activation.", "biological_mechanism": "CYP2C19 loss of function.",
+    "clinical_reasoning": "Use an alternative.", "citations": "CPIC"
+}
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ExplanationCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(explanation_service, "explanation_cache", cache)
+
+    async def context(drug, gene, phenotype):
+        return "CPIC guideline text."
+
+    monkeypatch.setattr(explanation_service, "retrieve_guideline_context", context)
+    return cache
+
+def reply_with(monkeypatch, reply):
+    async def generate(**kwargs):
+        return reply
+    monkeypatch.setattr(explanation_service.local_llm, "agenerate_explanation", generate)
+
+@pytest.mark.parametrize("reply", [
+    ["not", "an", "object"],
+    {"summary": "Only a summary."},
+    {**VALID, "citations": None},
+])
+def test_invalid_reply_is_a_parse_failure_and_not_cached(cache, monkeypatch, reply):
+    reply_with(monkeypatch, reply)
+    response = asyncio.run(explanation_service.generate_drug_explanation(REQUEST))
+    assert response.llm_generated_explanation.model_dump() == parse_failed_response()
+    assert len(cache) == 0
+
+def test_valid_reply_is_cached_without_extra_keys(cache, monkeypatch):
+    reply_with(monkeypatch, {**VALID, "confidence": "high"})
+    response = asyncio.run(explanation_service.generate_drug_explanation(REQUEST))
+    assert response.llm_generated_explanation.model_dump() == VALID
+    assert len(cache) == 1
+
+    # Served from the cache afterwards
+    reply_with(monkeypatch, {"summary": "Only a summary."})
+    response = asyncio.run(explanation_service.generate_drug_explanation(REQUEST))
+    assert response.llm_generated_explanation.model_dump() == VALID
+
+def stream_events(monkeypatch, deltas=None, error=None) -> list[tuple[str, dict]]:
+    async def astream(**kwargs):
+        for delta in deltas or []:
+            yield delta
+        if error is not None:
+            raise error
+    monkeypatch.setattr(explanation_service.local_llm, "astream_explanation", astream)
+
+    app = FastAPI()
+    app.include_router(explanation_routes.router, prefix="/api/v1")
+    with TestClient(app) as client:
+        response = client.post("/api/v1/analyze-with-explanation/stream", json=REQUEST.model_dump())
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+def test_stream_event_order(cache, monkeypatch):
+    text = json.dumps(VALID)
+    events = stream_events(monkeypatch, deltas=[text[i:i + 9] for i in range(0, len(text), 9)])
+    names = [event for event, _ in events]
+    assert names[0] == "result" and names[-2:] == ["explanation", "done"]
+    assert set(names[1:-2]) == {"token", "field"}
+    assert events[0][1]["risk_assessment"]["risk_label"] == "Ineffective"
+    assert "".join(data["text"] for event, data in events if event == "token") == text
+    assert {data["name"]: data["value"] for event, data in events if event == "field"} == VALID
+    assert events[-2][1] == VALID
+    assert len(cache) == 1 and cache.stats()["misses"] == 1
+
+    # A cache hit sends every field at once, without tokens
+    events = stream_events(monkeypatch, error=AssertionError("the LLM must not be called"))
+    assert [event for event, _ in events] == ["result"] + ["field"] * 4 + ["explanation", "done"]
+    assert events[-2][1] == VALID
+    assert cache.stats()["hits"] == 1
+
+def test_stream_fallback_on_llm_error(cache, monkeypatch):
+    events = stream_events(monkeypatch, deltas=['{"summ'], error=httpx.ConnectError("connection refused"))
+    assert [event for event, _ in events] == ["result", "token", "error", "explanation", "done"]
+    assert events[2][1] == {"detail": "connection refused"}
+    assert events[3][1]["summary"] == "Local AI unavailable."
+    assert len(cache) == 0
+
+def test_stream_invalid_reply_is_not_cached(cache, monkeypatch):
+    events = stream_events(monkeypatch, deltas=['{"summary": "Only a summary."}'])
+    assert events[-2] == ("explanation", parse_failed_response())
+    assert len(cache) == 0
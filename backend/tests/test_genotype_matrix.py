@@ -0,0 +1,30 @@
+from app.engine.genotype_matrix import call_diplotypes, evaluate_genotype_matrix, read_genotype_matrix
+from app.engine.rule_engine import evaluate_drug_risk
+from app.engine.vcf_parser import call_diplotype, parse_vcf
+from vcf_fixtures import make_vcf
+
+SAMPLES = ["S1", "S2", "S3", "S4", "S5"]
+VCF = make_vcf(SAMPLES, [
+    ("rs4244285", "G", "A", ["0/1", "1/1", "0/0", "0/1", "./."]),
+    ("rs4986893", "G", "A", ["0/0", "0/0", "0/0", "0/1", "0/0"]),
+    ("rs12248560", "C", "T", ["0/1", "0/0", "1/1", "0/1", "0/1"])
+])
+
+def test_matches_single_sample_calls():
+    calls = call_diplotypes(read_genotype_matrix([VCF], ["CYP2C19"]), "CYP2C19")
+    for i, sample in enumerate(SAMPLES):
+        parsed = parse_vcf([VCF], genes=["CYP2C19"], sample=sample)
+        assert calls.diplotype_of(i) == call_diplotype("CYP2C19", parsed.records)
+
+def test_more_than_two_alleles_is_indeterminate():
+    calls = call_diplotypes(read_genotype_matrix([VCF], ["CYP2C19"]), "CYP2C19")
+    assert calls.diplotype_of(3) == "Indeterminate"
+    assert calls.phenotype_of(3) == "Indeterminate"
+
+def test_evaluates_every_sample_like_the_rule_engine():
+    matrix = read_genotype_matrix([VCF], ["CYP2C19"])
+    results = evaluate_genotype_matrix(matrix, [("Clopidogrel", "CYP2C19")])
+    assert [result.patient_id for result in results] == SAMPLES
+    for result in results:
+        profile = result.pharmacogenomic_profile
+        assert result == evaluate_drug_risk(result.patient_id, "CYP2C19", profile.diplotype, "Clopidogrel")
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from ml import rag_engine as rag_module
+from ml.embedding_batcher import EmbeddingBatcher
+from ml.local_llm import local_llm
+from ml.llm_router import OPEN
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+client = TestClient(app)
+
+def test_rules_mode_is_ready():
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert set(response.json()["components"]) == {"rule_engine"}
+    assert client.get("/health/live").json()["status"] == "alive"
+
+def test_full_mode_ready_states(monkeypatch):
+    monkeypatch.setattr(app.state, "mode", "full")
+    engine = rag_module.rag_engine
+    monkeypatch.setattr(engine, "error", None)
+
+    monkeypatch.setattr(engine, "state", rag_module.WARMING)
+    response = client.get("/health/ready")
+    assert response.status_code == 503 and response.json()["status"] == "warming"
+
+    monkeypatch.setattr(engine, "state", rag_module.READY)
+    response = client.get("/health/ready")
+    assert response.status_code == 200 and response.json()["status"] == "ready"
+
+    # Loading failed: serving, but explanations run without context
+    monkeypatch.setattr(engine, "state", rag_module.FAILED)
+    monkeypatch.setattr(engine, "error", "model not found")
+    response = client.get("/health/ready")
+    assert response.status_code == 200 and response.json()["status"] == "degraded"
+    assert response.json()["components"]["rag_engine"]["detail"] == "model not found"
+
+def test_all_llm_circuits_open_is_degraded(monkeypatch):
+    monkeypatch.setattr(app.state, "mode", "full")
+    monkeypatch.setattr(rag_module.rag_engine, "state", rag_module.READY)
+    for backend in local_llm.router.backends:
+        monkeypatch.setattr(backend, "state", OPEN)
+    response = client.get("/health/ready")
+    assert response.status_code == 200 and response.json()["status"] == "degraded"
+    assert response.json()["components"]["llm"]["state"] == "unavailable"
+
+def test_metrics_export_the_embedding_batch_sizes(monkeypatch):
+    monkeypatch.setattr(app.state, "mode", "full")
+    batcher = EmbeddingBatcher(lambda texts: [], max_batch_size=8)
+    batcher.batches, batcher.queries, batcher.histogram = 3, 7, {3: 1, 1: 2}
+    monkeypatch.setattr(rag_module.rag_engine, "batcher", batcher)
+    lines = client.get("/metrics").text.splitlines()
+    assert "pharmaguard_embedding_batches_total 3" in lines
+    assert "pharmaguard_embedding_batched_queries_total 7" in lines
+    start = lines.index("# TYPE pharmaguard_embedding_batch_size_batches_total counter")
+    assert lines[start + 1:start + 3] == [
+        'pharmaguard_embedding_batch_size_batches_total{size="1"} 2',
+        'pharmaguard_embedding_batch_size_batches_total{size="3"} 1'
+    ]
+
+def test_invalid_ml_warmup_is_rejected(tmp_path):
+    env = {**os.environ, "PYTHONPATH": BACKEND, "PHARMAGUARD_MODE": "rules", "ML_WARMUP": "sometimes"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.main"], cwd=tmp_path, env=env, capture_output=True, text=True
+    )
+    assert result.returncode != 0
+    assert "ML_WARMUP must be 'background', 'eager' or 'lazy', got 'sometimes'" in result.stderr
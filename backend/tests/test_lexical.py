@@ -0,0 +1,60 @@
+from ml.ingest import make_chunk
+from ml.lexical import BM25Index, chroma_where, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    make_chunk("Clopidogrel poor metabolizers: use prasugrel or ticagrelor.", drug="CLOPIDOGREL", gene="CYP2C19"),
+    make_chunk("Clopidogrel requires activation by hepatic enzymes.", drug="CLOPIDOGREL"),
+    make_chunk("Warfarin dosing depends on CYP2C9 and VKORC1.", drug="WARFARIN", gene="CYP2C9"),
+    make_chunk("CYP2C19 ultrarapid metabolizers carry *17.", gene="CYP2C19"),
+    make_chunk("General pharmacogenomics background text."),
+]
+
+def test_tokenize_keeps_star_alleles():
+    assert tokenize("CYP2C19 *2/*17, Poor!") == ["cyp2c19", "*2", "*17", "poor"]
+
+def test_candidates_relax_drug_and_gene_then_drug_then_gene():
+    index = BM25Index(CHUNKS)
+    positions, filters = index.candidates(drug="clopidogrel", gene="cyp2c19")
+    assert filters == {"drug": "CLOPIDOGREL", "gene": "CYP2C19"} and positions == {0}
+
+    # No chunk has both: drug only first
+    positions, filters = index.candidates(drug="Clopidogrel", gene="CYP2C9")
+    assert filters == {"drug": "CLOPIDOGREL"} and positions == {0, 1}
+
+    # Unknown drug: gene only
+    positions, filters = index.candidates(drug="Aspirin", gene="CYP2C19")
+    assert filters == {"gene": "CYP2C19"} and positions == {0, 3}
+
+    # Nothing matches: no filter
+    assert index.candidates(drug="Aspirin", gene="TPMT") == (None, {})
+    assert index.candidates() == (None, {})
+    assert index.candidates(drug=" ", gene=None) == (None, {})
+
+def test_search_ranks_by_bm25_within_positions():
+    index = BM25Index(CHUNKS)
+    ranked = index.search("clopidogrel prasugrel", 3)
+    assert ranked[0][0] is CHUNKS[0]
+    assert ranked[0][1] > ranked[1][1] > 0
+    assert ranked[1][0] is CHUNKS[1]
+
+    filtered = index.search("clopidogrel prasugrel", 5, positions=frozenset({2, 3}))
+    assert [chunk for chunk, _ in filtered] == [CHUNKS[2], CHUNKS[3]]
+    assert all(score == 0 for _, score in filtered)
+
+def test_search_ties_keep_knowledge_base_order():
+    index = BM25Index(CHUNKS)
+    assert [chunk for chunk, _ in index.search("unknown words", 3)] == CHUNKS[:3]
+    assert BM25Index([]).search("anything", 3) == []
+
+def test_reciprocal_rank_fusion():
+    # Equal scores keep first-seen order
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"]]) == ["a", "b", "c", "d"]
+    # An id ranked well in both lists beats one ranked first in only one
+    assert reciprocal_rank_fusion([["x", "b"], ["y", "b"], ["b"]])[0] == "b"
+    assert reciprocal_rank_fusion([["a", "b"], []], k=0) == ["a", "b"]
+    assert reciprocal_rank_fusion([]) == []
+
+def test_chroma_where():
+    assert chroma_where({}) is None
+    assert chroma_where({"drug": "WARFARIN"}) == {"drug": "WARFARIN"}
+    assert chroma_where({"drug": "WARFARIN", "gene": "CYP2C9"}) == {"$and": [{"drug": "WARFARIN"}, {"gene": "CYP2C9"}]}
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from ml.llm_router import CLOSED, HALF_OPEN, OPEN, LLMBackend, LLMRouter, NoBackendAvailable
+from ml.local_llm import LocalClinicalLLM
+
+ARGS = dict(
+    drug="Clopidogrel", gene="CYP2C19", phenotype="Poor Metabolizer", risk_label="Ineffective",
+    rule_summary="Use an alternative.", retrieved_context="CPIC guideline text."
+)
+
+def make_router(*hosts: str, failure_threshold: int = 3) -> LLMRouter:
+    backends = [LLMBackend(f"http://{host}/api/generate", "test-model", failure_threshold, 10.0) for host in hosts]
+    return LLMRouter(backends, probe_interval=0)
+
+def make_llm(router: LLMRouter, handler) -> LocalClinicalLLM:
+    return LocalClinicalLLM(transport=httpx.MockTransport(handler), router=router)
+
+def frames(*chunks: dict) -> bytes:
+    return b"".join(json.dumps(chunk).encode() + b"\n" for chunk in chunks)
+
+def test_acquire_prefers_least_outstanding():
+    router = make_router("a", "b", "c")
+    first, second, third = router.acquire(), router.acquire(), router.acquire()
+    assert {first.name, second.name, third.name} == {b.name for b in router.backends}
+    router.release(second, True, 0.1)
+    assert router.acquire() is second
+
+def test_breaker_opens_after_threshold_and_half_opens():
+    router = make_router("a", failure_threshold=2)
+    backend = router.backends[0]
+    router.release(router.acquire(), False, 0.1, "boom")
+    assert backend.state == CLOSED
+    router.release(router.acquire(), False, 0.1, "boom")
+    assert backend.state == OPEN
+    with pytest.raises(NoBackendAvailable):
+        router.acquire()
+
+    backend.opened_at -= backend.reset_seconds
+    trial = router.acquire()
+    assert backend.state == HALF_OPEN
+    with pytest.raises(NoBackendAvailable):
+        router.acquire()  # one trial at a time
+    router.release(trial, True, 0.1)
+    assert backend.state == CLOSED and backend.consecutive_failures == 0
+
+def test_probe_failures_respect_threshold():
+    router = make_router("a", failure_threshold=3)
+    backend = router.backends[0]
+    healthy = [False]
+
+    async def run(results):
+        transport = httpx.MockTransport(lambda request: httpx.Response(200 if healthy[0] else 503))
+        async with httpx.AsyncClient(transport=transport) as client:
+            for result in results:
+                healthy[0] = result
+                await router._probe(client, backend)
+
+    asyncio.run(run([False, False]))
+    assert backend.state == CLOSED and backend.healthy is False
+    asyncio.run(run([False]))
+    assert backend.state == OPEN and backend.last_error == "health probe failed"
+    # A healthy probe lets a trial through before the reset time
+    asyncio.run(run([True]))
+    assert backend.state == HALF_OPEN and router.acquire() is backend
+
+def test_connect_error_is_retried_on_another_backend():
+    router = make_router("down", "up")
+
+    def handler(request):
+        if request.url.host == "down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"response": json.dumps({"summary": "ok"})})
+
+    async def run():
+        llm = make_llm(router, handler)
+        for _ in range(2):
+            assert await llm.agenerate_explanation(**ARGS) == {"summary": "ok"}
+        await llm.aclose()
+
+    asyncio.run(run())
+    down, up = router.backends
+    assert down.errors >= 1 and up.requests == 2 and up.errors == 0
+
+def stream(router: LLMRouter, body: bytes, take: int = None) -> tuple[list[str], Exception]:
+    async def run():
+        llm = make_llm(router, lambda request: httpx.Response(200, content=body))
+        deltas, error = [], None
+        generator = llm.astream_explanation(**ARGS)
+        try:
+            async for delta in generator:
+                deltas.append(delta)
+                if take is not None and len(deltas) == take:
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            await generator.aclose()
+            await llm.aclose()
+        return deltas, error
+
+    return asyncio.run(run())
+
+def test_stream_counts_success_only_on_done_frame():
+    router = make_router("a")
+    backend = router.backends[0]
+    deltas, error = stream(router, frames({"response": '{"summary"'}, {"response": ': "x"}'}, {"done": True}))
+    assert "".join(deltas) == '{"summary": "x"}' and error is None
+    assert backend.requests == 1 and backend.errors == 0 and backend.outstanding == 0
+
+def test_truncated_stream_is_a_failure():
+    router = make_router("a")
+    backend = router.backends[0]
+    deltas, error = stream(router, frames({"response": '{"summary"'}))
+    assert deltas == ['{"summary"']
+    assert isinstance(error, httpx.RemoteProtocolError)
+    assert backend.errors == 1 and backend.outstanding == 0
+
+def test_malformed_frame_is_a_failure():
+    router = make_router("a")
+    backend = router.backends[0]
+    _, error = stream(router, frames({"response": "{"}) + b"not json\n")
+    assert isinstance(error, json.JSONDecodeError)
+    assert backend.errors == 1 and backend.outstanding == 0
+
+def test_client_disconnect_records_nothing():
+    router = make_router("a")
+    backend = router.backends[0]
+    body = frames({"response": "{"}, {"response": '"summary"'}, {"done": True})
+    deltas, error = stream(router, body, take=1)
+    assert deltas == ["{"] and error is None
+    assert backend.requests == 0 and backend.errors == 0 and backend.outstanding == 0
@@ -0,0 +1,105 @@
+import re
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app as main_app
+from app.metrics import Counter, Histogram, ServerTimingMiddleware, format_server_timing, render_metrics, timer
+
+def test_histogram_exposition_is_cumulative_per_label():
+    histogram = Histogram("test_seconds", "Test latency.", label="stage", buckets=(0.1, 1.0))
+    for stage, value in (("b", 0.05), ("a", 0.5), ("a", 0.1), ("a", 3.0)):
+        histogram.observe(stage, value)
+    assert histogram.render() == [
+        "# HELP test_seconds Test latency.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_seconds_sum{stage="a"} 3.6',
+        'test_seconds_count{stage="a"} 3',
+        'test_seconds_bucket{stage="b",le="0.1"} 1',
+        'test_seconds_bucket{stage="b",le="1"} 1',
+        'test_seconds_bucket{stage="b",le="+Inf"} 1',
+        'test_seconds_sum{stage="b"} 0.05',
+        'test_seconds_count{stage="b"} 1'
+    ]
+
+def test_render_metrics_writes_help_and_type_once_per_metric(monkeypatch):
+    counter = Counter("test_events_total", "Test events.")
+    counter.inc(2)
+    monkeypatch.setattr(metrics, "METRICS", [counter])
+    text = render_metrics([
+        ('test_requests_total{backend="a"}', "counter", "Requests per backend.", 3),
+        ('test_requests_total{backend="b"}', "counter", "Requests per backend.", 0),
+        ("test_ratio", "gauge", "A ratio.", 0.25)
+    ])
+    assert text == "\n".join([
+        "# HELP test_events_total Test events.",
+        "# TYPE test_events_total counter",
+        "test_events_total 2",
+        "# HELP test_requests_total Requests per backend.",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{backend="a"} 3',
+        'test_requests_total{backend="b"} 0',
+        "# HELP test_ratio A ratio.",
+        "# TYPE test_ratio gauge",
+        "test_ratio 0.25"
+    ]) + "\n"
+
+def test_metrics_endpoint_is_prometheus_text():
+    client = TestClient(main_app)
+    client.post("/api/v1/analyze", json={"patient_id": "P1", "gene": "CYP2C19", "diplotype": "*2/*2", "drug": "Clopidogrel"})
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE pharmaguard_stage_seconds histogram" in response.text.splitlines()
+    assert re.search(r'^pharmaguard_stage_seconds_count\{stage="rule_engine"\} [1-9]', response.text, re.M)
+
+def test_format_server_timing():
+    assert format_server_timing({"rule_engine": 0.0012, "total": 0.5}) == "rule_engine;dur=1.20, total;dur=500.00"
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    return {name: float(duration) for name, duration in re.findall(r"([\w-]+);dur=([\d.]+)", header)}
+
+def test_server_timing_header_lists_stages_and_total():
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/work")
+    def work():
+        with timer("parse"):
+            pass
+        with timer("lookup"):
+            pass
+        with timer("lookup"):
+            pass
+        return {}
+
+    @app.get("/stream")
+    def stream():
+        def body():
+            with timer("late"):
+                yield b"data"
+        with timer("early"):
+            pass
+        return StreamingResponse(body())
+
+    client = TestClient(app)
+    timings = parse_server_timing(client.get("/work").headers["server-timing"])
+    # A repeated stage is summed into one entry
+    assert list(timings) == ["parse", "lookup", "total"]
+    assert timings["total"] >= timings["parse"] + timings["lookup"]
+
+    # Stages finished after the response started are not in the header
+    response = client.get("/stream")
+    assert response.text == "data"
+    assert list(parse_server_timing(response.headers["server-timing"])) == ["early", "total"]
+
+def test_server_timing_on_the_app():
+    response = TestClient(main_app).post(
+        "/api/v1/analyze", json={"patient_id": "P1", "gene": "CYP2C19", "diplotype": "*2/*2", "drug": "Clopidogrel"}
+    )
+    assert response.status_code == 200
+    assert list(parse_server_timing(response.headers["server-timing"])) == ["rule_engine", "total"]
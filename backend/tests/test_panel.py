@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.engine.rule_engine import evaluate_drug_risk, evaluate_panel
+
+client = TestClient(app)
+
+def test_panel_matches_single_evaluations():
+    genotypes = {"CYP2C19": "*2/*2", "CYP2C9": "*1/*3", "SLCO1B1": "*5/*5"}
+    panel = evaluate_panel("P1", genotypes)
+    assert {result.drug for result in panel.results} == {"Clopidogrel", "Warfarin", "Simvastatin"}
+    assert panel.genes_without_rules == []
+    for result in panel.results:
+        gene = result.pharmacogenomic_profile.primary_gene
+        assert result == evaluate_drug_risk("P1", gene, genotypes[gene], result.drug)
+
+def test_panel_reports_genes_without_rules():
+    panel = evaluate_panel("P1", {"CYP2C19": "*1/*1", "ABCB1": "*1/*1"})
+    assert [result.drug for result in panel.results] == ["Clopidogrel"]
+    assert panel.genes_without_rules == ["ABCB1"]
+
+def test_panel_endpoint():
+    response = client.post("/api/v1/analyze/panel", json={"patient_id": "P1", "genotypes": {"cyp2d6": "*4/*4"}})
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["drug"] for result in body["results"]] == ["Codeine"]
+    assert body["results"][0]["pharmacogenomic_profile"]["phenotype"] == "Poor Metabolizer"
+    assert client.post("/api/v1/analyze/panel", json={"patient_id": "P1"}).status_code == 422
@@ -0,0 +1,95 @@
+import pytest
+
+from app.engine.allele_functions import ALLELE_FUNCTIONS
+from app.engine.phenotype_engine import (
+    INDETERMINATE, MAX_COPIES, build_phenotype_table, canonical_diplotype, compute_phenotype, parse_allele
+)
+from app.engine.phenotype_map import PHENOTYPE_MAP
+
+def table(gene: str):
+    return build_phenotype_table(gene, ALLELE_FUNCTIONS[gene], {})
+
+def test_parse_allele():
+    assert parse_allele("*1") == ("*1", 1)
+    assert parse_allele("CYP2D6*1x3") == ("*1", 3)
+    assert parse_allele(" *2A ") == ("*2A", 1)
+    assert parse_allele("*1xN") == ("*1", None)
+    assert parse_allele("*1x0") is None
+    assert parse_allele("rs123") is None
+
+def test_canonical_diplotype():
+    assert canonical_diplotype("*2/*1") == "*1/*2"
+    assert canonical_diplotype("*10/*2A") == "*2A/*10"
+    assert canonical_diplotype("*4 / *1XN") == "*1xN/*4"
+    assert canonical_diplotype("*1x4/*1xN") == "*1x4/*1xN"
+    assert canonical_diplotype("*1") is None
+
+@pytest.mark.parametrize("diplotype, phenotype", [
+    ("*1/*1", "Normal Metabolizer"),
+    ("*1/*4", "Intermediate Metabolizer"),
+    ("*4/*4", "Poor Metabolizer"),
+    ("*10/*10", "Intermediate Metabolizer"),
+    ("*1/*2x2", "Ultrarapid Metabolizer"),
+    ("*10x4/*4", "Intermediate Metabolizer"),
+    ("*9/*4", "Intermediate Metabolizer"),
+])
+def test_activity_score_bins(diplotype, phenotype):
+    assert table("CYP2D6").phenotype(diplotype) == phenotype
+
+def test_computed_table_matches_direct_computation():
+    functions = ALLELE_FUNCTIONS["CYP2C9"]
+    cyp2c9 = table("CYP2C9")
+    for first, a in functions["alleles"].items():
+        for second, b in functions["alleles"].items():
+            assert cyp2c9.phenotype(f"{first}/{second}") == compute_phenotype(functions, a, b)
+
+def test_lookup_spellings_and_order():
+    cyp2d6 = table("CYP2D6")
+    assert cyp2d6.code("*4/*1") == cyp2d6.code("*1/*4") == cyp2d6.code("CYP2D6*1/CYP2D6*4")
+    assert cyp2d6.phenotype("*1X3/*4") == cyp2d6.phenotype("*1x3/*4")
+    assert cyp2d6.phenotype("*99/*1") == INDETERMINATE
+    assert cyp2d6.phenotype("*1") == INDETERMINATE
+
+def test_unspecified_copies_resolve_only_when_count_does_not_matter():
+    cyp2d6 = table("CYP2D6")
+    # Two or more normal copies are ultrarapid at any count
+    assert cyp2d6.phenotype("*1xN/*1") == "Ultrarapid Metabolizer"
+    # No-function copies score zero at any count
+    assert cyp2d6.phenotype("*4xN/*4") == "Poor Metabolizer"
+    # *10x2/*1 is normal, *10x6/*1 ultrarapid: the count decides
+    assert cyp2d6.phenotype("*10x2/*1") == "Normal Metabolizer"
+    assert cyp2d6.phenotype("*10xN/*1") == INDETERMINATE
+
+def test_copies_above_max_are_at_least_max_plus_one():
+    cyp2d6 = table("CYP2D6")
+    above = f"x{MAX_COPIES + 1}"
+    assert cyp2d6.phenotype(f"*1{above}/*1") == "Ultrarapid Metabolizer"
+    assert cyp2d6.phenotype(f"*4{above}/*4") == "Poor Metabolizer"
+    # At least five *10 copies and a *1 score 2.25 (Normal) or more
+    assert cyp2d6.phenotype(f"*10{above}/*1") == INDETERMINATE
+    assert cyp2d6.phenotype(f"*10x{MAX_COPIES}/*1") == "Normal Metabolizer"
+    # Nine copies are not read as xN: at least five *1 copies are ultrarapid
+    assert cyp2d6.phenotype("*4/*1x9") == "Ultrarapid Metabolizer"
+    assert cyp2d6.phenotype("*1x9/*4") == "Ultrarapid Metabolizer"
+    assert cyp2d6.phenotype("*4/*1xN") == INDETERMINATE
+
+def test_function_pair_genes_have_no_copy_number_phenotypes():
+    cyp2c19 = table("CYP2C19")
+    assert cyp2c19.phenotype("*1/*17") == "Rapid Metabolizer"
+    for diplotype in ("*1x2/*17", "*17xN/*1", "*2x2/*2", "*1x5/*1"):
+        assert cyp2c19.phenotype(diplotype) == INDETERMINATE
+
+def test_explicit_entries_take_precedence():
+    cyp2d6 = build_phenotype_table("CYP2D6", ALLELE_FUNCTIONS["CYP2D6"], {"*10xN/*1": "Normal Metabolizer"})
+    assert cyp2d6.phenotype("*1/*10xN") == "Normal Metabolizer"
+    # Genes without allele functions use only the explicit entries
+    explicit = build_phenotype_table("CYP2D6", None, PHENOTYPE_MAP["CYP2D6"])
+    assert explicit.phenotype("*1xN/*1") == "Ultrarapid Metabolizer"
+    assert explicit.phenotype("*9/*4") == INDETERMINATE
+
+def test_diplotypes_lists_known_phenotypes_once():
+    tpmt = table("TPMT")
+    listed = dict(tpmt.diplotypes())
+    assert listed["*1/*3A"] == "Intermediate Metabolizer"
+    assert "*3A/*1" not in listed
+    assert INDETERMINATE not in listed.values()
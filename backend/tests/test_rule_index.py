@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.engine.drug_rules import DRUG_RULES
+from app.engine.rule_engine import evaluate_drug_risk, render_drug_risk
+from app.engine.rule_index import RulesFileWatcher, get_rule_index, reload_rules, swap_rule_index
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def restore_index():
+    index = get_rule_index()
+    yield
+    swap_rule_index(index)
+
+def write_rules(path, version: str, monitoring: str) -> None:
+    rules = json.loads(json.dumps(DRUG_RULES))
+    rules["Clopidogrel"]["CYP2C19"]["Poor Metabolizer"]["monitoring"] = monitoring
+    path.write_text(json.dumps({"version": version, "drug_rules": rules}))
+
+def test_lookup_normalizes_keys():
+    index = get_rule_index()
+    expected = index.lookup("CLOPIDOGREL", "CYP2C19", "*2/*2")
+    assert expected.matched and expected.phenotype == "Poor Metabolizer"
+    assert index.lookup(" clopidogrel ", "cyp2c19", "*2 / *2") is expected
+    assert index.lookup("Clopidogrel", "CYP2C19", "*1/*2") is index.lookup("Clopidogrel", "CYP2C19", "*2/*1")
+
+def test_unknown_inputs():
+    index = get_rule_index()
+    assert index.lookup("Clopidogrel", "CYP2C19", "*99/*98").phenotype == "Indeterminate"
+    assert not index.lookup("Aspirin", "CYP2C19", "*1/*1").matched
+    with pytest.raises(ValueError):
+        index.resolve_drug("Aspirin")
+
+def test_reload_swaps_atomically(tmp_path):
+    path = tmp_path / "rules.json"
+    write_rules(path, "v-test", "Swapped")
+    before = get_rule_index()
+    seen = set()
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            try:
+                index = get_rule_index()
+                result = index.lookup("Clopidogrel", "CYP2C19", "*2/*2")
+                seen.add((index.version, result.clinical_recommendation.monitoring))
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(20):
+            reload_rules(str(path))
+            swap_rule_index(before)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert not errors
+    old_monitoring = before.lookup("Clopidogrel", "CYP2C19", "*2/*2").clinical_recommendation.monitoring
+    assert seen <= {(before.version, old_monitoring), ("v-test", "Swapped")}
+    # The previous index object is untouched by the swap
+    assert before.lookup("Clopidogrel", "CYP2C19", "*2/*2").clinical_recommendation.monitoring == old_monitoring
+
+def test_malformed_file_keeps_current_index(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("{not json")
+    before = get_rule_index()
+    with pytest.raises(ValueError):
+        reload_rules(str(path))
+    assert get_rule_index() is before
+
+    path.write_text(json.dumps({"drug_rules": {"Clopidogrel": {"CYP2C19": {"Poor Metabolizer": {}}}}}))
+    with pytest.raises(KeyError):
+        reload_rules(str(path))
+    assert get_rule_index() is before
+
+def test_reload_endpoint_uses_configured_file_only(tmp_path, monkeypatch):
+    configured = tmp_path / "configured.json"
+    write_rules(configured, "v-configured", "Configured")
+    other = tmp_path / "other.json"
+    write_rules(other, "v-other", "Other")
+    monkeypatch.setenv("RULES_FILE", str(configured))
+
+    response = client.post("/api/v1/rules/reload", json={"path": str(other)})
+    assert response.status_code == 200
+    assert response.json()["version"] == "v-configured"
+    assert get_rule_index().source == str(configured)
+
+    configured.write_text("[]")
+    before = get_rule_index()
+    assert client.post("/api/v1/rules/reload").status_code == 400
+    assert get_rule_index() is before
+
+def test_watcher_reloads_on_mtime_change(tmp_path):
+    path = tmp_path / "rules.json"
+    write_rules(path, "v1", "First")
+    watcher = RulesFileWatcher(str(path), interval=60)
+    assert watcher.check()
+    assert get_rule_index().version == "v1"
+    assert not watcher.check()
+
+    write_rules(path, "v2", "Second")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert watcher.check()
+    assert get_rule_index().version == "v2"
+
+    # A broken edit is reported and the last good rules stay active
+    path.write_text("{")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+    assert not watcher.check()
+    assert get_rule_index().version == "v2"
+
+def test_shared_models_keep_their_schema_descriptions():
+    # The docstrings are published as OpenAPI component descriptions
+    schemas = client.get("/openapi.json").json()["components"]["schemas"]
+    assert schemas["RiskAssessment"]["description"] == "Assessment of the risk associated with the drug given the genotype."
+    assert schemas["ClinicalRecommendation"]["description"] == "Actionable clinical advice."
+
+@pytest.mark.parametrize("patient_id", [
+    "P1", 'quote " inside', "back\\slash\\", "Jos\u00e9 \u00e5\u4e2d\U0001f9ec", "tab\tnew\nline\x00\x1f\x7f", "</script>", ""
+])
+@pytest.mark.parametrize("gene, diplotype, drug", [
+    ("CYP2C19", "*2/*2", "Clopidogrel"),
+    ("cyp2d6", "*1/*1xN", "codeine"),
+    ("CYP2C9", "*99/*1", "Warfarin"),
+    ("TPMT", "*1/*1", "Aspirin \"x\""),
+])
+def test_rendered_response_is_byte_identical_to_the_model(patient_id, gene, diplotype, drug):
+    expected = evaluate_drug_risk(patient_id, gene, diplotype, drug).model_dump_json().encode()
+    assert render_drug_risk(patient_id, gene, diplotype, drug) == expected
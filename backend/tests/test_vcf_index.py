@@ -0,0 +1,85 @@
+import struct
+import zlib
+
+import pytest
+
+from app.engine.allele_definitions import VARIANT_POSITIONS
+from app.engine.vcf_index import RegionIndex, iter_vcf_chunks, open_index
+from app.engine.vcf_parser import parse_vcf
+from vcf_fixtures import HEADER
+
+GENES = ["CYP2C19", "CYP2C9", "CYP2D6"]
+
+def bgzf_block(data: bytes) -> bytes:
+    deflate = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = deflate.compress(data) + deflate.flush()
+    header = b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", 6)
+    extra = b"BC" + struct.pack("<HH", 2, 18 + len(compressed) + 8 - 1)
+    return header + extra + compressed + struct.pack("<II", zlib.crc32(data), len(data))
+
+def write_bgzf(path, text: bytes, block_size: int = 300) -> None:
+    # Small blocks so that records span block boundaries
+    blocks = [bgzf_block(text[i:i + block_size]) for i in range(0, len(text), block_size)]
+    path.write_bytes(b"".join(blocks) + bgzf_block(b""))
+
+def record(chrom: str, pos: int, rsid: str, info: str = ".", gt: str = "0/1") -> str:
+    return f"{chrom}\t{pos}\t{rsid}\tG\tA\t.\tPASS\t{info}\tGT\t{gt}\n"
+
+def fixture_vcf() -> bytes:
+    lines = [HEADER.format(samples="S1")]
+    lines += [record("1", 1000 + i * 50, f"rs_filler{i}") for i in range(40)]
+    # Tagged record outside the CYP2C19 region, e.g. from another build
+    lines.append(record("4", 5000, "rs4244285", "GENE=CYP2C19;DP=30"))
+    lines += [record("4", 6000 + i * 50, f"rs_filler{i}") for i in range(20)]
+    lines.append(record("10", 1000, "rs_tagged", "GENE=CYP2C9"))
+    variants = [
+        record(*VARIANT_POSITIONS[rsid], rsid, gt="1/1")
+        for rsid in ("rs4986893", "rs1799853", "rs1057910", "rs3892097")
+    ]
+    lines += variants[:3]
+    # Same position as a tagged record, no tag: dropped by both paths
+    lines.append(record("12", 5000, "rs_untagged"))
+    lines.append(record("12", 5000, "rs_tagged12", "DP=3;GENE=CYP2D6"))
+    lines += [record("22", 100 + i * 50, f"rs_filler{i}") for i in range(20)]
+    lines += variants[3:]
+    return "".join(lines).encode()
+
+def parse(path, use_index: bool):
+    return parse_vcf(iter_vcf_chunks(str(path), GENES, use_index=use_index), genes=GENES)
+
+@pytest.mark.parametrize("block_size", [61, 300, 65280])
+def test_indexed_read_matches_full_scan(tmp_path, block_size):
+    path = tmp_path / "sample.vcf.gz"
+    write_bgzf(path, fixture_vcf(), block_size)
+
+    full = parse(path, use_index=False)
+    indexed = parse(path, use_index=True)
+    assert indexed.sample_id == full.sample_id == "S1"
+    assert indexed.records == full.records
+    assert indexed.records_scanned < full.records_scanned
+
+    rsids = {(r.gene, r.rsid) for r in full.records}
+    assert ("CYP2C19", "rs4244285") in rsids
+    assert ("CYP2C9", "rs_tagged") in rsids
+    assert ("CYP2D6", "rs_tagged12") in rsids
+    assert "rs_untagged" not in {r.rsid for r in full.records}
+
+def test_index_records_tags_outside_regions(tmp_path):
+    path = tmp_path / "sample.vcf.gz"
+    write_bgzf(path, fixture_vcf(), block_size=97)
+    index = RegionIndex.build(str(path))
+    assert index.tagged_positions("CYP2C19") == [("4", 5000)]
+    assert index.tagged_positions("CYP2C9") == [("10", 1000)]
+    assert index.tagged_positions("TPMT") == []
+
+    # Saved on first use and reloaded with the tags
+    assert open_index(str(path)).tagged == index.tagged
+    loaded = RegionIndex.load(RegionIndex.path_for(str(path)), str(path))
+    assert loaded is not None and loaded.tagged == index.tagged
+    assert parse(path, use_index=True).records == parse(path, use_index=False).records
+
+def test_unrequested_gene_tags_are_not_read(tmp_path):
+    path = tmp_path / "sample.vcf.gz"
+    write_bgzf(path, fixture_vcf())
+    result = parse_vcf(iter_vcf_chunks(str(path), ["CYP2C9"]), genes=["CYP2C9"])
+    assert {r.rsid for r in result.records} == {"rs_tagged", "rs1799853", "rs1057910"}
@@ -0,0 +1,82 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.engine import vcf_parser
+from app.engine.vcf_parser import VCFStreamParser, call_alleles, call_diplotype, parse_vcf
+from vcf_fixtures import make_vcf
+
+client = TestClient(app)
+
+def chunked(data: bytes, size: int = 7) -> list[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+CYP2C19_VCF = make_vcf(["S1", "S2"], [
+    ("rs4244285", "G", "A", ["0/1", "1/1"]),
+    ("rs12248560", "C", "T", ["0/1", "0/0"]),
+    ("rs1799853", "C", "T", ["0/1", "0/0"])
+])
+
+def test_parses_chunked_plain_and_gzip_streams():
+    plain = parse_vcf(chunked(CYP2C19_VCF), genes=["CYP2C19"])
+    compressed = parse_vcf(chunked(gzip.compress(CYP2C19_VCF), 5), genes=["CYP2C19"])
+    assert plain.header_found and plain.sample_id == "S1"
+    assert [record.rsid for record in plain.records] == ["rs4244285", "rs12248560"]
+    assert plain.records_scanned == 3
+    assert compressed.records == plain.records
+
+def test_selects_requested_sample():
+    parsed = parse_vcf([CYP2C19_VCF], genes=["CYP2C19"], sample="S2")
+    assert parsed.sample_id == "S2"
+    assert call_diplotype("CYP2C19", parsed.records) == "*2/*2"
+
+def test_unknown_sample_is_an_error():
+    with pytest.raises(ValueError, match="'S3' not found"):
+        parse_vcf([CYP2C19_VCF], genes=["CYP2C19"], sample="S3")
+
+def test_unknown_sample_returns_400():
+    response = client.post("/api/v1/analyze-vcf?drug=Clopidogrel&sample=S3", content=CYP2C19_VCF)
+    assert response.status_code == 400
+    assert "S3" in response.json()["detail"]
+
+def test_calls_diplotype():
+    parsed = parse_vcf([CYP2C19_VCF], genes=["CYP2C19"])
+    assert call_diplotype("CYP2C19", parsed.records) == "*2/*17"
+    reference = parse_vcf([make_vcf(["S1"], [("rs4244285", "G", "A", ["0/0"])])], genes=["CYP2C19"])
+    assert call_diplotype("CYP2C19", reference.records) == "*1/*1"
+
+def test_more_than_two_alleles_is_indeterminate():
+    vcf = make_vcf(["S1"], [
+        ("rs4244285", "G", "A", ["0/1"]),
+        ("rs4986893", "G", "A", ["0/1"]),
+        ("rs12248560", "C", "T", ["0/1"])
+    ])
+    parsed = parse_vcf([vcf], genes=["CYP2C19"])
+    assert call_alleles("CYP2C19", parsed.records) == ["*2", "*3", "*17"]
+    assert call_diplotype("CYP2C19", parsed.records) == "Indeterminate"
+
+    response = client.post("/api/v1/analyze-vcf?drug=Clopidogrel", content=vcf)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["pharmacogenomic_profile"]["diplotype"] == "Indeterminate"
+    assert body["quality_metrics"]["called_alleles"] == ["*2", "*3", "*17"]
+    assert body["quality_metrics"]["warnings"]
+
+def test_missing_header_returns_400():
+    response = client.post("/api/v1/analyze-vcf?drug=Clopidogrel", content=CYP2C19_VCF.split(b"\n", 2)[2])
+    assert response.status_code == 400
+
+def test_overlong_line_is_an_error():
+    parser = VCFStreamParser(genes=["CYP2C19"], max_line_bytes=64)
+    parser.feed(CYP2C19_VCF)
+    with pytest.raises(ValueError, match="longer than 64 bytes"):
+        for chunk in chunked(b"1\t100\t" + b"A" * 100, 10):
+            parser.feed(chunk)
+
+def test_input_without_newlines_returns_400(monkeypatch):
+    monkeypatch.setattr(vcf_parser, "MAX_LINE_BYTES", 1024)
+    response = client.post("/api/v1/analyze-vcf?drug=Clopidogrel", content=b"x" * 4096)
+    assert response.status_code == 400
+    assert "longer than 1024 bytes" in response.json()["detail"]
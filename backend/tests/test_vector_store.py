@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from ml.vector_store import NumpyVectorStore, open_vector_store
+
+def make_store(path, dtype="float32", rows=20, dim=8):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(rows, dim)).astype(np.float32)
+    ids = [f"c{i}" for i in range(rows)]
+    metadatas = [{"drug": "WARFARIN" if i % 2 else "CODEINE", "gene": "CYP2C9" if i % 4 == 1 else "OTHER"} for i in range(rows)]
+    store = NumpyVectorStore(str(path), dtype=dtype)
+    store.upsert(ids, [f"doc {i}" for i in range(rows)], metadatas, vectors.tolist())
+    return store, ids, vectors, metadatas
+
+def brute_force(vectors, query, candidates, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized[candidates] @ (query / np.linalg.norm(query))
+    return [candidates[i] for i in np.argsort(-scores, kind="stable")[:k]]
+
+def test_query_matches_brute_force(tmp_path):
+    store, ids, vectors, _ = make_store(tmp_path)
+    queries = np.random.default_rng(1).normal(size=(3, 8))
+    result = store.query(queries.tolist(), n_results=5)
+    for query, found, distances in zip(queries, result["ids"], result["distances"]):
+        assert found == [ids[i] for i in brute_force(vectors, query, list(range(len(ids))), 5)]
+        assert distances == sorted(distances)
+
+def test_where_filters(tmp_path):
+    store, ids, vectors, metadatas = make_store(tmp_path)
+    query = np.random.default_rng(2).normal(size=8)
+    where = {"$and": [{"drug": "WARFARIN"}, {"gene": "CYP2C9"}]}
+    candidates = [i for i, metadata in enumerate(metadatas) if metadata["drug"] == "WARFARIN" and metadata["gene"] == "CYP2C9"]
+    result = store.query([query.tolist()], n_results=50, where=where)
+    assert result["ids"][0] == [ids[i] for i in brute_force(vectors, query, candidates, 50)]
+    assert store.query([query.tolist()], n_results=3, where={"drug": "NONE"})["ids"] == [[]]
+
+def test_upsert_delete_and_reload(tmp_path):
+    store, ids, vectors, _ = make_store(tmp_path)
+    store.upsert(["c0", "new"], ["replaced", "added"], [{}, {}], [vectors[5].tolist(), vectors[6].tolist()])
+    store.delete(["c1", "missing"])
+    assert store.count() == 20
+    assert "c1" not in store.ids()
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert reopened.ids() == store.ids()
+    top = reopened.query([vectors[5].tolist()], n_results=2)
+    assert set(top["ids"][0]) == {"c0", "c5"}
+    assert "replaced" in top["documents"][0]
+
+def test_upsert_repeated_id_last_write_wins(tmp_path):
+    store, ids, vectors, _ = make_store(tmp_path)
+    store.upsert(
+        ["new", "c3", "new", "c3"],
+        ["first", "c3 first", "second", "c3 second"],
+        [{"v": 1}, {}, {"v": 2}, {}],
+        [vectors[0].tolist(), vectors[1].tolist(), vectors[7].tolist(), vectors[8].tolist()]
+    )
+    assert store.count() == 21 and store.ids().count("new") == 1
+    top = store.query([vectors[7].tolist()], n_results=2, where={"v": 2})
+    assert top["ids"][0] == ["new"] and top["documents"][0] == ["second"]
+    # c3 now holds c8's vector
+    top = NumpyVectorStore(str(tmp_path)).query([vectors[8].tolist()], n_results=2)
+    assert set(top["ids"][0]) == {"c3", "c8"} and "c3 second" in top["documents"][0]
+
+def test_float16_ranks_like_float32(tmp_path):
+    full, _, vectors, _ = make_store(tmp_path / "f32")
+    half, _, _, _ = make_store(tmp_path / "f16", dtype="float16")
+    query = vectors[3].tolist()
+    assert half.query([query], n_results=1)["ids"] == full.query([query], n_results=1)["ids"]
+
+def test_empty_and_mismatched_stores(tmp_path):
+    empty = NumpyVectorStore(str(tmp_path / "empty"))
+    assert empty.query([[1.0, 0.0], [0.0, 1.0]], n_results=3) == {"ids": [[], []], "documents": [[], []], "distances": [[], []]}
+
+    make_store(tmp_path / "f32")
+    assert NumpyVectorStore(str(tmp_path / "f32"), dtype="float16").count() == 0
+
+def test_open_vector_store_validates_backend(tmp_path):
+    assert isinstance(open_vector_store(str(tmp_path), backend="numpy"), NumpyVectorStore)
+    with pytest.raises(ValueError):
+        open_vector_store(str(tmp_path), backend="faiss")
+    with pytest.raises(ValueError):
+        NumpyVectorStore(str(tmp_path), dtype="int8")
@@ -0,0 +1,16 @@
+"""
+Small VCF builders shared by the VCF tests.
+"""
+from app.engine.allele_definitions import VARIANT_POSITIONS
+
+HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{samples}\n"
+
+def make_vcf(samples: list[str], records: list[tuple[str, str, str, list[str]]]) -> bytes:
+    """
+    records: (rsid, ref, alt, one genotype per sample), placed at the variant's GRCh38 position.
+    """
+    lines = [HEADER.format(samples="\t".join(samples))]
+    for rsid, ref, alt, genotypes in records:
+        chrom, pos = VARIANT_POSITIONS[rsid]
+        lines.append(f"{chrom}\t{pos}\t{rsid}\t{ref}\t{alt}\t.\tPASS\t.\tGT\t" + "\t".join(genotypes) + "\n")
+    return "".join(lines).encode()
@@ -9,7 +9,7 @@ import { ResultCard } from "@/components/ResultCard";
 import { ShieldCheck, Loader2, ArrowLeft } from "lucide-react";
 import { toast } from "sonner";
 import { Alert, AlertDescription, AlertTitle } from "@/components/ui/alert";
-import { analyzeDrugRisk } from "@/lib/api";
+import { analyzeDrugRisk, analyzePanel } from "@/lib/api";
 import { AnalyzeResponse } from "@/lib/types";
 
 // Mock helper to simulate VCF parsing for the demo
@@ -45,24 +45,50 @@ export default function AnalyzePage() {
         .map((d) => d.trim())
         .filter((d) => d);
 
-      const analysisPromises = drugList.map(async (drug) => {
-        // Simulate extracting genetic data for this specific drug pathway from the VCF
-        // For demo purposes, we pick a mock diplotype based on the drug name to show variety
-        const geneData = MOCK_VCF_PARSER[drug] || {
-          gene: "CYP2C19",
-          diplotype: "*1/*1",
-        }; // Default fallbacks
-
-        return analyzeDrugRisk(
-          "PATIENT_001",
-          geneData.gene,
-          geneData.diplotype,
-          drug,
-        );
-      });
-
-      const analysisResults = await Promise.all(analysisPromises);
+      // Simulate extracting the genotypes of each drug's pathway from the VCF
+      // For demo purposes, we pick a mock diplotype based on the drug name to show variety
+      const genotypes: Record<string, string> = {};
+      for (const drug of drugList) {
+        const geneData = MOCK_VCF_PARSER[drug];
+        if (geneData) {
+          genotypes[geneData.gene] = geneData.diplotype;
+        }
+      }
+
+      // One panel call evaluates every drug with rules for these genes;
+      // keep the requested ones, in the order they were entered
+      const panelResults: AnalyzeResponse[] =
+        Object.keys(genotypes).length > 0
+          ? (await analyzePanel("PATIENT_001", genotypes)).results
+          : [];
+      const byDrug = new Map(
+        panelResults.map((result) => [result.drug.toLowerCase(), result]),
+      );
+      const unsupported = drugList.filter(
+        (drug) => !byDrug.has(drug.toLowerCase()),
+      );
+
+      // Drugs without a pathway gene are still evaluated one by one,
+      // so they are shown with an Unknown risk
+      const fallbackResults = new Map(
+        await Promise.all(
+          unsupported.map(
+            async (drug) =>
+              [
+                drug,
+                await analyzeDrugRisk("PATIENT_001", "CYP2C19", "*1/*1", drug),
+              ] as const,
+          ),
+        ),
+      );
+      const analysisResults = drugList.map(
+        (drug) => byDrug.get(drug.toLowerCase()) ?? fallbackResults.get(drug)!,
+      );
+
       setResults(analysisResults);
+      if (unsupported.length > 0) {
+        toast.warning(`No guideline for: ${unsupported.join(", ")}`);
+      }
       toast.success("Analysis complete");
     } catch (error) {
       console.error("Analysis failed:", error);
@@ -1,4 +1,4 @@
-import { AnalyzeResponse } from "./types";
+import { AnalyzeResponse, PanelAnalyzeResponse } from "./types";
 
 const API_BASE_url = "http://localhost:8000/api/v1";
 
@@ -31,3 +31,30 @@ export async function analyzeDrugRisk(
 
   return response.json();
 }
+
+// Evaluates every drug applicable to the patient's genotypes in one call.
+export async function analyzePanel(
+  patientId: string,
+  genotypes: Record<string, string>,
+  useAI = true,
+): Promise<PanelAnalyzeResponse> {
+  const endpoint = useAI ? "/analyze-with-explanation/panel" : "/analyze/panel";
+
+  const response = await fetch(`${API_BASE_url}${endpoint}`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      patient_id: patientId,
+      genotypes,
+    }),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.detail || "Failed to analyze panel");
+  }
+
+  return response.json();
+}
@@ -36,5 +36,11 @@ export interface AnalyzeResponse {
   llm_generated_explanation?: AIExplanation;
 }
 
+export interface PanelAnalyzeResponse {
+  patient_id: string;
+  results: AnalyzeResponse[];
+  genes_without_rules: string[];
+}
+
 // For frontend display purposes, if needed
 export type DrugResult = AnalyzeResponse;